@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+"""
+Usage: compile_mo.py [options] LOCALEDIR
+Compiles every .po file under LOCALEDIR into a .mo file next to it, skipping
+catalogs that have not changed since the last run.
+
+Options:
+  -h, --help            show this help message and exit
+  -j JOBS, --jobs=JOBS  Number of msgfmt processes to run at once. Defaults
+                        to one per core.
+  -f, --force           Recompile every catalog.
+"""
+
+import errno
+import fcntl
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from hashlib import sha1
+from optparse import OptionParser
+from textwrap import dedent
+
+
+STATE_FILE = '.compile-mo.json'
+LOCK_FILE = '.compile-mo.lock'
+LOCKED = 99  # Exit status when another run holds the lock.
+
+
+def find_catalogs(localedir):
+    for root, dirs, files in os.walk(localedir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for name in files:
+            if name.endswith('.po'):
+                yield os.path.join(root, name)
+
+
+def file_hash(path):
+    f = open(path, 'rb')
+    try:
+        return sha1(f.read()).hexdigest()
+    finally:
+        f.close()
+
+
+def msgfmt(po):
+    """Compile one catalog; returns ``(po, error)``."""
+    mo = po[:-3] + '.mo'
+    tmp = mo + '.tmp'
+    try:
+        proc = subprocess.Popen(['msgfmt', '-o', tmp, po],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+    except OSError, exc:
+        return po, 'could not run msgfmt: %s' % exc
+    output = proc.communicate()[0]
+    if proc.returncode != 0:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return po, output.strip() or 'msgfmt exited %s' % proc.returncode
+    os.rename(tmp, mo)
+    return po, None
+
+
+def acquire_lock(localedir):
+    """Take an exclusive lock for LOCALEDIR, or return None if it is held.
+
+    The lock is an flock() on a file, so the kernel releases it when this
+    process exits, however it exits; a crashed run cannot leave it stale.
+    """
+    f = open(os.path.join(localedir, LOCK_FILE), 'w')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError, exc:
+        f.close()
+        if exc.errno in (errno.EAGAIN, errno.EACCES):
+            return None
+        raise
+    return f
+
+
+def load_state(localedir):
+    try:
+        f = open(os.path.join(localedir, STATE_FILE))
+    except IOError:
+        return {}
+    try:
+        return json.load(f)
+    except ValueError:
+        return {}
+    finally:
+        f.close()
+
+
+def save_state(localedir, state):
+    path = os.path.join(localedir, STATE_FILE)
+    f = open(path + '.tmp', 'w')
+    try:
+        json.dump(state, f, indent=1, sort_keys=True)
+    finally:
+        f.close()
+    os.rename(path + '.tmp', path)
+
+
+def compile_catalogs(localedir, jobs=None, force=False, out=sys.stdout):
+    """Compile changed catalogs under ``localedir``.
+
+    Returns ``(compiled, skipped, failed)`` counts.
+    """
+    start = time.time()
+    state = {} if force else load_state(localedir)
+    new_state = {}
+    pending = []
+    skipped = 0
+
+    for po in sorted(find_catalogs(localedir)):
+        key = os.path.relpath(po, localedir)
+        stat = os.stat(po)
+        seen = state.get(key, {})
+        have_mo = os.path.exists(po[:-3] + '.mo')
+        if have_mo and seen.get('mtime') == stat.st_mtime and \
+                seen.get('size') == stat.st_size:
+            new_state[key] = seen
+            skipped += 1
+            continue
+        # Touched but unchanged files (e.g. a fresh checkout) only cost a
+        # hash, not a msgfmt.
+        entry = {'mtime': stat.st_mtime, 'size': stat.st_size,
+                 'sha1': file_hash(po)}
+        if have_mo and seen.get('sha1') == entry['sha1']:
+            new_state[key] = entry
+            skipped += 1
+            continue
+        pending.append((po, key, entry))
+
+    failed = 0
+    if pending:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            results = pool.map(msgfmt, [po for po, key, entry in pending])
+        finally:
+            pool.close()
+            pool.join()
+        errors = dict(results)
+        for po, key, entry in pending:
+            if errors[po]:
+                failed += 1
+                out.write('%s: %s\n' % (po, errors[po]))
+            else:
+                new_state[key] = entry
+
+    save_state(localedir, new_state)
+    out.write('Compiled %d catalogs, skipped %d unchanged, %d failed '
+              'in %.2fs.\n' % (len(pending) - failed, skipped, failed,
+                               time.time() - start))
+    return len(pending) - failed, skipped, failed
+
+
+def main():
+    usage = dedent("""\
+        %prog [options] LOCALEDIR
+        Compiles every .po file under LOCALEDIR into a .mo file next to it,
+        skipping catalogs that have not changed since the last run.
+        """.rstrip())
+
+    options = OptionParser(usage=usage)
+    options.add_option("-j", "--jobs", type="int", default=None,
+                       help="Number of msgfmt processes to run at once. "
+                            "Defaults to one per core.")
+    options.add_option("-f", "--force", action="store_true", default=False,
+                       help="Recompile every catalog.")
+    (opts, args) = options.parse_args()
+
+    if len(args) != 1 or not os.path.isdir(args[0]):
+        options.print_help(sys.stderr)
+        sys.exit(1)
+    localedir = args[0]
+
+    lock = acquire_lock(localedir)
+    if lock is None:
+        sys.stderr.write("Another compile_mo.py is running on %s, exiting.\n"
+                         % localedir)
+        sys.exit(LOCKED)
+    try:
+        compiled, skipped, failed = compile_catalogs(localedir, opts.jobs,
+                                                     opts.force)
+    finally:
+        lock.close()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
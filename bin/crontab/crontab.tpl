@@ -6,6 +6,7 @@
 
 HOME=/tmp
 
+{% if not daemon %}
 # Every minute!
 * * * * * {{ cron }}
 
@@ -16,5 +17,6 @@ HOME=/tmp
 1 */2 * * * {{ cron }} something
 
 # Etc...
+{% endif %}
 
 MAILTO=root
@@ -5,8 +5,11 @@ from optparse import OptionParser
 from jinja2 import Template
 
 
-HEADER = '!!AUTO-GENERATED!! Edit bin/crontab/crontab.tpl instead.'
-TEMPLATE = open(os.path.join(os.path.dirname(__file__), 'crontab.tpl')).read()
+HEADER = '!!AUTO-GENERATED!! Edit bin/crontab/%s instead.'
+
+
+def template(name):
+    return open(os.path.join(os.path.dirname(__file__), name)).read()
 
 
 def main():
@@ -18,12 +21,30 @@ def main():
                             'Only define for cron.d style crontabs.'))
     parser.add_option('-p', '--python', default='/usr/bin/python2.6',
                       help='Python interpreter to use.')
+    parser.add_option('-s', '--supervisor', metavar='NAME',
+                      help=('Write a supervisor program NAME running '
+                            'manage.py cron_daemon, and leave the jobs it '
+                            'runs out of the crontab.'))
+    parser.add_option('-c', '--supervisor-conf', metavar='FILE',
+                      help=('Where to write the supervisor program; '
+                            'defaults to NAME.conf.'))
 
     (opts, args) = parser.parse_args()
 
     if not opts.webapp:
         parser.error('-w must be defined')
 
+    if opts.supervisor:
+        conf = opts.supervisor_conf or '%s.conf' % opts.supervisor
+        f = open(conf, 'w')
+        try:
+            f.write(Template(template('supervisor.tpl')).render(
+                header=HEADER % 'supervisor.tpl', name=opts.supervisor,
+                python=opts.python, webapp=opts.webapp, user=opts.user))
+            f.write('\n')
+        finally:
+            f.close()
+
     ctx = {'django': 'cd %s; %s manage.py' % (opts.webapp, opts.python)}
     ctx['cron'] = '%s cron' % ctx['django']
 
@@ -33,9 +54,11 @@ def main():
 
     # Needs to stay below the opts.user injection.
     ctx['python'] = opts.python
-    ctx['header'] = HEADER
+    ctx['header'] = HEADER % 'crontab.tpl'
+    # cron_daemon runs the jobs; cron running them too would double them up.
+    ctx['daemon'] = bool(opts.supervisor)
 
-    print Template(TEMPLATE).render(**ctx)
+    print Template(template('crontab.tpl')).render(**ctx)
 
 
 if __name__ == '__main__':
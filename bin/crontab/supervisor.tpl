@@ -0,0 +1,15 @@
+;
+; {{ header }}
+;
+; Runs every scheduled job from one long-lived process. The schedule lives in
+; CRON_SCHEDULE in the Django settings.
+
+[program:{{ name }}]
+command={{ python }} manage.py cron_daemon
+directory={{ webapp }}
+{% if user %}user={{ user }}
+{% endif %}autostart=true
+autorestart=true
+stopsignal=TERM
+stopwaitsecs=60
+redirect_stderr=true
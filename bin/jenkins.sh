@@ -35,6 +35,8 @@ pip install -q -r requirements/compiled.txt
 pip install -q -r requirements/dev.txt
 
 cat > settings/local.py <<SETTINGS
+import os
+
 from settings.base import *
 
 ROOT_URLCONF = 'workspace.urls'
@@ -48,7 +50,8 @@ DATABASES = {
         'USER': 'hudson',
         'PASSWORD': '',
         'OPTIONS': {'init_command': 'SET storage_engine=InnoDB'},
-        'TEST_NAME': 'test_${JOB_NAME}',
+        # bin/parallel_tests.py gives each worker its own test database.
+        'TEST_NAME': 'test_${JOB_NAME}' + os.environ.get('TEST_DB_SUFFIX', ''),
         'TEST_CHARSET': 'utf8',
         'TEST_COLLATION': 'utf8_general_ci',
     }
@@ -62,8 +65,29 @@ echo "Creating database if we need it..."
 echo "CREATE DATABASE IF NOT EXISTS ${JOB_NAME}"|mysql -u $DB_USER -h $DB_HOST
 
 echo "Starting tests..."
-export FORCE_DB=1
-coverage run manage.py test --noinput --with-xunit
+# Set TEST_JOBS to split the tests across that many processes.
+if [ "${TEST_JOBS:-1}" -gt 1 ]; then
+  python bin/parallel_tests.py -j $TEST_JOBS
+else
+  coverage run manage.py test --noinput --with-xunit
+fi
 coverage xml $(find apps lib -name '*.py')
 
+echo "Running benchmarks..."
+# Compare against a fixed baseline. Regressions of more than 20% print a
+# "WARNING: Performance regressions" line, which the Text-finder plugin
+# can use to mark the build unstable; they do not fail it. The baseline is
+# only written when there is none: delete it, or build with
+# BENCH_UPDATE_BASELINE=1, to take this build's numbers as the new one.
+BENCH_BASELINE=$WORKSPACE/bench-baseline.json
+if [ -f "$BENCH_BASELINE" ]; then
+  python manage.py bench_views --output=bench-results.json \
+    --compare=$BENCH_BASELINE
+else
+  python manage.py bench_views --output=bench-results.json
+fi
+if [ ! -f "$BENCH_BASELINE" ] || [ -n "$BENCH_UPDATE_BASELINE" ]; then
+  cp bench-results.json $BENCH_BASELINE
+fi
+
 echo "FIN"
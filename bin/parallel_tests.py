@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+"""
+Usage: parallel_tests.py [options] [-- extra manage.py test arguments]
+Splits the test modules under the project across worker processes, runs
+each share with `coverage run -p manage.py test`, and merges the coverage
+data and the xunit reports into .coverage and nosetests.xml.
+
+Each worker N runs with TEST_DB_SUFFIX=_N in its environment, which
+settings/local.py appends to the test database name so that workers do not
+share a database.
+
+Options:
+  -h, --help            show this help message and exit
+  -j JOBS, --jobs=JOBS  Number of worker processes. Defaults to one per
+                        core.
+  --xunit-file=FILE     Merged xunit report. Defaults to nosetests.xml.
+"""
+
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from optparse import OptionParser
+from textwrap import dedent
+from xml.etree import ElementTree
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIRS = ('project', 'apps', 'lib')
+
+
+def find_test_modules(root=ROOT):
+    """``(dotted name, size in bytes)`` of every test module."""
+    found = []
+    for top in SOURCE_DIRS:
+        for dirpath, dirs, files in os.walk(os.path.join(root, top)):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in files:
+                if not name.endswith('.py'):
+                    continue
+                in_tests = os.path.basename(dirpath) == 'tests'
+                if not (name == 'tests.py' or
+                        (in_tests and name.startswith('test'))):
+                    continue
+                path = os.path.join(dirpath, name)
+                module = os.path.relpath(path, root)[:-3].replace(os.sep, '.')
+                found.append((module, os.path.getsize(path)))
+    return sorted(found)
+
+
+def shard(modules, count):
+    """Split modules into ``count`` shares of about equal total size,
+    largest first."""
+    shares = [[] for i in range(count)]
+    sizes = [0] * count
+    for module, size in sorted(modules, key=lambda m: -m[1]):
+        smallest = sizes.index(min(sizes))
+        shares[smallest].append(module)
+        sizes[smallest] += size
+    return [sorted(s) for s in shares if s]
+
+
+def run_shard(index, modules, extra_args):
+    env = dict(os.environ, TEST_DB_SUFFIX='_%d' % index)
+    xunit = 'nosetests-%d.xml' % index
+    log = open(os.path.join(ROOT, 'test-shard-%d.log' % index), 'w')
+    try:
+        proc = subprocess.Popen(
+            ['coverage', 'run', '-p', 'manage.py', 'test', '--noinput',
+             '--with-xunit', '--xunit-file=%s' % xunit] + extra_args +
+            modules, cwd=ROOT, env=env, stdout=log,
+            stderr=subprocess.STDOUT)
+        return proc, xunit
+    finally:
+        log.close()
+
+
+def merge_xunit(files, output):
+    """Combine nose xunit reports into one testsuite."""
+    totals = dict.fromkeys(('tests', 'errors', 'failures', 'skip'), 0)
+    merged = ElementTree.Element('testsuite', name='nosetests')
+    for path in files:
+        if not os.path.exists(path):
+            continue
+        suite = ElementTree.parse(path).getroot()
+        for key in totals:
+            totals[key] += int(suite.get(key, 0))
+        for case in suite:
+            merged.append(case)
+    for key, value in totals.items():
+        merged.set(key, str(value))
+    ElementTree.ElementTree(merged).write(output, encoding='UTF-8')
+    return totals
+
+
+def main():
+    usage = dedent("""\
+        %prog [options] [-- extra manage.py test arguments]
+        Splits the test modules across worker processes, each with its own
+        test database, and merges their coverage data and xunit reports.
+        """)
+    parser = OptionParser(usage=usage)
+    parser.add_option("-j", "--jobs", type="int", default=0,
+                      help="Number of worker processes. Defaults to one per "
+                           "core.")
+    parser.add_option("--xunit-file", default="nosetests.xml",
+                      help="Merged xunit report. Defaults to nosetests.xml.")
+    options, extra_args = parser.parse_args()
+    jobs = options.jobs or multiprocessing.cpu_count()
+
+    shares = shard(find_test_modules(), jobs)
+    if not shares:
+        # Nothing to split; let the test runner find what there is.
+        shares = [[]]
+
+    start = time.time()
+    for path in os.listdir(ROOT):
+        if path.startswith('.coverage.'):
+            os.remove(os.path.join(ROOT, path))
+    running = []
+    for index, modules in enumerate(shares):
+        proc, xunit = run_shard(index, modules, extra_args)
+        running.append((index, modules, proc, xunit, time.time()))
+
+    failed = []
+    for index, modules, proc, xunit, began in running:
+        status = proc.wait()
+        print 'Shard %d: %d modules, exit %s in %.1fs (test-shard-%d.log)' % (
+            index, len(modules), status, time.time() - began, index)
+        if status:
+            failed.append(index)
+            log = open(os.path.join(ROOT, 'test-shard-%d.log' % index))
+            try:
+                sys.stdout.write(log.read())
+            finally:
+                log.close()
+
+    subprocess.call(['coverage', 'combine'], cwd=ROOT)
+    totals = merge_xunit([os.path.join(ROOT, x) for i, m, p, x, b in running],
+                         os.path.join(ROOT, options.xunit_file))
+    print ('%(tests)d tests, %(failures)d failures, %(errors)d errors, '
+           '%(skip)d skipped' % totals +
+           ' in %.1fs across %d workers.' % (time.time() - start,
+                                              len(running)))
+    if failed:
+        print 'Shards %s failed.' % ', '.join(map(str, failed))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,6 +13,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from commander.deploy import task, hostgroups
 import commander_settings as settings
+from rolling import RollingDeploy, SSHRunner
 
 
 @task
@@ -29,32 +30,35 @@ def update_code(ctx, tag):
 def update_locales(ctx):
     """Update a locale directory from SVN.
 
-    Assumes localizations 1) exist, 2) are in SVN, 3) are in SRC_DIR/locale and
-    4) have a compile-mo.sh script. This should all be pretty standard, but
-    change it if you need to.
+    Assumes localizations 1) exist, 2) are in SVN and 3) are in
+    SRC_DIR/locale. This should all be pretty standard, but change it if you
+    need to. Only catalogs that changed are recompiled.
 
     """
     with ctx.lcd(os.path.join(settings.SRC_DIR, 'locale')):
         ctx.local('svn up')
-        ctx.local('./compile-mo.sh .')
+    with ctx.lcd(settings.SRC_DIR):
+        ctx.local('python2.6 bin/compile_mo.py locale')
 
 
 @task
 def update_assets(ctx):
     with ctx.lcd(settings.SRC_DIR):
         # LANG=en_US.UTF-8 is sometimes necessary for the YUICompressor.
-        ctx.local('LANG=en_US.UTF8 python2.6 manage.py compress_assets')
+        ctx.local('LANG=en_US.UTF8 python2.6 manage.py bundle_assets')
+        ctx.local('python2.6 manage.py compile_templates --force')
 
 
 @task
 def update_db(ctx):
     """Update the database schema, if necessary.
 
-    Uses schematic by default. Change to south if you need to.
+    Applies migrations/ in-process with ./manage.py migrate_schema, which
+    understands schematic's layout. Change to south if you need to.
 
     """
     with ctx.lcd(settings.SRC_DIR):
-        ctx.local('python2.6 ./vendor/src/schematic/schematic migrations')
+        ctx.local('python2.6 manage.py migrate_schema')
 
 
 @task
@@ -91,6 +95,37 @@ def update_celery(ctx):
     ctx.remote('/sbin/service %s restart' % settings.CELERY_SERVICE)
 
 
+def _rolling(hosts, commands, health_url=None):
+    deploy = RollingDeploy(hosts, commands, SSHRunner(settings.SSH_KEY),
+                           batch_size=settings.ROLLING_BATCH_SIZE,
+                           health_url=health_url,
+                           latency_budget=settings.HEALTH_LATENCY_BUDGET,
+                           warmup_timeout=settings.WARMUP_TIMEOUT)
+    if not deploy.run():
+        raise Exception('Rolling deploy aborted.')
+
+
+@task
+def deploy_app_rolling(ctx):
+    """Update webheads a batch at a time, waiting for each to warm up.
+
+    Unlike deploy_app, only ROLLING_BATCH_SIZE webheads are cold at once,
+    and a batch that does not come back healthy stops the rollout.
+    """
+    _rolling(settings.WEB_HOSTS,
+             [settings.REMOTE_UPDATE_SCRIPT,
+              '/bin/touch %s' % settings.REMOTE_WSGI],
+             health_url=settings.HEALTH_URL)
+
+
+@task
+def update_celery_rolling(ctx):
+    """Update and restart Celery a batch of hosts at a time."""
+    _rolling(settings.CELERY_HOSTS,
+             [settings.REMOTE_UPDATE_SCRIPT,
+              '/sbin/service %s restart' % settings.CELERY_SERVICE])
+
+
 @task
 def update_info(ctx):
     """Write info about the current state to a publicly visible file."""
@@ -100,7 +135,7 @@ def update_info(ctx):
         ctx.local('git log -3')
         ctx.local('git status')
         ctx.local('git submodule status')
-        ctx.local('python2.6 ./vendor/src/schematic/schematic -v migrations/')
+        ctx.local('python2.6 manage.py migrate_schema --status')
         with ctx.lcd('locale'):
             ctx.local('svn info')
             ctx.local('svn status')
@@ -126,8 +161,12 @@ def update(ctx):
 def deploy(ctx):
     install_cron()
     checkin_changes()
-    deploy_app()
-    update_celery()
+    if settings.ROLLING_DEPLOY:
+        deploy_app_rolling()
+        update_celery_rolling()
+    else:
+        deploy_app()
+        update_celery()
 
 
 @task
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+"""
+Rolling deploys: update hosts a batch at a time and only move on once the
+batch is serving healthy, fast responses again.
+
+deploy.py uses this over SSH. It does not need commander, so it can also be
+tried against local stand-in "hosts", e.g. dev servers on a few ports::
+
+    python bin/update/rolling.py --local --batch-size=2 \\
+        --health-url='http://%(host)s/' \\
+        --command='touch /tmp/restart-%(host)s' \\
+        127.0.0.1:8001 127.0.0.1:8002 127.0.0.1:8003
+"""
+
+import subprocess
+import sys
+import threading
+import time
+import urllib2
+from optparse import OptionParser
+
+
+class SSHRunner(object):
+    """Runs commands on remote hosts over ssh."""
+
+    def __init__(self, ssh_key=None, user=None):
+        self.ssh_key = ssh_key
+        self.user = user
+
+    def __call__(self, host, command):
+        args = ['ssh', '-o', 'BatchMode=yes']
+        if self.ssh_key:
+            args += ['-i', self.ssh_key]
+        target = '%s@%s' % (self.user, host) if self.user else host
+        return _run(args + [target, command])
+
+
+class LocalRunner(object):
+    """Runs the commands locally; ``%(host)s`` in them names the host."""
+
+    def __call__(self, host, command):
+        return _run(command % {'host': host}, shell=True)
+
+
+def _run(args, shell=False):
+    proc = subprocess.Popen(args, shell=shell, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT)
+    output = proc.communicate()[0]
+    return proc.returncode, output
+
+
+def check_health(url, timeout):
+    """Fetch ``url``; returns ``(ok, seconds, detail)``."""
+    start = time.time()
+    try:
+        response = urllib2.urlopen(url, timeout=timeout)
+        response.read()
+        status = response.getcode()
+    except urllib2.HTTPError, exc:
+        status = exc.code
+    except Exception, exc:
+        return False, time.time() - start, str(exc)
+    return status == 200, time.time() - start, 'HTTP %s' % status
+
+
+class RollingDeploy(object):
+    """Run ``commands`` on ``hosts`` in batches of ``batch_size``.
+
+    All hosts in a batch are updated in parallel. If ``health_url`` (with
+    ``%(host)s`` for the host) is given, each host in the batch is then
+    polled until it answers 200 within ``latency_budget`` seconds
+    ``healthy_checks`` times in a row. A host that fails a command or is
+    not healthy within ``warmup_timeout`` seconds aborts the rollout, and
+    the remaining batches are left alone.
+    """
+
+    def __init__(self, hosts, commands, runner, batch_size=1,
+                 health_url=None, latency_budget=1.0, warmup_timeout=120,
+                 healthy_checks=3, poll_interval=1.0, out=sys.stdout):
+        self.hosts = list(hosts)
+        self.commands = list(commands)
+        self.runner = runner
+        self.batch_size = max(1, batch_size)
+        self.health_url = health_url
+        self.latency_budget = latency_budget
+        self.warmup_timeout = warmup_timeout
+        self.healthy_checks = healthy_checks
+        self.poll_interval = poll_interval
+        self.out = out
+        self._lock = threading.Lock()
+
+    def log(self, host, msg):
+        with self._lock:
+            self.out.write('[%s] %s\n' % (host, msg))
+            self.out.flush()
+
+    def batches(self):
+        for i in range(0, len(self.hosts), self.batch_size):
+            yield self.hosts[i:i + self.batch_size]
+
+    def update_host(self, host):
+        for command in self.commands:
+            status, output = self.runner(host, command)
+            for line in output.splitlines():
+                self.log(host, line)
+            if status != 0:
+                self.log(host, '%r exited with status %s' % (command, status))
+                return False
+        return True
+
+    def wait_healthy(self, host):
+        """Poll until the host is healthy and fast; False on timeout."""
+        url = self.health_url % {'host': host}
+        deadline = time.time() + self.warmup_timeout
+        streak = 0
+        while time.time() < deadline:
+            ok, latency, detail = check_health(url, self.latency_budget * 2)
+            if ok and latency <= self.latency_budget:
+                streak += 1
+                if streak >= self.healthy_checks:
+                    self.log(host, 'healthy (%.0fms)' % (latency * 1000))
+                    return True
+            else:
+                streak = 0
+                self.log(host, 'not ready: %s in %.0fms' %
+                               (detail, latency * 1000))
+            time.sleep(self.poll_interval)
+        self.log(host, 'not healthy within %ss' % self.warmup_timeout)
+        return False
+
+    def _parallel(self, func, hosts):
+        results = {}
+
+        def work(host):
+            try:
+                results[host] = func(host)
+            except Exception, exc:
+                self.log(host, 'error: %s' % exc)
+                results[host] = False
+
+        threads = [threading.Thread(target=work, args=(host,))
+                   for host in hosts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return [host for host in hosts if not results.get(host)]
+
+    def run(self):
+        """Roll out to every host; returns True if all batches succeeded."""
+        start = time.time()
+        batches = list(self.batches())
+        for number, batch in enumerate(batches):
+            self.out.write('Batch %d/%d: %s\n' % (number + 1, len(batches),
+                                                  ', '.join(batch)))
+            failed = self._parallel(self.update_host, batch)
+            if not failed and self.health_url:
+                failed = self._parallel(self.wait_healthy, batch)
+            if failed:
+                self.out.write('Aborting rollout; %s failed, %d hosts left '
+                               'untouched.\n' %
+                               (', '.join(failed),
+                                sum(len(b) for b in batches[number + 1:])))
+                return False
+        self.out.write('Rolled out to %d hosts in %.1fs.\n' %
+                       (len(self.hosts), time.time() - start))
+        return True
+
+
+def main():
+    options = OptionParser(usage='%prog [options] HOST [HOST ...]')
+    options.add_option('--command', action='append', dest='commands',
+                       default=[], help='Command to run on each host; '
+                       'repeat for more than one.')
+    options.add_option('--batch-size', type='int', default=1)
+    options.add_option('--health-url',
+                       help='Health check URL; %(host)s is the host.')
+    options.add_option('--latency-budget', type='float', default=1.0,
+                       help='Seconds a health check may take.')
+    options.add_option('--warmup-timeout', type='float', default=120,
+                       help='Seconds a host has to become healthy.')
+    options.add_option('--local', action='store_true', default=False,
+                       help='Run commands locally instead of over ssh.')
+    options.add_option('--ssh-key')
+    (opts, hosts) = options.parse_args()
+    if not hosts or not opts.commands:
+        options.error('give at least one host and one --command')
+
+    runner = LocalRunner() if opts.local else SSHRunner(opts.ssh_key)
+    deploy = RollingDeploy(hosts, opts.commands, runner,
+                           batch_size=opts.batch_size,
+                           health_url=opts.health_url,
+                           latency_budget=opts.latency_budget,
+                           warmup_timeout=opts.warmup_timeout)
+    if not deploy.run():
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
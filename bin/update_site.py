@@ -10,13 +10,19 @@ Options:
                         Type of environment. One of (prod|dev|stage) Example:
                         update_site.py -e stage
   -v, --verbose         Echo actions before taking them.
+  -j JOBS, --jobs=JOBS  Number of steps to run at once. Defaults to 4.
+
+Independent steps run concurrently, with their output prefixed by the step
+name. A timing report and the critical path are printed at the end.
 """
 
 import os
+import subprocess
 import sys
+import threading
+import time
 from textwrap import dedent
 from optparse import  OptionParser
-from hashlib import md5
 
 # Constants
 PROJECT = 0
@@ -39,75 +45,199 @@ GIT_PULL = "git pull -q origin %(branch)s"
 GIT_SUBMODULE = "git submodule update --init"
 SVN_CO = "svn checkout --force %(url)s locale"
 SVN_UP = "svn update"
-COMPILE_MO = "./bin/compile-mo.sh %(localedir)s %(unique)s"
+COMPILE_MO = "python2.6 bin/compile_mo.py %(localedir)s"
+
+class Step(object):
+    """A shell command to run in ``cwd`` once all of ``deps`` succeeded."""
+
+    def __init__(self, name, command, cwd, deps=()):
+        self.name = name
+        self.command = command
+        self.cwd = cwd
+        self.deps = list(deps)
+        self.status = 'pending'
+        self.started = self.finished = None
+
+    @property
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return 0
+        return self.finished - self.started
+
+
+class Scheduler(object):
+    """Runs steps concurrently, each as soon as its dependencies are done.
+
+    Output is streamed line by line, prefixed with the step's name. When a
+    step fails, the steps that depend on it are skipped.
+    """
+
+    def __init__(self, steps, jobs=4, debug=False, out=sys.stdout):
+        self.steps = dict((step.name, step) for step in steps)
+        self.order = [step.name for step in steps]
+        for step in steps:
+            for dep in step.deps:
+                if dep not in self.steps:
+                    raise Exception("Step %s depends on unknown step %s" %
+                                    (step.name, dep))
+        self.jobs = jobs
+        self.debug = debug
+        self.out = out
+        self.width = max([len(name) for name in self.order] + [0])
+        self.cond = threading.Condition()
+        self.running = 0
 
-EXEC = 'exec'
-CHDIR = 'chdir'
+    def write(self, name, line):
+        with self.cond:
+            self.out.write("[%s] %s\n" % (name.ljust(self.width),
+                                          line.rstrip()))
+            self.out.flush()
 
+    def execute(self, step):
+        if self.debug:
+            self.write(step.name, "cd %s && %s" % (step.cwd, step.command))
+        step.started = time.time()
+        try:
+            proc = subprocess.Popen(step.command, shell=True, cwd=step.cwd,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT)
+            for line in iter(proc.stdout.readline, ''):
+                self.write(step.name, line)
+            status = proc.wait()
+        except OSError, exc:
+            self.write(step.name, str(exc))
+            status = -1
+        step.finished = time.time()
+        with self.cond:
+            step.status = 'ok' if status == 0 else 'failed'
+            if status != 0:
+                self.write(step.name, "exited with status %s" % status)
+            self.running -= 1
+            self.cond.notify_all()
 
-def update_site(env, debug):
+    def ready(self, step):
+        """True if runnable; marks it skipped if a dependency failed."""
+        statuses = [self.steps[dep].status for dep in step.deps]
+        if [s for s in statuses if s in ('failed', 'skipped')]:
+            step.status = 'skipped'
+            self.write(step.name, "skipped, a dependency failed")
+            return False
+        return all(s == 'ok' for s in statuses)
+
+    def run(self):
+        """Run every step; returns True if they all succeeded."""
+        with self.cond:
+            while True:
+                pending = [self.steps[name] for name in self.order
+                           if self.steps[name].status == 'pending']
+                if not pending and not self.running:
+                    break
+                started = False
+                for step in pending:
+                    if self.running >= self.jobs:
+                        break
+                    if self.ready(step):
+                        step.status = 'running'
+                        self.running += 1
+                        started = True
+                        thread = threading.Thread(target=self.execute,
+                                                  args=(step,))
+                        thread.daemon = True
+                        thread.start()
+                if not started and not self.running:
+                    # Whatever is left is waiting on a dependency cycle.
+                    for step in pending:
+                        if step.status == 'pending':
+                            step.status = 'skipped'
+                            self.write(step.name, "skipped, dependency cycle")
+                    break
+                if self.running:
+                    # A timeout keeps Ctrl-C working while we wait.
+                    self.cond.wait(1)
+        return all(step.status == 'ok' for step in self.steps.values())
+
+    def critical_path(self):
+        """The chain of steps that determined the total run time."""
+        done = [s for s in self.steps.values() if s.finished is not None]
+        if not done:
+            return []
+        step = max(done, key=lambda s: s.finished)
+        path = [step]
+        while True:
+            deps = [self.steps[d] for d in step.deps
+                    if self.steps[d].finished is not None]
+            if not deps:
+                break
+            step = max(deps, key=lambda s: s.finished)
+            path.append(step)
+        return list(reversed(path))
+
+    def report(self):
+        self.out.write("\nStep timings:\n")
+        for name in self.order:
+            step = self.steps[name]
+            self.out.write("  %s %8.2fs  %s\n" % (name.ljust(self.width),
+                                                  step.duration, step.status))
+        path = self.critical_path()
+        if path:
+            self.out.write("Critical path (%.2fs): %s\n" % (
+                sum(step.duration for step in path),
+                " -> ".join(step.name for step in path)))
+
+
+def update_site(env, debug, jobs=4):
     """Run through commands to update this site."""
-    error_updating = False
     here = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
     locale = os.path.join(here, 'locale')
-    unique = md5(locale).hexdigest()
+    vendor = os.path.join(here, 'vendor')
     project_branch = {'branch': ENV_BRANCH[env][PROJECT]}
     vendor_branch = {'branch': ENV_BRANCH[env][VENDOR]}
 
-    commands = [
-        (CHDIR, here),
-        (EXEC,  GIT_PULL % project_branch),
-        (EXEC,  GIT_SUBMODULE),
+    steps = [
+        Step('pull', GIT_PULL % project_branch, here),
+        Step('submodules', GIT_SUBMODULE, here, ['pull']),
     ]
 
     # Checkout the locale repo into locale/ if the URL is known
     if LOCALE_REPO_URL and not os.path.exists(os.path.join(locale, '.svn')):
-        commands += [
-            (EXEC, SVN_CO % {'url': LOCALE_REPO_URL}),
-            (EXEC, COMPILE_MO % {'localedir': locale, 'unique': unique}),
+        steps += [
+            Step('locale', SVN_CO % {'url': LOCALE_REPO_URL}, here),
+            Step('compile-mo', COMPILE_MO % {'localedir': locale}, here,
+                 ['locale', 'pull']),
         ]
 
     # Update locale dir if applicable
     if os.path.exists(os.path.join(locale, '.svn')):
-        commands += [
-            (CHDIR, locale),
-            (EXEC, SVN_UP),
-            (CHDIR, here),
-            (EXEC, COMPILE_MO % {'localedir': locale, 'unique': unique}),
+        steps += [
+            Step('locale', SVN_UP, locale),
+            Step('compile-mo', COMPILE_MO % {'localedir': locale}, here,
+                 ['locale', 'pull']),
         ]
     elif os.path.exists(os.path.join(locale, '.git')):
-        commands += [
-            (CHDIR, locale),
-            (EXEC, GIT_PULL % 'master'),
-            (CHDIR, here),
+        steps += [
+            Step('locale', GIT_PULL % {'branch': 'master'}, locale),
         ]
 
-    commands += [
-        (CHDIR, os.path.join(here, 'vendor')),
-        (EXEC,  GIT_PULL % vendor_branch),
-        (EXEC,  GIT_SUBMODULE),
-        (CHDIR, os.path.join(here)),
-        (EXEC, 'python2.6 vendor/src/schematic/schematic migrations/'),
-        (EXEC, 'python2.6 manage.py compress_assets'),
+    steps += [
+        Step('vendor-pull', GIT_PULL % vendor_branch, vendor, ['submodules']),
+        Step('vendor-submodules', GIT_SUBMODULE, vendor, ['vendor-pull']),
+        Step('migrate', 'python2.6 manage.py migrate_schema', here,
+             ['submodules', 'vendor-submodules']),
+        Step('bundle-assets', 'python2.6 manage.py bundle_assets', here,
+             ['submodules', 'vendor-submodules']),
+        Step('compile-templates',
+             'python2.6 manage.py compile_templates --force', here,
+             ['submodules', 'vendor-submodules']),
     ]
 
-    for cmd, cmd_args in commands:
-        if CHDIR == cmd:
-            if debug:
-                sys.stdout.write("cd %s\n" % cmd_args)
-            os.chdir(cmd_args)
-        elif EXEC == cmd:
-            if debug:
-                sys.stdout.write("%s\n" % cmd_args)
-            if not 0 == os.system(cmd_args):
-                error_updating = True
-                break
-        else:
-            raise Exception("Unknown type of command %s" % cmd)
+    scheduler = Scheduler(steps, jobs=jobs, debug=debug)
+    ok = scheduler.run()
+    scheduler.report()
 
-    if error_updating:
+    if not ok:
         sys.stderr.write("There was an error while updating. Please try again "
                          "later. Aborting.\n")
+    return ok
 
 
 def main():
@@ -126,12 +256,15 @@ def main():
     options.add_option("-v", "--verbose",
                        help="Echo actions before taking them.",
                        action="store_true", dest="verbose")
+    options.add_option("-j", "--jobs", type="int", default=4,
+                       help="Number of steps to run at once.")
     (opts, _) = options.parse_args()
 
     if opts.verbose:
         debug = True
     if opts.environment in ENV_BRANCH.keys():
-        update_site(opts.environment, debug)
+        if not update_site(opts.environment, debug, opts.jobs):
+            sys.exit(1)
     else:
         sys.stderr.write("Invalid environment!\n")
         options.print_help(sys.stderr)
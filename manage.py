@@ -2,6 +2,10 @@
 import os
 import sys
 
+# Set PLAYDOH_PROFILE_STARTUP=1 to get a report of where start-up time goes.
+from project.base import startup
+startup.install()
+
 # Edit this if necessary or override the variable in your environment.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
@@ -21,7 +25,9 @@ except ImportError:
     sys.path.remove(tmp_path)
 
 
-manage.setup_environ(__file__, more_pythonic=True)
+with startup.phase('setup_environ'):
+    manage.setup_environ(__file__, more_pythonic=True)
 
 if __name__ == "__main__":
-    manage.main()
+    with startup.phase('command'):
+        manage.main()
@@ -0,0 +1,199 @@
+"""Content-hashed, incrementally built MINIFY_BUNDLES.
+
+``./manage.py bundle_assets`` minifies each bundle in
+``settings.MINIFY_BUNDLES`` into a file whose name carries a hash of its
+contents, e.g. ``css/example_css-min.3b9c1f0e2a4d.css``, and records it in
+the manifest at ``settings.BUNDLE_MANIFEST``. A bundle whose input files have
+not changed since the last build is skipped. Each output file also gets a
+gzipped ``.gz`` sibling for :mod:`project.base.static` (or the front-end
+server) to send to clients that accept it.
+
+The ``css()`` and ``js()`` helpers in :mod:`project.base.helpers` link to the
+hashed files, which never change and so can be served with far-future
+cache headers. Hashed files that neither the manifest nor the one before it
+names are deleted. ``build.py`` gets build ids as ``compress_assets`` would
+write them, for jingo-minify's helpers to fall back on.
+"""
+
+import glob
+import gzip
+import json
+import os
+import re
+import subprocess
+import tempfile
+from hashlib import sha1
+
+from django.conf import settings
+
+
+HASH_LENGTH = 12
+HASHED_RE = re.compile(r'-min\.([0-9a-f]{%d})\.\w+$' % HASH_LENGTH)
+
+
+def media_path(*parts):
+    return os.path.join(settings.MEDIA_ROOT, *parts)
+
+
+def fingerprint(ftype, files):
+    """Hash of a bundle's input file names and contents."""
+    digest = sha1(ftype)
+    for name in files:
+        digest.update('\0%s\0' % name)
+        f = open(media_path(name), 'rb')
+        try:
+            digest.update(f.read())
+        finally:
+            f.close()
+    return digest.hexdigest()
+
+
+def yui_compressor():
+    """Path to the YUI Compressor jar that ships with jingo-minify."""
+    jar = getattr(settings, 'YUI_COMPRESSOR_JAR', None)
+    if jar:
+        return jar
+    import jingo_minify
+    root = os.path.dirname(os.path.abspath(jingo_minify.__file__))
+    jars = sorted(glob.glob(os.path.join(root, '*.jar')) +
+                  glob.glob(os.path.join(root, 'bin', '*.jar')))
+    if not jars:
+        raise IOError('No YUI Compressor jar found in %s; set '
+                      'YUI_COMPRESSOR_JAR.' % root)
+    return jars[-1]
+
+
+def gzip_file(path):
+    """Write ``path`` compressed to ``path.gz``."""
+    tmp = path + '.gz.tmp'
+    out = open(tmp, 'wb')
+    try:
+        compressed = gzip.GzipFile(os.path.basename(path), 'wb', 9, out)
+        f = open(path, 'rb')
+        try:
+            compressed.write(f.read())
+        finally:
+            f.close()
+        compressed.close()
+    finally:
+        out.close()
+    os.rename(tmp, path + '.gz')
+
+
+def build(ftype, bundle, files, java, jar):
+    """Concatenate and minify one bundle; returns its hashed file name.
+
+    Runs in a worker process, so it only takes and returns plain values.
+    """
+    concatenated = tempfile.NamedTemporaryFile(suffix='.' + ftype)
+    minified = tempfile.NamedTemporaryFile(suffix='.' + ftype)
+    try:
+        for name in files:
+            f = open(media_path(name), 'rb')
+            try:
+                concatenated.write(f.read())
+            finally:
+                f.close()
+            concatenated.write('\n')
+        concatenated.flush()
+
+        status = subprocess.call([java, '-jar', jar, '--type', ftype,
+                                  '--charset', 'utf-8', '-o', minified.name,
+                                  concatenated.name])
+        if status != 0:
+            raise RuntimeError('YUI Compressor failed on %s:%s (exit %s)' %
+                               (ftype, bundle, status))
+        content = open(minified.name, 'rb').read()
+    finally:
+        concatenated.close()
+        minified.close()
+
+    digest = sha1(content).hexdigest()[:HASH_LENGTH]
+    hashed = '%s/%s-min.%s.%s' % (ftype, bundle, digest, ftype)
+    # The unhashed name keeps jingo-minify's own helpers working.
+    for name in (hashed, '%s/%s-min.%s' % (ftype, bundle, ftype)):
+        out = open(media_path(name), 'wb')
+        try:
+            out.write(content)
+        finally:
+            out.close()
+        gzip_file(media_path(name))
+    return hashed
+
+
+def read_manifest():
+    """The manifest, or None if there is none or it cannot be read."""
+    try:
+        f = open(settings.BUNDLE_MANIFEST)
+    except IOError:
+        return None
+    try:
+        return json.load(f)
+    except ValueError:
+        return None
+    finally:
+        f.close()
+
+
+def write_manifest(manifest):
+    tmp = settings.BUNDLE_MANIFEST + '.tmp'
+    f = open(tmp, 'w')
+    try:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    finally:
+        f.close()
+    os.rename(tmp, settings.BUNDLE_MANIFEST)
+
+
+def write_build_id(manifest):
+    """Write ``build.py`` the way jingo-minify's ``compress_assets`` does,
+    so its helpers put a build id that changes with the bundles in their
+    URLs."""
+    build_id = sha1(''.join(sorted(e['fingerprint'] for e in
+                                   manifest.values()))).hexdigest()[:8]
+    hashes = dict((key, HASHED_RE.search(e['file']).group(1))
+                  for key, e in manifest.items())
+    tmp = os.path.join(settings.ROOT, 'build.py.tmp')
+    f = open(tmp, 'w')
+    try:
+        for name in ('CSS', 'JS', 'IMG'):
+            f.write('BUILD_ID_%s = %r\n' % (name, build_id))
+        f.write('BUNDLE_HASHES = %r\n' % hashes)
+    finally:
+        f.close()
+    os.rename(tmp, os.path.join(settings.ROOT, 'build.py'))
+
+
+def prune(keep):
+    """Delete hashed bundle files, and their ``.gz``, not in ``keep``;
+    returns how many were deleted."""
+    removed = 0
+    for ftype in settings.MINIFY_BUNDLES:
+        for path in glob.glob(media_path(ftype, '*-min.*.%s' % ftype)):
+            name = '%s/%s' % (ftype, os.path.basename(path))
+            if HASHED_RE.search(name) and name not in keep:
+                for stale in (path, path + '.gz'):
+                    if os.path.exists(stale):
+                        os.remove(stale)
+                removed += 1
+    return removed
+
+
+_manifest = None
+
+
+def bundle_url(ftype, bundle):
+    """URL of the hashed file for a bundle, or None if it was never built.
+
+    The manifest is read once per process, once it has been read
+    successfully; deploys restart the workers.
+    """
+    global _manifest
+    if _manifest is None:
+        _manifest = read_manifest()
+        if _manifest is None:
+            return None
+    entry = _manifest.get('%s:%s' % (ftype, bundle))
+    if entry is None:
+        return None
+    return settings.MEDIA_URL + entry['file']
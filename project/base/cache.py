@@ -0,0 +1,274 @@
+"""A two-tier cache backend: a per-process LRU in front of a shared cache.
+
+Configure the shared cache under its own alias and point ``LOCATION`` at
+it::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'project.base.cache.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {'L1_SIZE': 1000, 'L1_TTL': 10,
+                        'GENERATION_INTERVAL': 1},
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': '127.0.0.1:11211',
+        },
+    }
+
+The shared cache must be one that every worker sees, such as memcached;
+in front of a local-memory cache, other workers never hear of changes.
+
+Reads are answered from the in-process LRU (L1) when possible and from the
+shared cache (L2) otherwise. Writes and deletes go to both, and also bump a
+generation counter in L2 and record the changed keys under the new
+generation. Every process checks the counter at most every
+``GENERATION_INTERVAL`` seconds and drops the keys changed since it last
+looked from its L1. If it has fallen too far behind, or a record has
+already expired, it empties its L1 instead; so does ``clear()``. So another
+worker's ``set()`` or ``delete()`` goes unseen for at most about
+``GENERATION_INTERVAL`` seconds, and no L1 entry outlives ``L1_TTL``.
+
+Hits and misses are counted per tier, and reported by ``/__metrics__``.
+"""
+
+import cPickle as pickle
+import threading
+import time
+
+from django.core.cache import get_cache
+from django.core.cache.backends.base import BaseCache
+
+from project.base import metrics
+from project.base.lru import LRUCache
+
+
+GENERATION_KEY = 'tiered-cache:generation'
+# The generation only needs to outlive L1 entries; memcached treats
+# timeouts over 30 days as timestamps.
+GENERATION_TIMEOUT = 30 * 24 * 60 * 60
+# The keys each write changed, by generation. A process that is further
+# behind than MAX_REPLAY generations, or finds a record gone, empties L1.
+CHANGED_KEY = 'tiered-cache:changed:%d'
+CHANGED_TIMEOUT = 5 * 60
+MAX_REPLAY = 500
+
+_missing = object()
+_caches = []
+
+
+class TieredCache(BaseCache):
+
+    def __init__(self, location, params):
+        BaseCache.__init__(self, params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location
+        self.l1_ttl = options.get('L1_TTL', 10)
+        self.generation_interval = options.get('GENERATION_INTERVAL', 1)
+        self._l1 = LRUCache(options.get('L1_SIZE', 1000), self.l1_ttl)
+        self._l2 = None
+        self._generation = None
+        self._checked = 0
+        self._lock = threading.Lock()
+        self._generation_lock = threading.Lock()
+        self.l2_hits = self.l2_misses = 0
+        _caches.append(self)
+
+    @property
+    def shared(self):
+        if self._l2 is None:
+            self._l2 = get_cache(self.shared_alias)
+        return self._l2
+
+    def _check_generation(self):
+        if time.time() - self._checked < self.generation_interval:
+            return
+        # One thread checks; the others carry on with L1 meanwhile.
+        if not self._generation_lock.acquire(False):
+            return
+        try:
+            now = time.time()
+            if now - self._checked < self.generation_interval:
+                return
+            self._checked = now
+            generation = self.shared.get(GENERATION_KEY)
+            if generation != self._generation:
+                self._catch_up(self._generation, generation)
+                self._generation = generation
+        finally:
+            self._generation_lock.release()
+
+    def _catch_up(self, old, new):
+        """Drop what changed between generations ``old`` and ``new`` from
+        L1, or everything if that is not known."""
+        if old is None or new is None or not old < new <= old + MAX_REPLAY:
+            self._l1.clear()
+            return
+        names = [CHANGED_KEY % n for n in range(old + 1, new + 1)]
+        changed = self.shared.get_many(names)
+        if len(changed) < len(names):
+            self._l1.clear()
+            return
+        for keys in changed.values():
+            for key in keys:
+                self._l1.delete(key)
+
+    def _next_generation(self):
+        try:
+            return self.shared.incr(GENERATION_KEY)
+        except ValueError:
+            # Gone after a clear() or an eviction. Start again far from
+            # any generation a process may still hold, so that all of
+            # them empty their L1.
+            self.shared.add(GENERATION_KEY, int(time.time() * 1000000),
+                            GENERATION_TIMEOUT)
+            return self.shared.incr(GENERATION_KEY)
+
+    def _changed(self, local_keys):
+        """Tell other processes to drop ``local_keys`` from their L1."""
+        generation = self._next_generation()
+        self.shared.set(CHANGED_KEY % generation, list(local_keys),
+                        CHANGED_TIMEOUT)
+        with self._generation_lock:
+            # Nothing else changed in between; no need to replay our own.
+            if self._generation is not None and \
+                    generation == self._generation + 1:
+                self._generation = generation
+
+    def _bump_generation(self):
+        with self._generation_lock:
+            generation = self._next_generation()
+            self._l1.clear()
+            self._generation = generation
+            self._checked = time.time()
+
+    def _l1_set(self, key, value, timeout):
+        # Values are pickled like the local-memory backend does, so callers
+        # cannot change what other requests will get.
+        ttl = self.l1_ttl
+        if timeout is not None and timeout < ttl:
+            ttl = timeout
+        self._l1.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ttl)
+
+    def _l1_get(self, key):
+        value = self._l1.get(key, _missing)
+        if value is _missing:
+            return _missing
+        return pickle.loads(value)
+
+    def get(self, key, default=None, version=None):
+        self._check_generation()
+        local_key = self.make_key(key, version)
+        value = self._l1_get(local_key)
+        if value is not _missing:
+            return value
+        value = self.shared.get(key, _missing, version=version)
+        with self._lock:
+            if value is _missing:
+                self.l2_misses += 1
+            else:
+                self.l2_hits += 1
+        if value is _missing:
+            return default
+        self._l1_set(local_key, value, None)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._check_generation()
+        found = {}
+        remaining = []
+        for key in keys:
+            value = self._l1_get(self.make_key(key, version))
+            if value is _missing:
+                remaining.append(key)
+            else:
+                found[key] = value
+        if remaining:
+            shared = self.shared.get_many(remaining, version=version)
+            with self._lock:
+                self.l2_hits += len(shared)
+                self.l2_misses += len(remaining) - len(shared)
+            for key, value in shared.items():
+                self._l1_set(self.make_key(key, version), value, None)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=None, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        local_key = self.make_key(key, version)
+        self._changed([local_key])
+        self._l1_set(local_key, value, timeout)
+
+    def set_many(self, data, timeout=None, version=None):
+        self.shared.set_many(data, timeout, version=version)
+        local_keys = dict((key, self.make_key(key, version)) for key in data)
+        self._changed(local_keys.values())
+        for key, value in data.items():
+            self._l1_set(local_keys[key], value, timeout)
+
+    def add(self, key, value, timeout=None, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            local_key = self.make_key(key, version)
+            self._changed([local_key])
+            self._l1_set(local_key, value, timeout)
+        return added
+
+    def delete(self, key, version=None):
+        self.shared.delete(key, version=version)
+        local_key = self.make_key(key, version)
+        self._l1.delete(local_key)
+        self._changed([local_key])
+
+    def delete_many(self, keys, version=None):
+        self.shared.delete_many(keys, version=version)
+        local_keys = [self.make_key(key, version) for key in keys]
+        for local_key in local_keys:
+            self._l1.delete(local_key)
+        self._changed(local_keys)
+
+    def incr(self, key, delta=1, version=None):
+        # Counters are only ever read from the shared cache.
+        value = self.shared.incr(key, delta, version=version)
+        local_key = self.make_key(key, version)
+        self._l1.delete(local_key)
+        self._changed([local_key])
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        value = self.shared.decr(key, delta, version=version)
+        local_key = self.make_key(key, version)
+        self._l1.delete(local_key)
+        self._changed([local_key])
+        return value
+
+    def has_key(self, key, version=None):
+        return self.get(key, _missing, version=version) is not _missing
+
+    def clear(self):
+        self.shared.clear()
+        self._bump_generation()
+
+    def close(self, **kwargs):
+        if self._l2 is not None and hasattr(self._l2, 'close'):
+            self._l2.close(**kwargs)
+
+    def stats(self):
+        return {'l1_hits': self._l1.hits, 'l1_misses': self._l1.misses,
+                'l2_hits': self.l2_hits, 'l2_misses': self.l2_misses,
+                'l1_size': len(self._l1)}
+
+
+def _counters():
+    found = {}
+    for cache in _caches:
+        stats = cache.stats()
+        for tier in ('l1', 'l2'):
+            for result, stat in (('hit', 'hits'), ('miss', 'misses')):
+                key = ('playdoh_cache_requests_total',
+                       (('cache', cache.shared_alias), ('tier', tier),
+                        ('result', result)))
+                found[key] = found.get(key, 0) + stats[tier + '_' + stat]
+    return found
+
+metrics.register_counters(_counters)
@@ -0,0 +1,9 @@
+import cronjobs
+
+from project.base import reports
+
+
+@cronjobs.register
+def refresh_reports():
+    """Queue refreshes of the scheduled reports that are due."""
+    reports.refresh_scheduled()
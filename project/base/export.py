@@ -0,0 +1,176 @@
+"""Streaming exports of paged middleware results.
+
+Views return an ``HttpResponse`` around one of the generators here, so rows
+are written as they arrive and only a few pages are ever held in memory::
+
+    pages = prefetched(report_pages(fetch, params, per_page))
+    return http.HttpResponse(csv_stream(chain_pages(pages), FIELDS),
+                             content_type='text/csv; charset=utf-8')
+
+:func:`prefetched` fetches the next pages in a background thread while the
+current one is being written. When the client goes away the server calls
+``close()`` on the response, which closes the generators and stops the
+thread.
+"""
+
+import csv
+import json
+import threading
+import Queue
+from cStringIO import StringIO
+
+import commonware
+
+
+log = commonware.log.getLogger('playdoh')
+
+# Bytes of output gathered before a chunk is handed to the server.
+CHUNK_SIZE = 64 * 1024
+
+_done = object()
+
+
+def report_pages(fetch, params, per_page, first=None):
+    """Successive lists of hits from a paged middleware endpoint.
+
+    ``fetch(params)`` returns ``{'total': ..., 'hits': [...]}`` for the
+    ``page`` and ``per_page`` in ``params``. ``first`` is page 1, if it has
+    already been fetched. Without a ``total``, pages are fetched until one
+    comes back short.
+    """
+    page = 1
+    seen = 0
+    while True:
+        if page == 1 and first is not None:
+            result = first
+        else:
+            result = fetch(dict(params, page=page, per_page=per_page))
+        hits = result.get('hits') or []
+        if hits:
+            yield hits
+        seen += len(hits)
+        total = result.get('total')
+        if len(hits) < per_page or (total is not None and seen >= total):
+            return
+        page += 1
+
+
+def prefetched(iterable, depth=1):
+    """Iterate over ``iterable`` in a background thread, staying up to
+    ``depth`` items ahead of the caller."""
+    items = Queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def work():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_done, None))
+        except Exception, exc:
+            put((_done, exc))
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    thread = threading.Thread(target=work, name='prefetch')
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is _done:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def chain_pages(pages):
+    try:
+        for page in pages:
+            for row in page:
+                yield row
+    finally:
+        if hasattr(pages, 'close'):
+            pages.close()
+
+
+def _chunked(lines):
+    buf = []
+    size = 0
+    for line in lines:
+        buf.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield ''.join(buf)
+
+
+def _encode(value):
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def csv_stream(rows, fields):
+    """UTF-8 CSV of the ``fields`` of each row, with a header line."""
+    out = StringIO()
+    writer = csv.writer(out)
+
+    def lines():
+        writer.writerow(fields)
+        for row in rows:
+            writer.writerow([_encode(row.get(f)) for f in fields])
+            if out.tell() >= CHUNK_SIZE:
+                yield out.getvalue()
+                out.seek(0)
+                out.truncate()
+        yield out.getvalue()
+
+    return _stream(lines(), rows)
+
+
+def json_stream(rows, fields=None):
+    """A JSON array of the rows, or of their ``fields`` if given."""
+    def lines():
+        yield '['
+        sep = '\n'
+        for row in rows:
+            if fields:
+                row = dict((f, row.get(f)) for f in fields)
+            yield sep + json.dumps(row)
+            sep = ',\n'
+        yield '\n]\n'
+
+    return _stream(_chunked(lines()), rows)
+
+
+def _stream(chunks, rows):
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield chunk
+    except Exception:
+        # The status line has gone out; all that is left is to cut the
+        # export short and say why in the log.
+        log.exception('Export failed part way through')
+    finally:
+        if hasattr(rows, 'close'):
+            rows.close()
@@ -0,0 +1,250 @@
+"""Incremental, parallel extraction of L10n strings into .pot files.
+
+Files are found with the ``DOMAIN_METHODS`` patterns and parsed with the
+same extraction methods, keywords and comment tags as tower's ``extract``
+command. What each file yields is cached in ``.extract-cache.json`` next to
+the templates, keyed on a hash of the file and of the extraction settings,
+so a later run only parses files that changed. Those are parsed across a
+process pool, and the merged catalog lists messages in (file, line) order,
+so the same tree always gives the same .pot file.
+"""
+
+import json
+import multiprocessing
+import os
+import re
+import time
+from cStringIO import StringIO
+from hashlib import sha1
+
+from django.conf import settings
+
+from babel.messages.catalog import Catalog
+from babel.messages.extract import extract, DEFAULT_KEYWORDS
+from babel.messages.pofile import write_po
+from babel.util import pathmatch
+
+try:
+    from tower.management.commands import extract as tower_extract
+except ImportError:
+    tower_extract = None
+
+
+CACHE_FILE = '.extract-cache.json'
+# Bump when the cached format changes.
+CACHE_VERSION = 1
+CREATION_DATE_RE = re.compile(r'^"POT-Creation-Date: .*\\n"\n', re.M)
+
+
+def keywords():
+    return getattr(tower_extract, 'TOWER_KEYWORDS', DEFAULT_KEYWORDS)
+
+
+def comment_tags():
+    return list(getattr(tower_extract, 'COMMENT_TAGS', ()))
+
+
+def options_map():
+    return getattr(tower_extract, 'OPTIONS_MAP', {})
+
+
+def output_dir():
+    paths = getattr(settings, 'LOCALE_PATHS', None)
+    localedir = paths[0] if paths else os.path.join(settings.ROOT, 'locale')
+    return os.path.join(localedir, 'templates', 'LC_MESSAGES')
+
+
+def find_files(root, method_map):
+    """``(relative path, method)`` of every file matched by a pattern in
+    ``method_map``; the first matching pattern wins, as in babel."""
+    found = []
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs
+                         if not d.startswith('.') and not d.startswith('_'))
+        for name in sorted(files):
+            relpath = os.path.relpath(os.path.join(dirpath, name), root)
+            relpath = relpath.replace(os.sep, '/')
+            for pattern, method in method_map:
+                if pathmatch(pattern, relpath):
+                    found.append((relpath, method))
+                    break
+    return found
+
+
+def file_options(relpath):
+    for pattern, options in options_map().items():
+        if pathmatch(pattern, relpath):
+            return options
+    return {}
+
+
+def config_hash(method, options):
+    """Hash of everything besides the file that decides what it yields."""
+    return sha1(json.dumps([method, sorted(keywords().items()),
+                            comment_tags(), sorted(options.items())],
+                           sort_keys=True)).hexdigest()
+
+
+def file_hash(path):
+    f = open(path, 'rb')
+    try:
+        return sha1(f.read()).hexdigest()
+    finally:
+        f.close()
+
+
+def extract_file(args):
+    """Parse one file; returns ``(relpath, messages, error)``.
+
+    Messages are ``[lineno, message, comments, context]`` lists so that
+    they can go into the JSON cache as they are.
+    """
+    root, relpath, method, options = args
+    messages = []
+    f = open(os.path.join(root, relpath), 'rb')
+    try:
+        for found in extract(method, f, keywords(), comment_tags(), options):
+            # Babel yields (lineno, message, comments); tower's patched
+            # babel adds the message context.
+            lineno, message, comments = found[:3]
+            context = found[3] if len(found) > 3 else None
+            if isinstance(message, tuple):
+                message = list(message)
+            messages.append([lineno, message, list(comments), context])
+    except Exception, exc:
+        return relpath, None, '%s: %s' % (exc.__class__.__name__, exc)
+    finally:
+        f.close()
+    return relpath, messages, None
+
+
+def load_cache(path):
+    try:
+        f = open(path)
+    except IOError:
+        return {}
+    try:
+        cache = json.load(f)
+    except ValueError:
+        return {}
+    finally:
+        f.close()
+    if cache.get('version') != CACHE_VERSION:
+        return {}
+    return cache.get('files', {})
+
+
+def save_cache(path, files):
+    f = open(path + '.tmp', 'w')
+    try:
+        json.dump({'version': CACHE_VERSION, 'files': files}, f,
+                  sort_keys=True)
+    finally:
+        f.close()
+    os.rename(path + '.tmp', path)
+
+
+def build_catalog(domain, extracted):
+    """A catalog of ``{relpath: messages}`` added in (file, line) order."""
+    catalog = Catalog(domain=domain, charset='utf-8')
+    for relpath in sorted(extracted):
+        for lineno, message, comments, context in sorted(
+                extracted[relpath], key=lambda m: m[0]):
+            if isinstance(message, list):
+                message = tuple(message)
+            kwargs = {}
+            if context:
+                kwargs['context'] = context
+            catalog.add(message, None, [(relpath, lineno)],
+                        auto_comments=comments, **kwargs)
+    return catalog
+
+
+def write_catalog(catalog, path):
+    """Write ``catalog`` to ``path`` unless only the creation date would
+    change; returns whether the file was written."""
+    out = StringIO()
+    write_po(out, catalog, width=80)
+    content = out.getvalue()
+    if os.path.exists(path):
+        f = open(path)
+        try:
+            existing = f.read()
+        finally:
+            f.close()
+        if (CREATION_DATE_RE.sub('', existing) ==
+                CREATION_DATE_RE.sub('', content)):
+            return False
+    f = open(path + '.tmp', 'w')
+    try:
+        f.write(content)
+    finally:
+        f.close()
+    os.rename(path + '.tmp', path)
+    return True
+
+
+def extract_domain(domain, root=None, outdir=None, jobs=None, force=False):
+    """Extract the strings for one ``DOMAIN_METHODS`` domain.
+
+    Returns a dict with the .pot ``path``, whether it was ``written``, the
+    number of files ``parsed`` and ``cached``, the ``messages`` count, the
+    ``errors`` as ``(relpath, error)`` and the ``seconds`` it took. When a
+    file could not be parsed the .pot is left as it was, rather than
+    written without that file's strings.
+    """
+    start = time.time()
+    root = root or settings.ROOT
+    outdir = outdir or output_dir()
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    cache_path = os.path.join(outdir, CACHE_FILE)
+    cache = {} if force else load_cache(cache_path)
+    domain_cache = cache.get(domain, {})
+
+    new_cache = {}
+    extracted = {}
+    pending = []
+    for relpath, method in find_files(root, settings.DOMAIN_METHODS[domain]):
+        options = file_options(relpath)
+        entry = {'sha1': file_hash(os.path.join(root, relpath)),
+                 'config': config_hash(method, options)}
+        seen = domain_cache.get(relpath, {})
+        if (seen.get('sha1') == entry['sha1'] and
+                seen.get('config') == entry['config']):
+            new_cache[relpath] = seen
+            extracted[relpath] = seen['messages']
+            continue
+        new_cache[relpath] = entry
+        pending.append((root, relpath, method, options))
+
+    errors = []
+    if pending:
+        if jobs == 1 or len(pending) == 1:
+            results = map(extract_file, pending)
+        else:
+            pool = multiprocessing.Pool(jobs)
+            try:
+                results = pool.map(extract_file, pending)
+            finally:
+                pool.close()
+                pool.join()
+        for relpath, messages, error in results:
+            if error:
+                # Not cached, so that it is parsed again next time.
+                errors.append((relpath, error))
+                del new_cache[relpath]
+                continue
+            new_cache[relpath]['messages'] = messages
+            extracted[relpath] = messages
+
+    cache[domain] = new_cache
+    save_cache(cache_path, cache)
+
+    catalog = build_catalog(domain, extracted)
+    path = os.path.join(outdir, '%s.pot' % domain)
+    written = not errors and write_catalog(catalog, path)
+    return {'path': path, 'written': written, 'parsed': len(pending),
+            'cached': len(extracted) - len(pending) + len(errors),
+            'messages': len(catalog), 'errors': errors,
+            'seconds': time.time() - start}
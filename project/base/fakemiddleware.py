@@ -0,0 +1,146 @@
+"""A stand-in for the Socorro middleware, for offline development.
+
+Serves canned, deterministic JSON for the endpoints the crash-stats views
+use. Start it with ``./manage.py run_fake_middleware`` and point
+``SOCORRO_MIDDLEWARE_URL`` at it.
+"""
+
+import BaseHTTPServer
+import json
+import threading
+import time
+import urlparse
+from SocketServer import ThreadingMixIn
+
+
+PRODUCTS = {
+    'Firefox': ['10.0', '11.0a2', '12.0a1'],
+    'Thunderbird': ['10.0', '11.0a2'],
+    'SeaMonkey': ['2.7'],
+}
+
+
+def _signatures(product, version, count=20):
+    return [{'signature': '%s::crash_%d' % (product, i),
+             'count': 1000 / (i + 1),
+             'win_count': 600 / (i + 1),
+             'mac_count': 300 / (i + 1),
+             'linux_count': 100 / (i + 1),
+             'rank': i + 1}
+            for i in range(count)]
+
+
+def products_versions(parts, query):
+    return {'products': PRODUCTS}
+
+
+def topcrash(parts, query):
+    product = query.get('product', 'Firefox')
+    version = query.get('version', PRODUCTS.get(product, ['1.0'])[0])
+    return {'crashes': _signatures(product, version),
+            'totalNumberOfCrashes': 3000}
+
+
+def crashes_daily(parts, query):
+    product = query.get('product', 'Firefox')
+    days = int(query.get('days', 7))
+    return {'hits': [{'date': '2012-01-%02d' % (day + 1),
+                      'product': product,
+                      'count': 10000 + day * 250}
+                     for day in range(days)]}
+
+
+def products_builds(parts, query):
+    product = query.get('product', 'Firefox')
+    return [{'product': product,
+             'version': PRODUCTS.get(product, ['1.0'])[-1],
+             'buildid': 20120101000000 + i,
+             'platform': platform}
+            for i in range(3) for platform in ('Windows', 'Mac', 'Linux')]
+
+
+def report_list(parts, query):
+    page = int(query.get('page', 1))
+    per_page = int(query.get('per_page', 100))
+    total = int(query.get('total', 1000))
+    start = (page - 1) * per_page
+    stop = min(start + per_page, total)
+    return {'total': total,
+            'hits': [{'uuid': '%032x' % i,
+                      'signature': 'Firefox::crash_%d' % (i % 20),
+                      'date_processed': '2012-01-01T00:00:00',
+                      'product': 'Firefox',
+                      'version': '10.0',
+                      'os_name': ('Windows', 'Mac', 'Linux')[i % 3]}
+                     for i in range(start, stop)]}
+
+
+ENDPOINTS = {
+    'products/versions': products_versions,
+    'topcrash/sigs': topcrash,
+    'crashes/daily': crashes_daily,
+    'products/builds': products_builds,
+    'report/list': report_list,
+}
+
+
+class FakeMiddlewareHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep connections alive like the real one.
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        path = url.path.strip('/')
+        query = dict(urlparse.parse_qsl(url.query))
+        self.server.count(path)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+        for prefix, view in ENDPOINTS.items():
+            if path == prefix or path.startswith(prefix + '/'):
+                parts = path[len(prefix):].strip('/').split('/')
+                self._respond(200, view(parts, query))
+                return
+        self._respond(404, {'error': 'No such endpoint: %s' % path})
+
+    def _respond(self, status, data):
+        body = json.dumps(data)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format,
+                                                              *args)
+
+
+class FakeMiddleware(ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Threaded fake middleware server that counts requests per endpoint."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0), delay=0, verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self, address,
+                                           FakeMiddlewareHandler)
+        self.delay = delay
+        self.verbose = verbose
+        self.hits = {}
+        self._hits_lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://%s:%s' % self.server_address
+
+    def count(self, path):
+        with self._hits_lock:
+            self.hits[path] = self.hits.get(path, 0) + 1
+
+    def start(self):
+        """Serve from a daemon thread; handy from a shell or a test."""
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
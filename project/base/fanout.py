@@ -0,0 +1,240 @@
+"""Run independent backend calls concurrently within one view render.
+
+A view declares its calls up front and runs them together, so the page
+waits for the slowest call rather than the sum of all of them::
+
+    calls = Fanout(request)
+    calls.add('versions', client.fetch, '/products/versions/')
+    calls.add('topcrashers', client.fetch, '/topcrash/sigs/', timeout=2)
+    results = calls.run()
+    versions = results.get('versions')
+
+Calls run on a bounded, process-wide pool of worker threads. A call that
+raises or runs past its timeout is recorded in ``results.errors`` and the
+others are still returned. The pool's queue is bounded too: when it is
+full, calls fail straight away with :class:`FanoutSaturated` instead of
+waiting behind calls nobody is waiting for any more. While a call runs,
+:func:`remaining` gives the time left before its deadline, which the
+Socorro client uses as its socket timeout so abandoned calls give their
+worker back within the deadline. The time taken by each call is kept in
+``results.timings`` and appended to ``request.backend_timings`` so request
+instrumentation can report it.
+"""
+
+import Queue
+import threading
+import time
+
+from django.conf import settings
+
+import commonware
+
+from project.base import metrics
+
+
+log = commonware.log.getLogger('playdoh')
+
+
+class FanoutTimeout(Exception):
+    """A call did not finish within its timeout."""
+
+
+class FanoutSaturated(Exception):
+    """The pool had no room for another call."""
+
+
+_local = threading.local()
+
+
+def remaining(default=None):
+    """Seconds left before the deadline of the fan-out call running on this
+    thread, or ``default`` outside one. Never more than ``default``."""
+    deadline = getattr(_local, 'deadline', None)
+    if deadline is None:
+        return default
+    left = deadline - time.time()
+    if default is not None:
+        left = min(left, default)
+    return left
+
+
+class ThreadPool(object):
+    """A fixed number of daemon worker threads fed from a bounded queue."""
+
+    def __init__(self, size, queue_size=None):
+        self.size = size
+        if queue_size is None:
+            queue_size = size * 4
+        self.jobs = Queue.Queue(queue_size)
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            while len(self._workers) < self.size:
+                worker = threading.Thread(target=self._work,
+                                          name='fanout-%d' %
+                                               len(self._workers))
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                job()
+            except Exception:
+                log.exception('Unhandled error in fan-out worker')
+
+    def submit(self, job):
+        """Queue ``job``; raises :class:`FanoutSaturated` if the queue is
+        full."""
+        if len(self._workers) < self.size:
+            self._start()
+        try:
+            self.jobs.put_nowait(job)
+        except Queue.Full:
+            raise FanoutSaturated('All %d fan-out workers are busy and %d '
+                                  'calls are queued' % (self.size,
+                                                        self.jobs.maxsize))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPool(getattr(settings, 'FANOUT_POOL_SIZE', 8),
+                                   getattr(settings, 'FANOUT_QUEUE_SIZE',
+                                           None))
+    return _pool
+
+
+class _Call(object):
+
+    def __init__(self, name, func, args, kwargs, timeout):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = timeout
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.started = self.finished = None
+        self.deadline = None
+
+    def __call__(self):
+        self.started = time.time()
+        if self.deadline is not None and self.started >= self.deadline:
+            # Nobody is waiting for the result any more.
+            self.error = FanoutTimeout('%s was not started within %ss' %
+                                       (self.name, self.timeout))
+        else:
+            _local.deadline = self.deadline
+            try:
+                self.result = self.func(*self.args, **self.kwargs)
+            except Exception, exc:
+                self.error = exc
+            finally:
+                _local.deadline = None
+        self.finished = time.time()
+        self.done.set()
+
+
+class Results(object):
+    """Outcome of a :meth:`Fanout.run`."""
+
+    def __init__(self):
+        self.values = {}
+        self.errors = {}
+        self.timings = {}
+
+    def __getitem__(self, name):
+        if name in self.errors:
+            raise self.errors[name]
+        return self.values[name]
+
+    def __contains__(self, name):
+        return name in self.values
+
+    def get(self, name, default=None):
+        return self.values.get(name, default)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+class Fanout(object):
+    """A set of named backend calls to run concurrently."""
+
+    def __init__(self, request=None, pool=None, timeout=None):
+        self.request = request
+        self.pool = pool
+        if timeout is None:
+            timeout = getattr(settings, 'FANOUT_TIMEOUT', 10)
+        self.timeout = timeout
+        self.calls = []
+
+    def add(self, name, func, *args, **kwargs):
+        """Queue ``func(*args, **kwargs)`` under ``name``.
+
+        A ``timeout`` keyword, in seconds, overrides the default for this
+        call; it is not passed on to ``func``.
+        """
+        timeout = kwargs.pop('timeout', self.timeout)
+        self.calls.append(_Call(name, func, args, kwargs, timeout))
+        return self
+
+    def run(self):
+        """Run all calls and wait for them, up to each one's timeout."""
+        pool = self.pool or get_pool()
+        start = time.time()
+        results = Results()
+        for call in self.calls:
+            call.deadline = start + call.timeout
+            try:
+                pool.submit(call)
+            except FanoutSaturated, exc:
+                results.errors[call.name] = exc
+                results.timings[call.name] = 0.0
+
+        for call in self.calls:
+            if call.name in results.errors:
+                continue
+            left = call.deadline - time.time()
+            if left > 0:
+                call.done.wait(left)
+            if not call.done.isSet():
+                results.errors[call.name] = FanoutTimeout(
+                    '%s did not finish within %ss' % (call.name,
+                                                      call.timeout))
+                results.timings[call.name] = time.time() - start
+            elif call.error is not None:
+                results.errors[call.name] = call.error
+                results.timings[call.name] = call.finished - call.started
+            else:
+                results.values[call.name] = call.result
+                results.timings[call.name] = call.finished - call.started
+
+        metrics.add('upstream', time.time() - start)
+        for name, error in results.errors.items():
+            log.warning('Backend call %s failed: %s' % (name, error))
+        self._record(results)
+        return results
+
+    def _record(self, results):
+        if self.request is None:
+            return
+        timings = getattr(self.request, 'backend_timings', None)
+        if timings is None:
+            timings = self.request.backend_timings = []
+        for call in self.calls:
+            timings.append((call.name, results.timings[call.name],
+                            call.name not in results.errors))
@@ -0,0 +1,88 @@
+"""A ``{% cache %}`` tag for caching rendered template fragments.
+
+Usage::
+
+    {% cache 'footer' %}...{% endcache %}
+    {% cache 'topcrashers', 600, product, version %}...{% endcache %}
+
+The first argument names the fragment, the optional second one is the
+timeout in seconds (``settings.FRAGMENT_CACHE_TIMEOUT`` by default) and any
+further arguments are extra values the fragment varies on. Fragments always
+vary on the active locale and on whether the mobile or desktop site is being
+rendered.
+
+Fragments do not vary on the deployed assets, so keep ``css()`` and ``js()``
+tags out of them: a cached tag would keep linking to the previous bundle
+after a deploy until it expired.
+
+Rendered fragments are stored in the Django cache, and the most recently
+used ones are also kept in a small in-process LRU
+(``settings.FRAGMENT_CACHE_LOCAL_SIZE`` entries) so hot fragments do not
+cost a cache round trip. Other workers cannot invalidate that copy, so it
+is kept for at most ``settings.FRAGMENT_CACHE_LOCAL_TTL`` seconds.
+"""
+
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+
+import jinja2
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from project.base.lru import LRUCache
+
+
+def fragment_key(name, lang, mobile, vary):
+    parts = [name, lang, mobile and 'mobile' or 'desktop']
+    parts.extend(repr(v) for v in vary)
+    return 'fragment:%s' % md5(u'|'.join(map(unicode, parts))
+                                  .encode('utf-8')).hexdigest()
+
+
+class FragmentCacheExtension(Extension):
+    tags = set(['cache'])
+
+    def __init__(self, environment):
+        super(FragmentCacheExtension, self).__init__(environment)
+        self.local = LRUCache(
+            getattr(settings, 'FRAGMENT_CACHE_LOCAL_SIZE', 500))
+        self.local_ttl = getattr(settings, 'FRAGMENT_CACHE_LOCAL_TTL', 30)
+
+    def parse(self, parser):
+        lineno = parser.stream.next().lineno
+        args = [nodes.ContextReference(), parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        vary = []
+        while parser.stream.skip_if('comma'):
+            vary.append(parser.parse_expression())
+        args.append(nodes.List(vary))
+
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cache', args),
+                               [], [], body).set_lineno(lineno)
+
+    def _cache(self, context, name, timeout, vary, caller):
+        if not getattr(settings, 'FRAGMENT_CACHE_ENABLED', True):
+            return caller()
+        if timeout is None:
+            timeout = getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 300)
+        request = context.get('request')
+        key = fragment_key(name,
+                           context.get('LANG') or translation.get_language(),
+                           getattr(request, 'MOBILE', False), vary)
+
+        rendered = self.local.get(key)
+        if rendered is None:
+            rendered = cache.get(key)
+            if rendered is None:
+                rendered = unicode(caller())
+                cache.set(key, rendered, timeout)
+            if self.local.maxsize:
+                self.local.set(key, rendered, min(timeout, self.local_ttl))
+        return jinja2.Markup(rendered)
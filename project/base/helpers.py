@@ -0,0 +1,51 @@
+from django.conf import settings
+
+import jinja2
+from jingo import register
+from jingo_minify import helpers as minify_helpers
+
+from project.base.bundles import bundle_url
+from project.base.static import revision
+
+
+# These replace jingo-minify's helpers of the same name: when a bundle has
+# been built by ./manage.py bundle_assets, link to its content-hashed file.
+
+@register.function
+def css(bundle, media=False, debug=None):
+    if debug is None:
+        debug = settings.TEMPLATE_DEBUG
+    url = not debug and bundle_url('css', bundle)
+    if not url:
+        return minify_helpers.css(bundle, media=media, debug=debug)
+    if not media:
+        media = getattr(settings, 'CSS_MEDIA_DEFAULT', 'screen,projection,tv')
+    return jinja2.Markup('<link rel="stylesheet" media="%s" href="%s" />' %
+                         (media, url))
+
+
+@register.function
+def js(bundle, debug=None, defer=False, async=False):
+    if debug is None:
+        debug = settings.TEMPLATE_DEBUG
+    url = not debug and bundle_url('js', bundle)
+    if not url:
+        return minify_helpers.js(bundle, debug=debug, defer=defer,
+                                 async=async)
+    attrs = ['src="%s"' % url]
+    if defer:
+        attrs.append('defer')
+    if async:
+        attrs.append('async')
+    return jinja2.Markup('<script %s></script>' % ' '.join(attrs))
+
+
+@register.function
+def media(url):
+    """URL of a file under MEDIA_ROOT, with the deployed revision as query
+    string so that it can be cached until the next deploy."""
+    current = revision()
+    url = settings.MEDIA_URL + url
+    if current:
+        url = '%s?%s' % (url, current)
+    return url
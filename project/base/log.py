@@ -0,0 +1,224 @@
+"""Logging that stays off the request path.
+
+Writing to syslog from inside a view adds I/O latency to every response
+that logs, which a burst of bleached submissions turns into a slowdown for
+everyone. Here, events are put on a bounded in-process queue and written
+in batches by a background thread instead.
+
+:func:`log_cef` is a drop-in replacement for ``funfactory.log.log_cef``;
+:class:`QueuedHandler` does the same for ordinary loggers and can be used
+from ``LOGGING`` in the settings.
+"""
+
+import atexit
+import copy
+import logging
+import sys
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.http import HttpRequest
+from django.utils.importlib import import_module
+
+from funfactory import log as funfactory_log
+
+
+DROP_NEW = 'drop_new'  # Discard the event being logged.
+DROP_OLD = 'drop_old'  # Discard the oldest queued event to make room.
+BLOCK = 'block'        # Wait up to block_timeout for room, then drop.
+POLICIES = (DROP_NEW, DROP_OLD, BLOCK)
+
+
+class BackgroundQueue(object):
+    """A bounded queue drained in batches by a daemon thread.
+
+    ``consume`` is called with a list of at most ``batch_size`` items
+    whenever ``batch_size`` items are waiting or ``flush_interval`` seconds
+    have passed. When the queue already holds ``capacity`` items, ``policy``
+    decides what gets dropped; every dropped item is counted in
+    ``dropped``.
+    """
+
+    def __init__(self, consume, capacity=1000, batch_size=100,
+                 flush_interval=1.0, policy=DROP_NEW, block_timeout=0.1,
+                 name='background-queue'):
+        if policy not in POLICIES:
+            raise ValueError('Unknown drop policy %r; use one of %s' %
+                             (policy, ', '.join(POLICIES)))
+        self.consume = consume
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.name = name
+        self.queued = self.written = self.dropped = self.failed = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def put(self, item):
+        """Queue ``item``; returns False if it had to be dropped."""
+        with self._cond:
+            if self._thread is None:
+                self._start()
+            if len(self._items) >= self.capacity:
+                if self.policy == DROP_OLD:
+                    self._items.popleft()
+                    self.dropped += 1
+                elif self.policy == BLOCK:
+                    deadline = time.time() + self.block_timeout
+                    while len(self._items) >= self.capacity:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            self.dropped += 1
+                            return False
+                        self._cond.wait(remaining)
+                else:
+                    self.dropped += 1
+                    return False
+            self._items.append(item)
+            self.queued += 1
+            if len(self._items) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def _take(self):
+        batch = []
+        while self._items and len(batch) < self.batch_size:
+            batch.append(self._items.popleft())
+        # Wake up producers blocked on a full queue.
+        self._cond.notify_all()
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._items) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                batch = self._take()
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        try:
+            self.consume(batch)
+            self.written += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            # Logging from here could land right back on this queue.
+            sys.stderr.write('%s: failed to write %d events\n' %
+                             (self.name, len(batch)))
+
+    def flush(self):
+        """Write out everything queued so far from the calling thread."""
+        while True:
+            with self._cond:
+                batch = self._take()
+            if not batch:
+                return
+            self._write(batch)
+
+    def stats(self):
+        return {'queued': self.queued, 'written': self.written,
+                'dropped': self.dropped, 'failed': self.failed,
+                'pending': len(self._items)}
+
+
+def _resolve(dotted):
+    module, name = dotted.rsplit('.', 1)
+    return getattr(import_module(module), name)
+
+
+class QueuedHandler(logging.Handler):
+    """Formats records in the caller's thread and hands them to ``target``
+    from a :class:`BackgroundQueue`.
+
+    ``target`` is a handler instance or the dotted path of a handler class,
+    which is then built with ``target_options``. Records are formatted
+    before they are queued so that anything the formatter reads from the
+    current request (like commonware's REMOTE_ADDR) is still available.
+    """
+
+    def __init__(self, target, target_options=None, capacity=1000,
+                 batch_size=100, flush_interval=1.0, policy=DROP_NEW):
+        logging.Handler.__init__(self)
+        if isinstance(target, basestring):
+            target = _resolve(target)(**(target_options or {}))
+        self.target = target
+        self.queue = BackgroundQueue(self._consume, capacity=capacity,
+                                     batch_size=batch_size,
+                                     flush_interval=flush_interval,
+                                     policy=policy, name='queued-log')
+
+    def prepare(self, record):
+        # Other handlers may still need the original record.
+        msg = self.format(record)
+        record = copy.copy(record)
+        record.message = record.msg = msg
+        record.args = None
+        record.exc_info = record.exc_text = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def _consume(self, records):
+        for record in records:
+            self.target.handle(record)
+
+    def flush(self):
+        self.queue.flush()
+        self.target.flush()
+
+    def close(self):
+        self.queue.flush()
+        self.target.close()
+        logging.Handler.close(self)
+
+
+def _environ(env):
+    """Copy what CEF needs out of a request, so it can outlive it."""
+    if isinstance(env, HttpRequest):
+        meta = env.META
+    elif isinstance(env, dict):
+        meta = env
+    else:
+        return {}
+    return dict((k, v) for k, v in meta.items() if isinstance(v, basestring))
+
+
+def _write_cef(events):
+    for args, kwargs in events:
+        funfactory_log.log_cef(*args, **kwargs)
+
+
+_cef_queue = None
+_cef_queue_lock = threading.Lock()
+
+
+def get_cef_queue():
+    global _cef_queue
+    if _cef_queue is None:
+        with _cef_queue_lock:
+            if _cef_queue is None:
+                options = getattr(settings, 'CEF_QUEUE', {})
+                _cef_queue = BackgroundQueue(_write_cef, name='cef-log',
+                                             **options)
+    return _cef_queue
+
+
+def log_cef(name, severity, env, *args, **kwargs):
+    """Queue a CEF event; same arguments as ``funfactory.log.log_cef``."""
+    get_cef_queue().put(((name, severity, _environ(env)) + args, kwargs))
@@ -0,0 +1,91 @@
+"""A small, thread-safe, size-bounded LRU mapping with optional expiry."""
+
+import threading
+import time
+
+
+_PREV, _NEXT, _KEY, _VALUE, _EXPIRES = range(5)
+_missing = object()
+
+
+class LRUCache(object):
+    """Keeps at most ``maxsize`` entries, evicting the least recently used.
+
+    ``ttl`` is the default lifetime of an entry in seconds; ``None`` means
+    entries only leave the cache by eviction. ``hits`` and ``misses`` count
+    lookups so callers can size the cache.
+    """
+
+    def __init__(self, maxsize=1000, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = self.misses = 0
+        self._map = {}
+        self._root = root = []
+        root[:] = [root, root, None, None, None]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._map)
+
+    def __contains__(self, key):
+        return self.get(key, _missing, count=False) is not _missing
+
+    def _unlink(self, link):
+        link[_PREV][_NEXT] = link[_NEXT]
+        link[_NEXT][_PREV] = link[_PREV]
+
+    def _append(self, link):
+        root = self._root
+        last = root[_PREV]
+        link[_PREV], link[_NEXT] = last, root
+        last[_NEXT] = root[_PREV] = link
+
+    def get(self, key, default=None, count=True):
+        with self._lock:
+            link = self._map.get(key)
+            if link is not None and link[_EXPIRES] is not None and \
+                    link[_EXPIRES] <= time.time():
+                self._unlink(link)
+                del self._map[key]
+                link = None
+            if link is None:
+                if count:
+                    self.misses += 1
+                return default
+            self._unlink(link)
+            self._append(link)
+            if count:
+                self.hits += 1
+            return link[_VALUE]
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        expires = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            link = self._map.get(key)
+            if link is not None:
+                self._unlink(link)
+                link[_VALUE], link[_EXPIRES] = value, expires
+            else:
+                link = [None, None, key, value, expires]
+                self._map[key] = link
+                if len(self._map) > self.maxsize:
+                    oldest = self._root[_NEXT]
+                    self._unlink(oldest)
+                    del self._map[oldest[_KEY]]
+            self._append(link)
+
+    def delete(self, key):
+        with self._lock:
+            link = self._map.pop(key, None)
+            if link is not None:
+                self._unlink(link)
+
+    def clear(self):
+        with self._lock:
+            self._map.clear()
+            root = self._root
+            root[:] = [root, root, None, None, None]
+
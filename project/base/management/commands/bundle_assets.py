@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from project.base import bundles
+
+
+class Command(BaseCommand):
+    help = ('Minify changed MINIFY_BUNDLES in parallel into content-hashed '
+            'files.')
+    option_list = BaseCommand.option_list + (
+        make_option('--force', action='store_true', default=False,
+                    help='Rebuild every bundle, changed or not.'),
+        make_option('-j', '--jobs', type='int', default=0,
+                    help='Worker processes; defaults to one per core.'),
+    )
+    requires_model_validation = False
+
+    def handle(self, **options):
+        start = time.time()
+        manifest = bundles.read_manifest() or {}
+        previous = set(entry['file'] for entry in manifest.values())
+        java = getattr(settings, 'JAVA_BIN', 'java')
+        jar = bundles.yui_compressor()
+
+        pending = []
+        skipped = 0
+        for ftype, bundle_map in settings.MINIFY_BUNDLES.items():
+            for bundle, files in bundle_map.items():
+                key = '%s:%s' % (ftype, bundle)
+                digest = bundles.fingerprint(ftype, files)
+                entry = manifest.get(key)
+                if (not options['force'] and entry and
+                        entry['fingerprint'] == digest and
+                        os.path.exists(bundles.media_path(entry['file'])) and
+                        os.path.exists(bundles.media_path(entry['file'] +
+                                                          '.gz'))):
+                    skipped += 1
+                    continue
+                pending.append((key, digest, (ftype, bundle, files, java,
+                                              jar)))
+
+        failed = 0
+        if pending:
+            pool = multiprocessing.Pool(options['jobs'] or None)
+            try:
+                jobs = [(key, digest, pool.apply_async(bundles.build, args))
+                        for key, digest, args in pending]
+                for key, digest, job in jobs:
+                    try:
+                        filename = job.get()
+                    except Exception, exc:
+                        failed += 1
+                        self.stderr.write('%s: %s\n' % (key, exc))
+                        continue
+                    manifest[key] = {'fingerprint': digest, 'file': filename}
+                    self.stdout.write('Built %s\n' % filename)
+            finally:
+                pool.close()
+                pool.join()
+
+        # Forget bundles that were removed from the settings.
+        current = set('%s:%s' % (ftype, bundle)
+                      for ftype, bundle_map in settings.MINIFY_BUNDLES.items()
+                      for bundle in bundle_map)
+        for key in list(manifest):
+            if key not in current:
+                del manifest[key]
+        bundles.write_manifest(manifest)
+        bundles.write_build_id(manifest)
+
+        # Workers still running the previous deploy may link to its files,
+        # so those are kept until the next build.
+        files = set(entry['file'] for entry in manifest.values())
+        pruned = bundles.prune(files | previous)
+
+        self.stdout.write('%d built, %d unchanged, %d failed, %d old files '
+                          'pruned in %.2fs.\n' %
+                          (len(pending) - failed, skipped, failed, pruned,
+                           time.time() - start))
+        if failed:
+            raise CommandError('%d bundles failed to build.' % failed)
@@ -0,0 +1,48 @@
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+import jingo
+
+from project.base.templatecache import bytecode_cache, template_names
+
+
+class Command(BaseCommand):
+    help = 'Precompile all Jinja templates into the bytecode cache.'
+    option_list = BaseCommand.option_list + (
+        make_option('--force', action='store_true', default=False,
+                    help='Throw away the existing cache first.'),
+    )
+
+    def handle(self, **options):
+        cache = bytecode_cache()
+        if cache is None:
+            raise CommandError('JINJA_BYTECODE_DIR is not set or cannot be '
+                               'created.')
+        if options['force']:
+            cache.clear()
+
+        env = jingo.get_env()
+        if env.bytecode_cache is None:
+            # The environment may have been set up before the directory
+            # existed; compile into the cache regardless.
+            env.bytecode_cache = cache
+
+        failed = []
+        total = time.time()
+        for name in template_names():
+            start = time.time()
+            try:
+                env.get_template(name)
+            except Exception, exc:
+                failed.append(name)
+                self.stderr.write('%s: %s\n' % (name, exc))
+                continue
+            self.stdout.write('%8.1fms  %s\n' %
+                              ((time.time() - start) * 1000, name))
+        self.stdout.write('Compiled templates into %s in %.2fs.\n' %
+                          (settings.JINJA_BYTECODE_DIR, time.time() - total))
+        if failed:
+            raise CommandError('%d templates failed to compile.' % len(failed))
@@ -0,0 +1,33 @@
+import signal
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from project.base.scheduler import Scheduler
+
+
+class Command(BaseCommand):
+    help = 'Run the jobs in CRON_SCHEDULE from one long-lived process.'
+    option_list = BaseCommand.option_list + (
+        make_option('--list', action='store_true', default=False,
+                    help='Print the scheduled jobs and exit.'),
+    )
+
+    def handle(self, **options):
+        scheduler = Scheduler.from_settings()
+        if options['list']:
+            for job in scheduler.jobs:
+                self.stdout.write('%-30s every %ss%s\n' %
+                                  (job.name, job.interval,
+                                   ' (locked)' if job.lock else ''))
+            return
+
+        def stop(signum, frame):
+            scheduler.stop()
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write('Scheduling %d jobs.\n' % len(scheduler.jobs))
+        sys.stdout.flush()
+        scheduler.run_forever()
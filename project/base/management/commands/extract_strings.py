@@ -0,0 +1,55 @@
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from project.base.extract import extract_domain, output_dir
+
+
+class Command(BaseCommand):
+    help = ('Extract L10n strings into .pot files like tower\'s extract, '
+            'parsing only the files that changed since the last run, across '
+            'a process pool.')
+    option_list = BaseCommand.option_list + (
+        make_option('-d', '--domain', action='append', default=[],
+                    help='Domain from DOMAIN_METHODS to extract. May be '
+                         'given more than once; defaults to all of them.'),
+        make_option('-o', '--output-dir', default=None,
+                    help='Where to write the .pot files. Defaults to '
+                         'templates/LC_MESSAGES in the first of '
+                         'LOCALE_PATHS.'),
+        make_option('-j', '--jobs', type='int', default=None,
+                    help='Number of parser processes. Defaults to one per '
+                         'core.'),
+        make_option('--force', action='store_true', default=False,
+                    help='Ignore the cache and parse every file.'),
+    )
+
+    def handle(self, **options):
+        domains = options['domain'] or sorted(settings.DOMAIN_METHODS)
+        unknown = [d for d in domains if d not in settings.DOMAIN_METHODS]
+        if unknown:
+            raise CommandError('Unknown domain: %s' % ', '.join(unknown))
+
+        outdir = options['output_dir'] or output_dir()
+        failed = 0
+        for domain in domains:
+            result = extract_domain(domain, outdir=outdir,
+                                    jobs=options['jobs'],
+                                    force=options['force'])
+            for relpath, error in result['errors']:
+                self.stderr.write('%s: %s\n' % (relpath, error))
+            failed += len(result['errors'])
+            if result['errors']:
+                status = 'not written'
+            elif result['written']:
+                status = 'written'
+            else:
+                status = 'unchanged'
+            self.stdout.write(
+                '%s: %d messages, %d files parsed, %d cached, %s in '
+                '%.2fs.\n' % (result['path'], result['messages'],
+                              result['parsed'], result['cached'], status,
+                              result['seconds']))
+        if failed:
+            raise CommandError('%d files could not be parsed.' % failed)
@@ -0,0 +1,39 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from project.base.schema import (migrations_dir, MigrationError,
+                                 MigrationRunner)
+
+
+class Command(BaseCommand):
+    help = 'Apply pending migrations/ over a single database connection.'
+    option_list = BaseCommand.option_list + (
+        make_option('--database', default='default',
+                    help='Database alias to migrate.'),
+        make_option('--status', action='store_true', default=False,
+                    help='Show the current version, pending migrations and '
+                         'past timings instead of migrating.'),
+    )
+
+    def handle(self, **options):
+        runner = MigrationRunner(migrations_dir(), using=options['database'],
+                                 out=self.stdout)
+
+        if options['status']:
+            # Only look; the tables are created by the first migrate.
+            self.stdout.write('Current version: %s\n' %
+                              runner.current_version())
+            for version, name, duration, applied in runner.history():
+                self.stdout.write('  %s  %8dms  %s\n' %
+                                  (applied, duration, name))
+            for migration in runner.pending():
+                self.stdout.write('  pending  %s\n' % migration.name)
+            return
+
+        try:
+            applied = runner.migrate()
+        except MigrationError, exc:
+            raise CommandError(str(exc))
+        self.stdout.write('%d migrations applied; now at version %s.\n' %
+                          (len(applied), runner.current_version()))
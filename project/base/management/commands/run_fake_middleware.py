@@ -0,0 +1,27 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from project.base.fakemiddleware import FakeMiddleware
+
+
+class Command(BaseCommand):
+    help = 'Serve canned Socorro middleware responses for offline work.'
+    option_list = BaseCommand.option_list + (
+        make_option('--host', default='127.0.0.1',
+                    help='Interface to listen on.'),
+        make_option('--port', default=8883, type='int',
+                    help='Port to listen on.'),
+        make_option('--delay', default=0, type='float',
+                    help='Seconds to sleep before each response.'),
+    )
+
+    def handle(self, **options):
+        server = FakeMiddleware((options['host'], options['port']),
+                                delay=options['delay'],
+                                verbose=int(options['verbosity']) > 1)
+        self.stdout.write('Fake middleware listening on %s\n' % server.url)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,336 @@
+"""Per-view latency histograms.
+
+:class:`LatencyMiddleware` records four timings for every request, under
+the name of the URL pattern that served it (``examples.home``):
+
+* ``wall``: the whole request, through the middleware below this one;
+* ``db``: time spent in database cursor calls;
+* ``template``: time spent rendering Jinja templates;
+* ``upstream``: time the request thread spent waiting on the Socorro
+  middleware, directly or through a :class:`~project.base.fanout.Fanout`.
+
+Each is a fixed-bucket histogram held in process. Every
+``METRICS_FLUSH_INTERVAL`` seconds a process writes its histograms to its
+own file in ``METRICS_DIR``; :func:`Registry.collect` adds up the files of
+all processes for the ``/__metrics__`` view.
+
+Other code can report counters along with the histograms through
+:func:`register_counters`.
+"""
+
+import atexit
+import errno
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.urlresolvers import resolve, Resolver404
+
+import commonware
+
+
+log = commonware.log.getLogger('playdoh')
+
+# Upper bounds, in seconds; the last bucket (+Inf) catches the rest.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+KINDS = ('wall', 'db', 'template', 'upstream')
+
+_local = threading.local()
+_counter_sources = []
+
+
+def register_counters(source):
+    """Report the counters ``source()`` returns with the histograms.
+
+    ``source()`` returns ``{(metric, labels): count}``, where ``labels`` is
+    a tuple of ``(name, value)`` pairs.
+    """
+    _counter_sources.append(source)
+
+
+def counters():
+    found = {}
+    for source in _counter_sources:
+        for key, value in source().items():
+            found[key] = found.get(key, 0) + value
+    return found
+
+
+def add(kind, seconds):
+    """Count ``seconds`` of ``kind`` time against the current request.
+
+    Does nothing outside a request thread, e.g. in fan-out workers, whose
+    time is counted by the request thread waiting on them.
+    """
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings[kind] += seconds
+
+
+class Histogram(object):
+
+    def __init__(self, counts=None, total=0.0):
+        self.counts = counts or [0] * (len(BUCKETS) + 1)
+        self.total = total
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.counts[i] += 1
+        self.total += value
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+
+
+class Registry(object):
+    """The histograms of this process and its file in ``directory``."""
+
+    def __init__(self, directory, flush_interval=10, max_age=3600):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.max_age = max_age
+        self.histograms = {}  # (view, kind) -> Histogram
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._flushed = time.time()
+
+    def observe(self, view, timings):
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked since; the parent's counts are not ours to report.
+                self._pid = os.getpid()
+                self.histograms = {}
+            for kind in KINDS:
+                key = (view, kind)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram()
+                self.histograms[key].observe(timings[kind])
+        try:
+            self.flush(if_due=True)
+        except Exception:
+            # Losing a write is better than failing the request.
+            log.exception('Could not write request metrics')
+
+    def _path(self, pid):
+        return os.path.join(self.directory, '%s.json' % pid)
+
+    def flush(self, if_due=False):
+        """Write this process's histograms to its file.
+
+        With ``if_due``, only if ``flush_interval`` has passed since the
+        last write; of the threads that find a write due, one claims it.
+        """
+        if not self.directory:
+            return
+        with self._lock:
+            now = time.time()
+            if if_due and now - self._flushed < self.flush_interval:
+                return
+            self._flushed = now
+            histograms = [[view, kind, h.counts, h.total]
+                          for (view, kind), h in self.histograms.items()]
+        data = {'histograms': histograms,
+                'counters': [[metric, labels, value] for (metric, labels),
+                             value in counters().items()]}
+        try:
+            os.makedirs(self.directory)
+        except OSError, exc:
+            if exc.errno != errno.EEXIST:
+                raise
+        path = self._path(os.getpid())
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            f = os.fdopen(fd, 'w')
+            try:
+                json.dump(data, f)
+            finally:
+                f.close()
+            os.rename(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def collect(self):
+        """Histograms and counters summed over every process that wrote
+        recently."""
+        merged = {}
+        if not self.directory:
+            with self._lock:
+                for key, h in self.histograms.items():
+                    merged[key] = Histogram(list(h.counts), h.total)
+            return merged, counters()
+        totals = {}
+        if not os.path.isdir(self.directory):
+            return merged, totals
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if time.time() - os.path.getmtime(path) > self.max_age:
+                    os.remove(path)
+                    continue
+                f = open(path)
+                try:
+                    data = json.load(f)
+                finally:
+                    f.close()
+            except (IOError, OSError, ValueError):
+                continue
+            if not isinstance(data, dict):
+                continue  # Written by an older version.
+            for view, kind, counts, total in data['histograms']:
+                key = (view, kind)
+                if key not in merged:
+                    merged[key] = Histogram()
+                merged[key].merge(Histogram(counts, total))
+            for metric, labels, value in data['counters']:
+                key = (metric, tuple(tuple(pair) for pair in labels))
+                totals[key] = totals.get(key, 0) + value
+        return merged, totals
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = Registry(
+                    getattr(settings, 'METRICS_DIR', None),
+                    getattr(settings, 'METRICS_FLUSH_INTERVAL', 10),
+                    getattr(settings, 'METRICS_MAX_AGE', 3600))
+                atexit.register(_registry.flush)
+    return _registry
+
+
+_installed = False
+
+
+def install():
+    """Time DB cursor calls and Jinja template renders."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from django.db.backends import BaseDatabaseWrapper, util
+    import jinja2
+
+    class TimedCursorWrapper(util.CursorWrapper):
+
+        def execute(self, *args, **kwargs):
+            start = time.time()
+            try:
+                return self.cursor.execute(*args, **kwargs)
+            finally:
+                add('db', time.time() - start)
+
+        def executemany(self, *args, **kwargs):
+            start = time.time()
+            try:
+                return self.cursor.executemany(*args, **kwargs)
+            finally:
+                add('db', time.time() - start)
+
+    cursor = BaseDatabaseWrapper.cursor
+
+    def timed_cursor(self):
+        return TimedCursorWrapper(cursor(self), self)
+    BaseDatabaseWrapper.cursor = timed_cursor
+
+    render = jinja2.Template.render
+
+    def timed_render(self, *args, **kwargs):
+        # Templates rendered while rendering another are counted once.
+        depth = getattr(_local, 'render_depth', 0)
+        _local.render_depth = depth + 1
+        start = time.time()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            _local.render_depth = depth
+            if not depth:
+                add('template', time.time() - start)
+    jinja2.Template.render = timed_render
+
+
+def view_name(request, view_func):
+    try:
+        name = resolve(request.path_info).url_name
+    except Resolver404:
+        name = None
+    return name or '%s.%s' % (view_func.__module__, view_func.__name__)
+
+
+class LatencyMiddleware(object):
+    """Put this first in MIDDLEWARE_CLASSES so ``wall`` covers the rest."""
+
+    def __init__(self):
+        install()
+
+    def process_request(self, request):
+        _local.timings = dict.fromkeys(KINDS, 0.0)
+        request._metrics_start = time.time()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view = view_name(request, view_func)
+
+    def process_response(self, request, response):
+        timings = getattr(_local, 'timings', None)
+        _local.timings = None
+        start = getattr(request, '_metrics_start', None)
+        if timings is not None and start is not None:
+            timings['wall'] = time.time() - start
+            view = getattr(request, '_metrics_view', 'unresolved')
+            try:
+                get_registry().observe(view, timings)
+            except Exception:
+                log.exception('Could not record request metrics')
+        return response
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def render_text(histograms, counters=None):
+    """``histograms`` and ``counters`` in the Prometheus text exposition
+    format."""
+    lines = []
+    last = None
+    for (metric, labels), value in sorted((counters or {}).items()):
+        if metric != last:
+            lines.append('# TYPE %s counter' % metric)
+            last = metric
+        label = ','.join('%s="%s"' % (name, _label(v)) for name, v in labels)
+        lines.append('%s{%s} %d' % (metric, label, value))
+    for kind in KINDS:
+        metric = 'playdoh_view_%s_seconds' % kind
+        lines.append('# HELP %s Per-view %s time.' % (metric, kind))
+        lines.append('# TYPE %s histogram' % metric)
+        for (view, k), h in sorted(histograms.items()):
+            if k != kind:
+                continue
+            label = 'view="%s"' % _label(view)
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), h.counts):
+                cumulative += count
+                lines.append('%s_bucket{%s,le="%s"} %d' %
+                             (metric, label, bound, cumulative))
+            lines.append('%s_sum{%s} %.6f' % (metric, label, h.total))
+            lines.append('%s_count{%s} %d' % (metric, label, cumulative))
+    return '\n'.join(lines) + '\n'
+
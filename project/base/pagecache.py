@@ -0,0 +1,254 @@
+"""Whole-page caching of anonymous responses.
+
+Mark a view with :func:`page_cache` and add :class:`PageCacheMiddleware`
+to the end of ``MIDDLEWARE_CLASSES``::
+
+    @page_cache(60)
+    @mobile_template('examples/{mobile/}home.html')
+    def home(request, template=None):
+        ...
+
+Rendered responses are stored in the Django cache, keyed on the path, the
+query string, the active locale and whether the mobile or desktop site was
+rendered. For ``timeout`` seconds they are served as they are. For a
+further ``stale`` seconds they are still served, but the first request to
+find them stale also re-renders the page in a background thread; a lock in
+the cache makes sure only one process refreshes a given page at a time.
+
+Only GET and HEAD requests from anonymous users are served from the cache,
+and only 200 responses that set no cookies, leave the session alone, use no
+CSRF token and are not marked private are stored, so nothing that carries a
+CSRF token or session is ever shared. That covers the anonymous CSRF cookie
+session_csrf's middleware adds after this one has seen the response. A
+view can also keep a response out of the cache, e.g. one rendered while a
+backend was failing, by setting ``response._page_cache = False``.
+
+Background refreshes replay the request without its cookies, apart from
+the mobile site switch the cache key depends on. The middleware sits last
+so that the cached response still passes through every other middleware's
+``process_response``.
+"""
+
+import threading
+import time
+import urllib
+from Cookie import SimpleCookie
+from cStringIO import StringIO
+from functools import wraps
+from hashlib import md5
+
+from django import http
+from django.conf import settings
+from django.core import signals
+from django.core.cache import cache
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIRequest
+from django.utils import translation
+
+import commonware
+
+from project.base import metrics
+
+
+log = commonware.log.getLogger('playdoh')
+
+REFRESH_ENVIRON_KEY = 'playdoh.pagecache.refresh'
+UNCACHEABLE_CONTROLS = ('private', 'no-cache', 'no-store')
+
+_counts = {'hit': 0, 'stale': 0, 'miss': 0, 'refresh': 0}
+_counts_lock = threading.Lock()
+_handler = None
+_handler_lock = threading.Lock()
+
+
+def _count(result):
+    with _counts_lock:
+        _counts[result] += 1
+
+
+def page_cache(timeout=None, stale=None):
+    """Let :class:`PageCacheMiddleware` cache this view's responses.
+
+    ``timeout`` and ``stale`` default to ``settings.PAGE_CACHE_TIMEOUT``
+    and ``settings.PAGE_CACHE_STALE``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return view(*args, **kwargs)
+        wrapper.page_cache = (timeout, stale)
+        return wrapper
+    return decorator
+
+
+def page_key(request):
+    query = urllib.urlencode(sorted(
+        (k.encode('utf-8'), v.encode('utf-8'))
+        for k, values in request.GET.lists() for v in values))
+    parts = [request.path, query, translation.get_language() or '',
+             getattr(request, 'MOBILE', False) and 'mobile' or 'desktop']
+    return 'page:%s' % md5(u'|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    user = getattr(request, 'user', None)
+    return not (user is not None and user.is_authenticated())
+
+
+def uses_csrf(request):
+    """Whether the response carries a CSRF token for this visitor.
+
+    session_csrf's ``CsrfMiddleware`` sets the anonymous cookie for
+    ``request._anon_csrf_key`` only after this middleware's
+    ``process_response`` has run, so the cookie can't be looked for on the
+    response yet.
+    """
+    return bool(getattr(request, '_anon_csrf_key', None) or
+                request.META.get('CSRF_COOKIE_USED'))
+
+
+def cacheable_response(request, response):
+    if getattr(response, '_page_cache', True) is False:
+        return False
+    if uses_csrf(request):
+        return False
+    if response.status_code != 200 or response.cookies:
+        return False
+    if not getattr(response, '_is_string', True):
+        # An iterator; reading it here would use it up.
+        return False
+    session = getattr(request, 'session', None)
+    if session is not None and session.modified:
+        return False
+    control = response.get('Cache-Control', '').lower()
+    return not any(c in control for c in UNCACHEABLE_CONTROLS)
+
+
+def cached_response(entry, now):
+    response = http.HttpResponse(entry['content'], status=entry['status'])
+    for name, value in entry['headers']:
+        response[name] = value
+    response['Age'] = str(int(now - entry['created']))
+    return response
+
+
+def refresh_environ(environ):
+    """A copy of a request's ``environ`` to render the page again with.
+
+    Only the CGI variables are kept, so nothing tied to the client's
+    connection is used after it has gone. Of the cookies, only the mobile
+    site switch is kept: the page is rendered for anonymous users.
+    """
+    fresh = dict((k, v) for k, v in environ.items()
+                 if k.isupper() and isinstance(v, basestring) and
+                 k not in ('HTTP_COOKIE', 'CONTENT_LENGTH', 'CONTENT_TYPE'))
+    name = getattr(settings, 'MOBILE_COOKIE', 'mobile')
+    cookies = SimpleCookie()
+    try:
+        cookies.load(environ.get('HTTP_COOKIE', ''))
+    except Exception:
+        pass
+    if name in cookies:
+        fresh['HTTP_COOKIE'] = '%s=%s' % (name, cookies[name].value)
+    fresh['wsgi.url_scheme'] = environ.get('wsgi.url_scheme', 'http')
+    fresh['REQUEST_METHOD'] = 'GET'
+    fresh[REFRESH_ENVIRON_KEY] = True
+    return fresh
+
+
+def get_handler():
+    """A handler with the middleware loaded, shared by every refresh."""
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            handler = BaseHandler()
+            handler.load_middleware()
+            _handler = handler
+    return _handler
+
+
+def refresh(environ):
+    """Render the page for ``environ``, from :func:`refresh_environ`,
+    again through all the middleware so that :class:`PageCacheMiddleware`
+    stores the result."""
+    environ = dict(environ, **{'wsgi.input': StringIO('')})
+    try:
+        get_handler().get_response(WSGIRequest(environ))
+    except Exception:
+        log.exception('Could not refresh %s' % environ.get('PATH_INFO'))
+    finally:
+        # Closes the database connection this thread opened.
+        signals.request_finished.send(sender=PageCacheMiddleware)
+
+
+class PageCacheMiddleware(object):
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        options = getattr(view_func, 'page_cache', None)
+        if (options is None or
+                not getattr(settings, 'PAGE_CACHE_ENABLED', True) or
+                not cacheable_request(request)):
+            return None
+        timeout, stale = options
+        if timeout is None:
+            timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60)
+        if stale is None:
+            stale = getattr(settings, 'PAGE_CACHE_STALE', 5 * 60)
+        key = page_key(request)
+        request._page_cache = (key, timeout, stale)
+        if request.META.get(REFRESH_ENVIRON_KEY):
+            _count('refresh')
+            return None
+
+        entry = cache.get(key)
+        if entry is None:
+            _count('miss')
+            return None
+        now = time.time()
+        request._page_cache_served = True
+        if now - entry['created'] < timeout:
+            _count('hit')
+            return cached_response(entry, now)
+
+        _count('stale')
+        lock = '%s:refresh' % key
+        if cache.add(lock, 1, getattr(settings, 'PAGE_CACHE_REFRESH_TIMEOUT',
+                                      30)):
+            thread = threading.Thread(
+                target=self._refresh,
+                args=(refresh_environ(request.META), lock))
+            thread.daemon = True
+            thread.start()
+        return cached_response(entry, now)
+
+    def _refresh(self, environ, lock):
+        try:
+            refresh(environ)
+        finally:
+            cache.delete(lock)
+
+    def process_response(self, request, response):
+        options = getattr(request, '_page_cache', None)
+        if (options is None or getattr(request, '_page_cache_served', False)
+                or not cacheable_response(request, response)):
+            return response
+        key, timeout, stale = options
+        entry = {'content': response.content,
+                 'status': response.status_code,
+                 'headers': response.items(),
+                 'created': time.time()}
+        cache.set(key, entry, timeout + stale)
+        return response
+
+
+def _counters():
+    found = {}
+    with _counts_lock:
+        for result, count in _counts.items():
+            found[('playdoh_page_cache_requests_total',
+                   (('result', result),))] = count
+    return found
+
+metrics.register_counters(_counters)
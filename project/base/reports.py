@@ -0,0 +1,232 @@
+"""Expensive reports built ahead of time and served from the cache.
+
+Register a builder in an app's ``reports.py``::
+
+    from project.base import reports
+
+    @reports.register('examples.crash_summary', refresh=5 * 60,
+                      schedule=[{'product': 'Firefox'}])
+    def crash_summary(product):
+        return ...  # anything picklable
+
+and read it in a view with ``reports.get('examples.crash_summary',
+product='Firefox')``.
+
+Each build is stored in the cache under its own version, and a small
+pointer entry names the latest one, so readers never see a build that is
+only half written. :func:`get` returns the latest build straight away.
+When it is older than ``refresh`` seconds, it also queues the
+``refresh_report`` Celery task, and a lock in the cache keeps that to one
+refresh per report and parameters at a time. A report that has never been
+built is queued the same way, and :func:`get` raises :class:`NotReady`
+until the build is there; views answer 202 meanwhile.
+
+The ``refresh_reports`` cron job (see ``CRON_SCHEDULE``), or the
+``refresh_scheduled_reports`` task from celerybeat, refreshes the
+``schedule`` parameter sets before anyone asks for them. With
+``CELERY_ALWAYS_EAGER`` the tasks run inline, so everything also works
+without a broker, just not in the background.
+
+Builds made by celeryd or the cron job are only seen by the web processes
+through the cache, so the default cache must be one they all share, such
+as memcached (or a ``TieredCache`` in front of it). :func:`get` raises
+``ImproperlyConfigured`` when tasks run elsewhere and the cache is
+per-process, and :func:`refresh_scheduled` always does.
+"""
+
+import json
+import time
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+import commonware
+
+from project.base.cache import TieredCache
+
+
+log = commonware.log.getLogger('playdoh')
+
+_registry = {}
+
+
+class NotReady(Exception):
+    """The report has not been built yet; a build has been queued."""
+
+
+class Report(object):
+
+    def __init__(self, name, func, refresh, version, schedule, keep,
+                 build_timeout):
+        self.name = name
+        self.func = func
+        self.refresh = refresh
+        self.version = version
+        self.schedule = schedule
+        self.keep = keep
+        self.build_timeout = build_timeout
+
+    def key(self, params):
+        # The builder's version is part of the key, so a deploy that changes
+        # what a report looks like does not serve the old shape.
+        digest = md5(json.dumps(params, sort_keys=True)).hexdigest()
+        return 'report:%s:%s:%s' % (self.name, self.version, digest)
+
+
+def register(name, refresh=None, version=1, schedule=(), keep=None,
+             build_timeout=None):
+    """Register the decorated function as the builder for report ``name``.
+
+    ``refresh`` is how old, in seconds, a build may get before a refresh
+    is queued (``settings.REPORTS_REFRESH`` by default). Bump ``version``
+    when the builder's output changes shape. ``schedule`` lists the keyword
+    arguments to keep built ahead of time. Builds are kept in the cache for
+    ``keep`` seconds (``settings.REPORTS_KEEP``); a refresh that takes
+    longer than ``build_timeout`` seconds may be started again.
+    """
+    def decorator(func):
+        _registry[name] = Report(
+            name, func,
+            refresh or getattr(settings, 'REPORTS_REFRESH', 5 * 60),
+            version, list(schedule),
+            keep or getattr(settings, 'REPORTS_KEEP', 24 * 60 * 60),
+            build_timeout or getattr(settings, 'REPORTS_BUILD_TIMEOUT',
+                                     10 * 60))
+        return func
+    return decorator
+
+
+def load_report_modules():
+    """Import each app's reports.py so its builders register themselves."""
+    for app in settings.INSTALLED_APPS:
+        try:
+            __import__('%s.reports' % app)
+        except ImportError:
+            pass
+
+
+def get_report(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        load_report_modules()
+    try:
+        return _registry[name]
+    except KeyError:
+        raise ValueError('No report registered as %r' % name)
+
+
+def shared_cache():
+    """Whether builds stored in the cache reach every process; a
+    local-memory cache keeps them in the process that built them."""
+    backend = cache
+    if isinstance(backend, TieredCache):
+        backend = backend.shared
+    return not isinstance(backend, (LocMemCache, DummyCache))
+
+
+def check_cache(name):
+    if not shared_cache():
+        raise ImproperlyConfigured(
+            'Report %s is built in another process, but the default cache '
+            'is not shared between processes; use memcached (see REPORTS_* '
+            'in settings).' % name)
+
+
+def latest(name, **params):
+    """``(data, built)`` of the latest build, or ``(None, None)``."""
+    key = get_report(name).key(params)
+    pointer = cache.get(key)
+    if pointer is not None:
+        stored = cache.get('%s:%s' % (key, pointer['build']))
+        if stored is not None:
+            return stored[0], pointer['built']
+    return None, None
+
+
+def build(name, params):
+    """Build report ``name`` for ``params`` and make it the latest."""
+    report = get_report(name)
+    start = time.time()
+    data = report.func(**params)
+    built = time.time()
+    key = report.key(params)
+    build_id = '%d' % (built * 1000)
+    # The build goes in first; the pointer only names it once it is there.
+    # Wrapped in a tuple so that a builder may return None.
+    cache.set('%s:%s' % (key, build_id), (data,), report.keep)
+    cache.set(key, {'build': build_id, 'built': built}, report.keep)
+    log.info('Built report %s %r in %.2fs' % (name, params, built - start))
+    return data
+
+
+def refresh(name, params):
+    """Build the report and release the lock :func:`queue_refresh` took."""
+    report = get_report(name)
+    try:
+        return build(name, params)
+    finally:
+        cache.delete('%s:refreshing' % report.key(params))
+
+
+def queue_refresh(name, params):
+    """Queue a refresh unless one is already under way; returns whether
+    one was queued."""
+    from project.base.tasks import refresh_report
+
+    report = get_report(name)
+    lock = '%s:refreshing' % report.key(params)
+    if not cache.add(lock, 1, report.build_timeout):
+        return False
+    try:
+        refresh_report.delay(name, params)
+    except Exception:
+        cache.delete(lock)
+        log.exception('Could not queue a refresh of report %s' % name)
+        return False
+    return True
+
+
+def get(name, **params):
+    """The latest build of report ``name`` for ``params``.
+
+    A build older than the report's ``refresh`` interval is still returned,
+    and a refresh is queued. For a report that has never been built, a
+    build is queued and :class:`NotReady` raised, so that however many
+    requests ask at once only one build runs.
+    """
+    report = get_report(name)
+    if not getattr(settings, 'CELERY_ALWAYS_EAGER', False):
+        check_cache(name)
+    data, built = latest(name, **params)
+    if built is None:
+        queue_refresh(name, params)
+        # With CELERY_ALWAYS_EAGER the build has already run.
+        data, built = latest(name, **params)
+        if built is None:
+            raise NotReady(name)
+        return data
+    if time.time() - built > report.refresh:
+        queue_refresh(name, params)
+    return data
+
+
+def refresh_scheduled(force=False):
+    """Queue refreshes for scheduled reports that are due, or for all of
+    them with ``force``; returns how many were queued."""
+    load_report_modules()
+    queued = 0
+    now = time.time()
+    for name, report in sorted(_registry.items()):
+        if report.schedule:
+            # Run from the cron job or celerybeat, never a web process.
+            check_cache(name)
+        for params in report.schedule:
+            data, built = latest(name, **params)
+            if force or built is None or now - built > report.refresh:
+                queued += queue_refresh(name, params)
+    return queued
@@ -0,0 +1,46 @@
+"""Memoized HTML sanitization of user-supplied text.
+
+Comments attached to crash reports repeat a lot, so a :class:`Cleaner`
+keeps the bleach configuration built once and remembers the output for
+recently seen inputs.
+"""
+
+import bleach
+
+from project.base.lru import LRUCache
+
+
+ALLOWED_TAGS = ('strong', 'em')
+
+
+class Cleaner(object):
+    """``bleach.clean`` with a fixed configuration and an LRU of results.
+
+    Inputs longer than ``max_length`` characters are cleaned but not
+    memoized, so a few huge fragments cannot flush the cache.
+    """
+
+    def __init__(self, tags=ALLOWED_TAGS, attributes=None, strip=False,
+                 cache_size=10000, max_length=4096):
+        self.options = {'tags': list(tags), 'strip': strip}
+        if attributes is not None:
+            self.options['attributes'] = attributes
+        self.max_length = max_length
+        self.cache = LRUCache(cache_size)
+
+    def clean(self, text):
+        if len(text) > self.max_length:
+            return bleach.clean(text, **self.options)
+        cleaned = self.cache.get(text)
+        if cleaned is None:
+            cleaned = bleach.clean(text, **self.options)
+            self.cache.set(text, cleaned)
+        return cleaned
+
+    def clean_many(self, texts):
+        """Clean a batch of fragments, returning them in the same order."""
+        clean = self.clean
+        return [clean(text) for text in texts]
+
+
+cleaner = Cleaner()
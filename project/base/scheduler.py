@@ -0,0 +1,231 @@
+"""An in-process scheduler for periodic jobs.
+
+``./manage.py cron_daemon`` loads Django once and then runs the jobs in
+``settings.CRON_SCHEDULE`` on their intervals, instead of cron starting a
+fresh ``manage.py cron`` process every minute.
+
+Jobs are the functions registered with ``@cronjobs.register`` in an app's
+``cron.py``, or ``manage:<command>`` for a management command. A job never
+overlaps with itself: a run that comes due while the previous one is still
+going is skipped, and jobs registered with a lock also take the same lock
+file as ``manage.py cron``, so neither a second daemon nor cron on the same
+host can run them at the same time. As with ``manage.py cron``, a lock file
+left behind by a process that was killed has to be deleted by hand.
+Start times get random jitter so jobs with the same interval do not all
+fire at once.
+
+On SIGTERM the daemon stops starting jobs and waits up to
+``CRON_STOP_TIMEOUT`` seconds for the running ones to finish. Keep that
+below supervisor's ``stopwaitsecs``.
+"""
+
+import errno
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django import db
+from django.conf import settings
+from django.core.management import call_command
+
+import commonware
+import cronjobs
+
+
+log = commonware.log.getLogger('playdoh')
+
+
+def load_cron_modules():
+    """Import each app's cron.py so its jobs register themselves."""
+    for app in settings.INSTALLED_APPS:
+        try:
+            __import__('%s.cron' % app)
+        except ImportError:
+            pass
+
+
+class Job(object):
+    """A job, its interval in seconds and its runtime metrics."""
+
+    def __init__(self, name, func, interval, jitter=0.1, lock=False):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.lock = lock
+        self.running = False
+        self.next_run = time.time() + self._delay(first=True)
+        self.runs = self.failures = self.skipped = 0
+        self.last_duration = self.max_duration = self.total_duration = 0.0
+        self.last_started = self.last_error = None
+
+    def _delay(self, first=False):
+        spread = random.uniform(0, self.interval * self.jitter)
+        if first:
+            return spread
+        return self.interval + spread
+
+    def schedule_next(self):
+        self.next_run = time.time() + self._delay()
+
+    def metrics(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'running': self.running,
+            'last_started': self.last_started,
+            'last_duration': round(self.last_duration, 3),
+            'max_duration': round(self.max_duration, 3),
+            'mean_duration': round(self.total_duration / self.runs, 3)
+                             if self.runs else 0,
+            'last_error': self.last_error,
+        }
+
+
+def _lock_file(name):
+    """Create django-cronjobs' lock file for ``name``; returns its path, or
+    None if it already exists."""
+    prefix = getattr(settings, 'CRONJOB_LOCK_PREFIX', 'lock')
+    path = os.path.join(tempfile.gettempdir(),
+                        'django_cron.%s.%s' % (prefix, name))
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL))
+    except OSError, exc:
+        if exc.errno == errno.EEXIST:
+            return None
+        raise
+    return path
+
+
+class Scheduler(object):
+
+    def __init__(self, jobs, status_file=None, tick=1.0, stop_timeout=50):
+        self.jobs = jobs
+        self.status_file = status_file
+        self.tick = tick
+        self.stop_timeout = stop_timeout
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    @classmethod
+    def from_settings(cls):
+        load_cron_modules()
+        jitter = getattr(settings, 'CRON_JITTER', 0.1)
+        jobs = []
+        for name, interval in sorted(settings.CRON_SCHEDULE.items()):
+            if name.startswith('manage:'):
+                command = name.split(':', 1)[1]
+                func = lambda command=command: call_command(command)
+                lock = True
+            elif name in cronjobs.registered:
+                func = cronjobs.registered[name]
+                lock = name in cronjobs.registered_lock
+            else:
+                raise ValueError('CRON_SCHEDULE names unknown job %r' % name)
+            jobs.append(Job(name, func, interval, jitter, lock))
+        return cls(jobs, getattr(settings, 'CRON_STATUS_FILE', None),
+                   stop_timeout=getattr(settings, 'CRON_STOP_TIMEOUT', 50))
+
+    def _run(self, job):
+        lock = None
+        try:
+            if job.lock:
+                lock = _lock_file(job.name)
+                if lock is None:
+                    log.warning('Cron job %s is locked by another process; '
+                                'skipping.' % job.name)
+                    with self._lock:
+                        job.skipped += 1
+                    return
+            start = time.time()
+            job.last_started = start
+            log.info('Beginning job: %s' % job.name)
+            try:
+                job.func()
+                error = None
+            except Exception, exc:
+                log.exception('Cron job %s failed' % job.name)
+                error = '%s: %s' % (exc.__class__.__name__, exc)
+            duration = time.time() - start
+            log.info('Ending job: %s (%.2fs)' % (job.name, duration))
+            with self._lock:
+                job.runs += 1
+                job.last_duration = duration
+                job.total_duration += duration
+                job.max_duration = max(job.max_duration, duration)
+                if error:
+                    job.failures += 1
+                job.last_error = error
+        finally:
+            if lock is not None:
+                os.remove(lock)
+            # Don't keep a connection open (and possibly stale) between runs.
+            db.close_connection()
+            with self._lock:
+                job.running = False
+                job.schedule_next()
+            self.write_status()
+
+    def run_pending(self):
+        now = time.time()
+        for job in self.jobs:
+            with self._lock:
+                if job.next_run > now:
+                    continue
+                if job.running:
+                    job.skipped += 1
+                    job.schedule_next()
+                    log.warning('Cron job %s is still running; skipping '
+                                'this run.' % job.name)
+                    continue
+                job.running = True
+                job.schedule_next()
+            thread = threading.Thread(target=self._run, args=(job,),
+                                      name='cron-%s' % job.name)
+            thread.daemon = True
+            self._threads[job.name] = thread
+            thread.start()
+
+    def metrics(self):
+        with self._lock:
+            return dict((job.name, job.metrics()) for job in self.jobs)
+
+    def write_status(self):
+        if not self.status_file:
+            return
+        tmp = self.status_file + '.tmp'
+        f = open(tmp, 'w')
+        try:
+            json.dump({'pid': os.getpid(), 'updated': time.time(),
+                       'jobs': self.metrics()}, f, indent=2, sort_keys=True)
+        finally:
+            f.close()
+        os.rename(tmp, self.status_file)
+
+    def stop(self):
+        self._stopping.set()
+
+    def join(self, timeout):
+        """Wait up to ``timeout`` seconds for running jobs; returns the
+        names of those still running."""
+        deadline = time.time() + timeout
+        for thread in self._threads.values():
+            thread.join(max(deadline - time.time(), 0))
+        return sorted(name for name, thread in self._threads.items()
+                      if thread.isAlive())
+
+    def run_forever(self):
+        self.write_status()
+        while not self._stopping.isSet():
+            self.run_pending()
+            self._stopping.wait(self.tick)
+        running = self.join(self.stop_timeout)
+        if running:
+            log.warning('Stopping with cron jobs still running: %s' %
+                        ', '.join(running))
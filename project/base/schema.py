@@ -0,0 +1,278 @@
+"""Apply the numbered migrations in ``migrations/`` over one DB connection.
+
+This understands the same layout as schematic: ``NN-description.sql`` or
+``NN-description.py`` files applied in numeric order, with the current
+version kept in the one-row ``schema_version`` table. Unlike schematic, it
+does not start a ``mysql`` client per file, and it records how long each
+migration took in ``schema_version_history``.
+
+A ``.py`` migration is run as a script, as schematic does. One that
+defines a top-level ``run(migration)`` gets that called instead;
+``migration.cursor`` is the shared cursor and :meth:`Migration.chunked` runs
+big data changes in small batches. For example, in
+``migrations/12-backfill-signatures.py``::
+
+    def run(migration):
+        migration.chunked('reports',
+                          'UPDATE reports SET signature_id = ... '
+                          'WHERE id >= %(start)s AND id < %(end)s')
+"""
+
+import ast
+import imp
+import os
+import re
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+
+import commonware
+
+
+log = commonware.log.getLogger('playdoh')
+
+MIGRATION_RE = re.compile(r'^(\d+)-.*\.(sql|py)$')
+TABLE_RE = re.compile(r'^\s*(?:CREATE\s+TABLE(?:\s+IF\s+NOT\s+EXISTS)?|'
+                      r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+\S+\s+ON|'
+                      r'ALTER\s+(?:IGNORE\s+)?TABLE|'
+                      r'DROP\s+TABLE(?:\s+IF\s+EXISTS)?|'
+                      r'RENAME\s+TABLE|TRUNCATE(?:\s+TABLE)?|'
+                      r'INSERT\s+(?:IGNORE\s+)?INTO|UPDATE|DELETE\s+FROM)'
+                      r'\s+`?(\w+)`?', re.I)
+
+
+def migrations_dir():
+    return getattr(settings, 'MIGRATIONS_DIR',
+                   os.path.join(settings.ROOT, 'migrations'))
+
+
+class MigrationError(Exception):
+    """A migration failed; the version stays at the last good one."""
+
+
+def statement_table(sql):
+    """The table a DDL or DML statement changes, or None if unknown."""
+    match = TABLE_RE.match(sql)
+    return match.group(1) if match else None
+
+
+def split_statements(sql):
+    """Split a script into statements on semicolons outside of quotes and
+    comments."""
+    statements = []
+    current = []
+    quote = None
+    i, length = 0, len(sql)
+    while i < length:
+        char = sql[i]
+        if quote:
+            current.append(char)
+            if char == '\\' and quote != '`' and i + 1 < length:
+                current.append(sql[i + 1])
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in '\'"`':
+            quote = char
+            current.append(char)
+        elif sql.startswith('--', i) or char == '#':
+            end = sql.find('\n', i)
+            i = length if end == -1 else end
+            continue
+        elif sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+            continue
+        elif char == ';':
+            statements.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    statements.append(''.join(current).strip())
+    return [s for s in statements if s]
+
+
+class Migration(object):
+    """One migration file, as handed to a ``.py`` migration's ``run()``."""
+
+    def __init__(self, runner, version, path):
+        self.runner = runner
+        self.version = version
+        self.path = path
+        self.name = os.path.basename(path)
+
+    @property
+    def cursor(self):
+        return self.runner.cursor
+
+    def execute(self, sql, params=None):
+        if self.runner.skips(statement_table(sql)):
+            return
+        if params:
+            self.runner.cursor.execute(sql, params)
+        else:
+            # Without parameters, literal %s in the SQL are left alone.
+            self.runner.cursor.execute(sql)
+
+    def apply(self):
+        if self.path.endswith('.sql'):
+            f = open(self.path)
+            try:
+                statements = split_statements(f.read())
+            finally:
+                f.close()
+            for statement in statements:
+                self.execute(statement)
+        elif self.defines_run():
+            module = imp.load_source('migration_%s' % self.version, self.path)
+            module.run(self)
+        else:
+            execfile(self.path, {'__name__': '__main__',
+                                 '__file__': self.path})
+
+    def defines_run(self):
+        """Whether a ``.py`` migration has a top-level ``run()``, found
+        without running any of its code."""
+        f = open(self.path)
+        try:
+            tree = ast.parse(f.read(), self.path)
+        finally:
+            f.close()
+        return any(isinstance(node, ast.FunctionDef) and node.name == 'run'
+                   for node in tree.body)
+
+    def chunked(self, table, statement, key='id', chunk_size=1000,
+                pause=0.5):
+        """Run ``statement`` over ``table`` one range of ``key`` at a time.
+
+        ``statement`` gets ``%(start)s`` and ``%(end)s`` for the half-open
+        key range of each chunk. Each chunk is committed on its own, so
+        locks are only held briefly. After each one we sleep for ``pause``
+        times as long as the chunk took, leaving the database time for
+        production traffic.
+        """
+        if self.runner.skips(table):
+            return
+        cursor = self.runner.cursor
+        cursor.execute('SELECT MIN(%s), MAX(%s) FROM %s' % (key, key, table))
+        low, high = cursor.fetchone()
+        if low is None:
+            return
+        done = 0
+        total = high - low + 1
+        for start in xrange(low, high + 1, chunk_size):
+            began = time.time()
+            cursor.execute(statement % {'start': start,
+                                        'end': start + chunk_size})
+            self.runner.commit()
+            took = time.time() - began
+            done = min(done + chunk_size, total)
+            self.runner.report('  %s: %d/%d %s (%.0f%%)' %
+                               (table, done, total, key, 100.0 * done / total))
+            if pause:
+                time.sleep(took * pause)
+
+
+class MigrationRunner(object):
+    """Applies pending migrations from ``directory`` over one connection.
+
+    Statements that change a table in ``skip_tables`` are left out, e.g.
+    for the tables ``syncdb`` has already created from the models when
+    building a test database. Plain script migrations always run.
+    """
+
+    def __init__(self, directory, using='default', table='schema_version',
+                 history_table='schema_version_history', out=None,
+                 skip_tables=()):
+        self.directory = directory
+        self.skip_tables = set(t.lower() for t in skip_tables)
+        self.using = using
+        self.table = table
+        self.history_table = history_table
+        self.out = out
+        self.connection = connections[using]
+        self.cursor = self.connection.cursor()
+
+    def report(self, msg):
+        if self.out is not None:
+            self.out.write(msg + '\n')
+            self.out.flush()
+
+    def skips(self, table):
+        return table is not None and table.lower() in self.skip_tables
+
+    def commit(self):
+        transaction.commit_unless_managed(using=self.using)
+
+    def ensure_tables(self):
+        self.cursor.execute('CREATE TABLE IF NOT EXISTS %s (version INT)' %
+                            self.table)
+        self.cursor.execute('SELECT COUNT(*) FROM %s' % self.table)
+        if not self.cursor.fetchone()[0]:
+            self.cursor.execute('INSERT INTO %s (version) VALUES (0)' %
+                                self.table)
+        self.cursor.execute(
+            'CREATE TABLE IF NOT EXISTS %s (version INT NOT NULL, '
+            'name VARCHAR(255) NOT NULL, duration_ms INT NOT NULL, '
+            'applied DATETIME NOT NULL)' % self.history_table)
+        self.commit()
+
+    def exists(self, table):
+        return table in self.connection.introspection.table_names()
+
+    def current_version(self):
+        if not self.exists(self.table):
+            return 0
+        self.cursor.execute('SELECT version FROM %s' % self.table)
+        return self.cursor.fetchone()[0]
+
+    def migrations(self):
+        found = []
+        for name in os.listdir(self.directory):
+            match = MIGRATION_RE.match(name)
+            if match:
+                found.append(Migration(self, int(match.group(1)),
+                                       os.path.join(self.directory, name)))
+        found.sort(key=lambda m: m.version)
+        return found
+
+    def pending(self):
+        current = self.current_version()
+        return [m for m in self.migrations() if m.version > current]
+
+    def history(self):
+        if not self.exists(self.history_table):
+            return []
+        self.cursor.execute('SELECT version, name, duration_ms, applied '
+                            'FROM %s ORDER BY applied, version' %
+                            self.history_table)
+        return self.cursor.fetchall()
+
+    def migrate(self):
+        """Apply every pending migration in order; returns those applied."""
+        self.ensure_tables()
+        applied = []
+        for migration in self.pending():
+            self.report('Applying %s' % migration.name)
+            start = time.time()
+            try:
+                migration.apply()
+            except Exception, exc:
+                transaction.rollback_unless_managed(using=self.using)
+                raise MigrationError('%s failed: %s' % (migration.name, exc))
+            duration = int((time.time() - start) * 1000)
+            self.cursor.execute('UPDATE %s SET version = %%s' % self.table,
+                                [migration.version])
+            self.cursor.execute(
+                'INSERT INTO %s (version, name, duration_ms, applied) '
+                'VALUES (%%s, %%s, %%s, %%s)' % self.history_table,
+                [migration.version, migration.name, duration,
+                 time.strftime('%Y-%m-%d %H:%M:%S')])
+            self.commit()
+            log.info('Applied migration %s in %dms' %
+                     (migration.name, duration))
+            self.report('Applied %s in %dms' % (migration.name, duration))
+            applied.append(migration)
+        return applied
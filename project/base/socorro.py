@@ -0,0 +1,235 @@
+"""Client for the Socorro middleware API that backs the crash-stats views.
+
+All views should go through :func:`get_client` rather than opening their own
+HTTP connections. The client keeps a small pool of keep-alive connections to
+the middleware, caches decoded responses in the Django cache for a TTL that
+is configured per endpoint, and coalesces concurrent identical requests so
+that only one of them actually goes upstream.
+"""
+
+import httplib
+import json
+import socket
+import sys
+import threading
+import time
+import urllib
+import urlparse
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+
+import commonware
+
+from project.base import fanout, metrics
+
+
+log = commonware.log.getLogger('playdoh')
+
+
+class MiddlewareError(Exception):
+    """The middleware could not be reached or returned an error."""
+
+    def __init__(self, msg, status=None):
+        super(MiddlewareError, self).__init__(msg)
+        self.status = status
+
+
+class ConnectionPool(object):
+    """A thread-safe pool of keep-alive HTTP connections to a single host."""
+
+    def __init__(self, url, maxsize=10, timeout=10):
+        parsed = urlparse.urlparse(url)
+        if parsed.scheme == 'https':
+            self.connection_class = httplib.HTTPSConnection
+        else:
+            self.connection_class = httplib.HTTPConnection
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.prefix = parsed.path.rstrip('/')
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _get(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self.connection_class(self.host, self.port,
+                                     timeout=self.timeout)
+
+    def _put(self, conn):
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method, path, headers=None):
+        """Issue a request and return ``(status, body)``.
+
+        A connection the server has closed since we last used it is retried
+        once on a fresh connection.
+        """
+        headers = dict(headers or {})
+        headers.setdefault('Connection', 'keep-alive')
+        for attempt in (1, 2):
+            # Inside a fan-out call, give up by its deadline.
+            timeout = fanout.remaining(self.timeout)
+            if timeout <= 0:
+                raise MiddlewareError('%s %s: out of time' % (method, path))
+            conn = self._get()
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            try:
+                conn.request(method, self.prefix + path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (httplib.HTTPException, socket.error), exc:
+                conn.close()
+                if attempt == 2 or isinstance(exc, socket.timeout):
+                    raise MiddlewareError('%s %s failed: %s' %
+                                          (method, path, exc))
+                continue
+            if response.getheader('connection', '').lower() == 'close':
+                conn.close()
+            else:
+                self._put(conn)
+            return response.status, body
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class _Call(object):
+    """An upstream fetch that other threads can wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SocorroMiddleware(object):
+    """Cached, coalescing access to the Socorro middleware.
+
+    ``path`` arguments are middleware URLs relative to
+    ``settings.SOCORRO_MIDDLEWARE_URL``, e.g. ``/products/versions/``. The
+    first path segment names the endpoint and selects the cache TTL from
+    ``settings.SOCORRO_CACHE_TTLS``.
+    """
+
+    def __init__(self, base_url=None, pool=None, cache_ttls=None,
+                 default_ttl=None):
+        self.base_url = base_url or settings.SOCORRO_MIDDLEWARE_URL
+        self.pool = pool or ConnectionPool(
+            self.base_url,
+            maxsize=getattr(settings, 'SOCORRO_POOL_SIZE', 10),
+            timeout=getattr(settings, 'SOCORRO_TIMEOUT', 10))
+        if cache_ttls is None:
+            cache_ttls = getattr(settings, 'SOCORRO_CACHE_TTLS', {})
+        self.cache_ttls = cache_ttls
+        if default_ttl is None:
+            default_ttl = getattr(settings, 'SOCORRO_CACHE_TTL', 60)
+        self.default_ttl = default_ttl
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def ttl(self, path):
+        endpoint = path.strip('/').split('/', 1)[0]
+        return self.cache_ttls.get(endpoint, self.default_ttl)
+
+    def cache_key(self, path):
+        return 'socorro:%s' % md5(self.base_url + path).hexdigest()
+
+    def fetch(self, path, params=None, ttl=None):
+        """Return the decoded JSON for ``path``.
+
+        Responses are served from the cache when possible. ``ttl`` overrides
+        the per-endpoint cache lifetime; pass ``0`` to bypass the cache.
+        """
+        if params:
+            path = '%s?%s' % (path, urllib.urlencode(sorted(params.items())))
+        if ttl is None:
+            ttl = self.ttl(path)
+        start = time.time()
+        try:
+            return self._get(path, ttl)
+        finally:
+            metrics.add('upstream', time.time() - start)
+
+    def _get(self, path, ttl):
+        key = self.cache_key(path)
+        if ttl:
+            result = cache.get(key)
+            if result is not None:
+                return result
+
+        with self._inflight_lock:
+            call = self._inflight.get(key)
+            if call is None:
+                call = self._inflight[key] = _Call()
+                thread = threading.Thread(target=self._lead,
+                                          args=(call, key, path, ttl),
+                                          name='socorro-fetch')
+                thread.daemon = True
+                thread.start()
+
+        # The shared fetch runs on its own SOCORRO_TIMEOUT; each caller only
+        # waits until its own fan-out deadline, so a caller in a hurry does
+        # not fail everybody else waiting on the same path.
+        call.event.wait(max(fanout.remaining(self.pool.timeout + 1), 0))
+        if not call.event.isSet():
+            raise MiddlewareError('GET %s: out of time' % path)
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _lead(self, call, key, path, ttl):
+        try:
+            call.result = self._fetch(path)
+            if ttl:
+                cache.set(key, call.result, ttl)
+        except MiddlewareError, exc:
+            call.error = exc
+        except:
+            log.exception('Fetching %s failed' % path)
+            call.error = MiddlewareError('GET %s failed: %s' %
+                                         (path, sys.exc_info()[1]))
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            call.event.set()
+
+    def _fetch(self, path):
+        log.debug('Fetching %s%s' % (self.base_url, path))
+        status, body = self.pool.request('GET', path,
+                                         {'Accept': 'application/json'})
+        if status != 200:
+            raise MiddlewareError('GET %s returned %s' % (path, status),
+                                  status=status)
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise MiddlewareError('GET %s returned invalid JSON' % path,
+                                  status=status)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide :class:`SocorroMiddleware` client."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SocorroMiddleware()
+    return _client
@@ -0,0 +1,107 @@
+"""Start-up profiling for manage.py and the WSGI entry point.
+
+Set ``PLAYDOH_PROFILE_STARTUP=1`` to get a report on stderr when the process
+exits: how long each named start-up phase took and which imports were the
+most expensive. Set it to a file path to write the report there instead.
+
+This module is imported before Django and the vendor libraries are on the
+path, so it only uses the standard library.
+"""
+
+import __builtin__
+import atexit
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+ENV_VAR = 'PLAYDOH_PROFILE_STARTUP'
+TOP_IMPORTS = 30
+
+_started = time.time()
+_phases = []
+_imports = {}  # module name -> [cumulative seconds, own seconds]
+_stack = []
+_installed = False
+_original_import = __builtin__.__import__
+
+
+def enabled():
+    return bool(os.environ.get(ENV_VAR))
+
+
+def _qualify(name, globals):
+    # Python 2 implicit relative imports ("import constants" inside a
+    # package) are reported under the module's full name.
+    if name in sys.modules or not globals or '__name__' not in globals:
+        return name
+    package = globals['__name__']
+    if '__path__' not in globals:
+        package = package.rpartition('.')[0]
+    full = '%s.%s' % (package, name)
+    return full if full in sys.modules else name
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=None, level=-1):
+    # Time spent in nested imports is subtracted from the parent's own time.
+    if name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    _stack.append(0.0)
+    start = time.time()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.time() - start
+        nested = _stack.pop()
+        if _stack:
+            _stack[-1] += elapsed
+        entry = _imports.setdefault(_qualify(name, globals), [0.0, 0.0])
+        entry[0] += elapsed
+        entry[1] += elapsed - nested
+
+
+def install():
+    """Start timing imports, if profiling was asked for."""
+    global _installed
+    if _installed or not enabled():
+        return
+    _installed = True
+    __builtin__.__import__ = _timed_import
+    atexit.register(report)
+
+
+@contextmanager
+def phase(name):
+    """Time a named block of start-up work."""
+    start = time.time()
+    try:
+        yield
+    finally:
+        if _installed:
+            _phases.append((name, time.time() - start))
+
+
+def report():
+    lines = ['Start-up profile (%.3fs since %s was imported):' %
+             (time.time() - _started, __name__), '', 'Phases:']
+    for name, elapsed in _phases:
+        lines.append('  %8.1fms  %s' % (elapsed * 1000, name))
+    lines += ['', 'Slowest imports (own ms, total ms with nested imports):']
+    ranked = sorted(_imports.items(), key=lambda item: item[1][1],
+                    reverse=True)
+    for name, (cumulative, own) in ranked[:TOP_IMPORTS]:
+        lines.append('  %8.1fms %8.1fms  %s' % (own * 1000, cumulative * 1000,
+                                                name))
+    lines.append('  (%d modules imported)' % len(_imports))
+    output = '\n'.join(lines) + '\n'
+
+    target = os.environ.get(ENV_VAR)
+    if target and target not in ('1', 'true', 'yes'):
+        f = open(target, 'w')
+        try:
+            f.write(output)
+        finally:
+            f.close()
+    else:
+        sys.stderr.write(output)
@@ -0,0 +1,146 @@
+"""Serve files from MEDIA_ROOT with validators and precompressed variants.
+
+:func:`serve` replaces ``django.views.static.serve``:
+
+* a ``.gz`` sibling (written by ``./manage.py bundle_assets``) is sent to
+  clients that accept gzip;
+* responses carry a strong ETag from the file's contents, and a matching
+  ``If-None-Match`` gets a 304;
+* content-hashed bundles, and URLs whose query string is the deployed
+  revision from ``media/revision.txt`` (as the ``media()`` template helper
+  writes them), are cacheable for a year; other files for
+  ``MEDIA_MAX_AGE`` seconds;
+* with ``MEDIA_SENDFILE`` set to ``'X-Sendfile'`` or ``'X-Accel-Redirect'``
+  the body is left to the front-end server.
+"""
+
+import mimetypes
+import os
+import posixpath
+import re
+import time
+import urllib
+from hashlib import md5
+
+from django import http
+from django.conf import settings
+from django.core.servers.basehttp import FileWrapper
+from django.utils.http import http_date
+
+from project.base.lru import LRUCache
+
+
+FAR_FUTURE = 365 * 24 * 60 * 60
+HASHED_RE = re.compile(r'-min\.[0-9a-f]{12}\.\w+$')
+ETAG_RE = re.compile(r'(?:W/)?("[^"]*"|\*)')
+
+# (path, mtime, size) -> ETag; files are hashed once per change.
+_etags = LRUCache(maxsize=2000)
+_revision = {'mtime': None, 'value': None}
+
+
+def revision():
+    """The deployed revision, re-read whenever revision.txt changes."""
+    path = os.path.join(settings.MEDIA_ROOT, 'revision.txt')
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if mtime != _revision['mtime']:
+        f = open(path)
+        try:
+            _revision['value'] = f.read().strip() or None
+        finally:
+            f.close()
+        _revision['mtime'] = mtime
+    return _revision['value']
+
+
+def etag(fullpath, stat):
+    key = (fullpath, stat.st_mtime, stat.st_size)
+    value = _etags.get(key)
+    if value is None:
+        digest = md5()
+        f = open(fullpath, 'rb')
+        try:
+            for chunk in iter(lambda: f.read(65536), ''):
+                digest.update(chunk)
+        finally:
+            f.close()
+        value = '"%s"' % digest.hexdigest()
+        _etags.set(key, value)
+    return value
+
+
+def resolve_path(path, document_root):
+    """The file under ``document_root`` for a URL path, as
+    ``django.views.static.serve`` would find it, or None."""
+    path = posixpath.normpath(urllib.unquote(path))
+    parts = [p for p in path.split('/')
+             if p and not os.path.dirname(p) and p not in (os.curdir,
+                                                           os.pardir)]
+    relative = '/'.join(parts)
+    fullpath = os.path.join(document_root, *parts)
+    if not parts or not os.path.isfile(fullpath):
+        return None, None
+    return relative, fullpath
+
+
+def accepts_gzip(request):
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+
+def serve(request, path, document_root=None):
+    document_root = document_root or settings.MEDIA_ROOT
+    relative, fullpath = resolve_path(path, document_root)
+    if fullpath is None:
+        raise http.Http404('"%s" does not exist' % path)
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    headers = {}
+    gzipped = fullpath + '.gz'
+    if not encoding and os.path.isfile(gzipped):
+        headers['Vary'] = 'Accept-Encoding'
+        if (accepts_gzip(request) and
+                os.path.getmtime(gzipped) >= os.path.getmtime(fullpath)):
+            fullpath, relative = gzipped, relative + '.gz'
+            encoding = 'gzip'
+
+    stat = os.stat(fullpath)
+    tag = etag(fullpath, stat)
+    current = revision()
+    if (HASHED_RE.search(path) or
+            (current and request.META.get('QUERY_STRING') == current)):
+        max_age = FAR_FUTURE
+    else:
+        max_age = getattr(settings, 'MEDIA_MAX_AGE', 60 * 60)
+    headers.update({
+        'ETag': tag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': 'public, max-age=%d' % max_age,
+        'Expires': http_date(time.time() + max_age),
+    })
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    matches = ETAG_RE.findall(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if tag in matches or '*' in matches:
+        response = http.HttpResponseNotModified()
+    else:
+        sendfile = getattr(settings, 'MEDIA_SENDFILE', None)
+        if sendfile or request.method == 'HEAD':
+            content = ''
+        else:
+            content = FileWrapper(open(fullpath, 'rb'), 65536)
+        response = http.HttpResponse(content, mimetype=content_type or
+                                     'application/octet-stream')
+        if sendfile == 'X-Accel-Redirect':
+            response[sendfile] = (settings.MEDIA_ACCEL_PREFIX.rstrip('/') +
+                                  '/' + urllib.quote(relative))
+        elif sendfile:
+            response[sendfile] = fullpath
+        if not sendfile:
+            response['Content-Length'] = str(stat.st_size)
+    for name, value in headers.items():
+        response[name] = value
+    return response
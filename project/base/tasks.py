@@ -0,0 +1,16 @@
+from celery.task import task
+
+from project.base import reports
+
+
+@task(ignore_result=True)
+def refresh_report(name, params):
+    """Rebuild one precomputed report; see project.base.reports."""
+    reports.refresh(name, params)
+
+
+@task(ignore_result=True)
+def refresh_scheduled_reports():
+    """Queue refreshes of the scheduled reports that are due; for
+    celerybeat, where cron_daemon is not used."""
+    reports.refresh_scheduled()
@@ -0,0 +1,96 @@
+"""On-disk cache of compiled Jinja template bytecode.
+
+``./manage.py compile_templates`` fills the cache at deploy time so worker
+processes load compiled templates from disk instead of compiling each one
+on the first request that uses it.
+"""
+
+import errno
+import os
+import tempfile
+
+from django.conf import settings
+from django.utils.importlib import import_module
+
+from jinja2 import FileSystemBytecodeCache
+
+
+class BytecodeCache(FileSystemBytecodeCache):
+    """Never lets the cache break rendering.
+
+    Files are written under a temporary name and renamed into place, so
+    another process never reads a half-written one; a file that cannot be
+    read anyway is treated as a miss and the template is compiled again.
+    """
+
+    def load_bytecode(self, bucket):
+        try:
+            FileSystemBytecodeCache.load_bytecode(self, bucket)
+        except Exception:
+            bucket.reset()
+
+    def dump_bytecode(self, bucket):
+        filename = self._get_cache_filename(bucket)
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        except (IOError, OSError):
+            return
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                bucket.write_bytecode(f)
+            finally:
+                f.close()
+            os.rename(tmp, filename)
+        except (IOError, OSError):
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+
+def bytecode_cache():
+    """The cache configured by ``settings.JINJA_BYTECODE_DIR``, if any."""
+    directory = getattr(settings, 'JINJA_BYTECODE_DIR', None)
+    if not directory:
+        return None
+    try:
+        os.makedirs(directory)
+    except OSError, exc:
+        if exc.errno != errno.EEXIST:
+            return None
+    return BytecodeCache(directory)
+
+
+def template_dirs():
+    """Directories jingo loads templates from, in lookup order."""
+    dirs = list(settings.TEMPLATE_DIRS)
+    excluded = set(getattr(settings, 'JINGO_EXCLUDE_APPS', ()))
+    for app in settings.INSTALLED_APPS:
+        if app.split('.')[-1] in excluded:
+            continue
+        try:
+            module = import_module(app)
+        except ImportError:
+            continue
+        dirs.append(os.path.join(os.path.dirname(module.__file__),
+                                 'templates'))
+    return [d for d in dirs if os.path.isdir(d)]
+
+
+def template_names():
+    """Every Jinja template name that can be loaded, each listed once."""
+    names = []
+    seen = set()
+    for directory in template_dirs():
+        for root, subdirs, files in os.walk(directory):
+            subdirs[:] = [d for d in subdirs if not d.startswith('.')]
+            for filename in files:
+                if filename.startswith('.'):
+                    continue
+                name = os.path.relpath(os.path.join(root, filename),
+                                       directory).replace(os.sep, '/')
+                if name not in seen:
+                    seen.add(name)
+                    names.append(name)
+    return sorted(names)
@@ -0,0 +1,285 @@
+"""A test runner that builds each test database once per set of migrations.
+
+The first run builds the test database with ``syncdb`` and the migrations
+in ``migrations/``, records a hash of the migration files and of the
+installed models' source in it, and saves a snapshot of it in
+``TEST_DB_SNAPSHOT_DIR``. Later runs:
+
+* reuse the test database as it is if it holds the same hash;
+* otherwise restore the snapshot for the current hash, if there is one;
+* and only otherwise build it again.
+
+Only migration statements for tables that ``syncdb`` did not create are
+applied: the tables of installed models come from the models, as they
+would with funfactory's runner.
+
+Test databases are kept after the run. Tests deriving from
+``django.test.TestCase`` each run in a transaction that is rolled back, so
+the database stays as the snapshot left it.
+
+SQLite (a file next to the snapshots when ``TEST_NAME`` is not set) and
+MySQL (snapshots taken with ``mysqldump``) are supported. Each
+``bin/parallel_tests.py`` worker keeps its own snapshots, named after its
+``TEST_DB_SUFFIX``.
+
+The runner extends ``settings.TEST_BASE_RUNNER``, funfactory's
+``TEST_RUNNER``, so its test environment set-up is kept; only the set-up
+and tear-down of the databases are replaced.
+"""
+
+import os
+import shutil
+import subprocess
+from hashlib import sha1
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.db.models import get_apps
+from django.utils.importlib import import_module
+
+import commonware
+
+from project.base.schema import MIGRATION_RE, migrations_dir, MigrationRunner
+
+
+log = commonware.log.getLogger('playdoh')
+
+SNAPSHOT_TABLE = 'test_snapshot'
+
+
+def base_runner():
+    path = getattr(settings, 'TEST_BASE_RUNNER',
+                   'django.test.simple.DjangoTestSuiteRunner')
+    module, name = path.rsplit('.', 1)
+    return getattr(import_module(module), name)
+
+
+def migrations_digest(directory):
+    """Hash of the names and contents of the migration files."""
+    digest = sha1()
+    for name in sorted(os.listdir(directory)):
+        if not MIGRATION_RE.match(name):
+            continue
+        f = open(os.path.join(directory, name), 'rb')
+        try:
+            digest.update('%s\0%s\0' % (name, f.read()))
+        finally:
+            f.close()
+    return digest.hexdigest()
+
+
+def models_digest():
+    """Hash of the source of every installed models module, which is what
+    ``syncdb`` creates tables from, and of the Django version."""
+    digest = sha1(django.get_version())
+    for app in get_apps():
+        path = app.__file__
+        if path.endswith(('.pyc', '.pyo')):
+            path = path[:-1]
+        f = open(path, 'rb')
+        try:
+            digest.update('%s\0%s\0' % (app.__name__, f.read()))
+        finally:
+            f.close()
+    return digest.hexdigest()
+
+
+def mysql_args(settings_dict):
+    args = []
+    if settings_dict['USER']:
+        args.append('--user=%s' % settings_dict['USER'])
+    host = settings_dict['HOST']
+    if host.startswith('/'):
+        args.append('--socket=%s' % host)
+    elif host:
+        args.append('--host=%s' % host)
+    if settings_dict['PORT']:
+        args.append('--port=%s' % settings_dict['PORT'])
+    return args
+
+
+def mysql_env(settings_dict):
+    """The environment for ``mysql`` and ``mysqldump``. The password goes
+    in ``MYSQL_PWD`` so that it does not show up in the process list."""
+    env = dict(os.environ)
+    if settings_dict['PASSWORD']:
+        env['MYSQL_PWD'] = settings_dict['PASSWORD']
+    return env
+
+
+class SnapshotDatabase(object):
+    """The test database for one connection and its snapshot."""
+
+    def __init__(self, connection, snapshot_dir, verbosity=1):
+        self.connection = connection
+        self.alias = connection.alias
+        self.vendor = connection.vendor
+        self.verbosity = verbosity
+        settings_dict = connection.settings_dict
+        self.original_name = settings_dict['NAME']
+
+        name = connection.creation._get_test_db_name()
+        if self.vendor == 'sqlite' and name == ':memory:':
+            # An in-memory database cannot outlive the run.
+            name = os.path.join(snapshot_dir, 'test_%s.sqlite' % self.alias)
+            settings_dict['TEST_NAME'] = name
+        self.name = name
+
+        self.digest = '%s:%s:%s' % (self.vendor,
+                                    migrations_digest(migrations_dir()),
+                                    models_digest())
+        extension = 'sqlite' if self.vendor == 'sqlite' else 'sql'
+        # Parallel workers prune their own old snapshots, not each other's.
+        self.snapshot_prefix = os.path.join(
+            snapshot_dir, '%s%s-' % (self.alias,
+                                     os.environ.get('TEST_DB_SUFFIX', '')))
+        self.snapshot = '%s%s.%s' % (self.snapshot_prefix,
+                                     sha1(self.digest).hexdigest()[:16],
+                                     extension)
+
+    def report(self, msg):
+        if self.verbosity >= 1:
+            print msg
+
+    def use(self, name):
+        self.connection.close()
+        self.connection.settings_dict['NAME'] = name
+
+    def current_digest(self):
+        """The hash recorded in the existing test database, if any."""
+        if self.vendor == 'sqlite' and not os.path.exists(self.name):
+            return None
+        self.use(self.name)
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute('SELECT digest FROM %s' % SNAPSHOT_TABLE)
+            row = cursor.fetchone()
+        except Exception:
+            # No such database or table yet.
+            row = None
+        finally:
+            transaction.rollback_unless_managed(using=self.alias)
+            self.use(self.original_name)
+        return row[0] if row else None
+
+    def setup(self):
+        if self.current_digest() == self.digest:
+            self.report("Reusing test database for alias '%s'..." %
+                        self.alias)
+        elif os.path.exists(self.snapshot):
+            self.report("Restoring test database for alias '%s' from %s..." %
+                        (self.alias, self.snapshot))
+            self.restore()
+        else:
+            self.report("Building test database for alias '%s'..." %
+                        self.alias)
+            self.build()
+            self.save()
+        self.use(self.name)
+        self.connection.features.confirm()
+        return self.name
+
+    def build(self):
+        self.connection.creation._create_test_db(self.verbosity,
+                                                 autoclobber=True)
+        self.use(self.name)
+        call_command('syncdb', verbosity=max(self.verbosity - 1, 0),
+                     interactive=False, database=self.alias,
+                     load_initial_data=False)
+        # Everything there now was created by syncdb from the models.
+        owned = self.connection.introspection.table_names()
+        MigrationRunner(migrations_dir(), using=self.alias,
+                        skip_tables=owned).migrate()
+        cursor = self.connection.cursor()
+        cursor.execute('CREATE TABLE %s (digest VARCHAR(255))' %
+                       SNAPSHOT_TABLE)
+        cursor.execute('INSERT INTO %s (digest) VALUES (%%s)' %
+                       SNAPSHOT_TABLE, [self.digest])
+        transaction.commit_unless_managed(using=self.alias)
+        self.use(self.original_name)
+
+    def save(self):
+        # Drop this worker's snapshots for older migrations and models.
+        directory = os.path.dirname(self.snapshot)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if (path.startswith(self.snapshot_prefix) and
+                    path != self.snapshot and not path.endswith('.tmp')):
+                os.remove(path)
+        tmp = '%s.%d.tmp' % (self.snapshot, os.getpid())
+        if self.vendor == 'sqlite':
+            shutil.copyfile(self.name, tmp)
+        else:
+            out = open(tmp, 'w')
+            try:
+                status = subprocess.call(
+                    ['mysqldump', '--single-transaction'] +
+                    mysql_args(self.connection.settings_dict) + [self.name],
+                    stdout=out, env=mysql_env(self.connection.settings_dict))
+            finally:
+                out.close()
+            if status:
+                os.remove(tmp)
+                log.warning('mysqldump failed (exit %s); no test database '
+                            'snapshot saved.' % status)
+                return
+        os.rename(tmp, self.snapshot)
+
+    def restore(self):
+        if self.vendor == 'sqlite':
+            shutil.copyfile(self.snapshot, self.name)
+            return
+        self.connection.creation._create_test_db(self.verbosity,
+                                                 autoclobber=True)
+        self.use(self.original_name)
+        dump = open(self.snapshot)
+        try:
+            status = subprocess.call(
+                ['mysql'] + mysql_args(self.connection.settings_dict) +
+                [self.name], stdin=dump,
+                env=mysql_env(self.connection.settings_dict))
+        finally:
+            dump.close()
+        if status:
+            log.warning('Restoring %s failed (exit %s); building the test '
+                        'database instead.' % (self.snapshot, status))
+            self.build()
+            self.save()
+
+
+class SnapshotTestSuiteRunner(base_runner()):
+
+    def setup_databases(self, **kwargs):
+        snapshot_dir = getattr(settings, 'TEST_DB_SNAPSHOT_DIR',
+                               os.path.join(settings.ROOT, '.test-db'))
+        if not os.path.isdir(snapshot_dir):
+            os.makedirs(snapshot_dir)
+
+        old_names = []
+        test_names = {}
+        for alias in connections:
+            connection = connections[alias]
+            if connection.settings_dict['TEST_MIRROR']:
+                continue
+            database = SnapshotDatabase(connection, snapshot_dir,
+                                        self.verbosity)
+            old_names.append((connection, database.original_name))
+            test_names[alias] = database.setup()
+
+        for alias in connections:
+            connection = connections[alias]
+            mirror = connection.settings_dict['TEST_MIRROR']
+            if mirror:
+                old_names.append((connection,
+                                  connection.settings_dict['NAME']))
+                connection.close()
+                connection.settings_dict['NAME'] = test_names[mirror]
+        return old_names
+
+    def teardown_databases(self, old_config, **kwargs):
+        # The test databases are kept for the next run.
+        for connection, old_name in old_config:
+            connection.close()
+            connection.settings_dict['NAME'] = old_name
@@ -0,0 +1,65 @@
+from django.core.cache import get_cache
+from django.utils import unittest
+
+from nose.tools import eq_
+
+from project.base import cache as tiered
+from project.base.cache import TieredCache
+
+
+class TieredCacheTests(unittest.TestCase):
+    """Two workers' caches in front of one shared cache."""
+
+    def setUp(self):
+        self.shared = get_cache(
+            'django.core.cache.backends.locmem.LocMemCache',
+            LOCATION='tiered-cache-tests')
+        self.shared.clear()
+        self.a = self.worker()
+        self.b = self.worker()
+
+    def worker(self):
+        cache = TieredCache('shared', {'OPTIONS': {'L1_TTL': 60,
+                                                   'GENERATION_INTERVAL': 0}})
+        cache._l2 = self.shared
+        return cache
+
+    def test_delete_is_seen_by_other_workers(self):
+        self.a.set('key', 'one')
+        eq_(self.b.get('key'), 'one')
+        self.a.delete('key')
+        eq_(self.b.get('key'), None)
+
+    def test_set_is_seen_by_other_workers(self):
+        self.a.set('key', 'one')
+        eq_(self.b.get('key'), 'one')
+        self.a.set('key', 'two')
+        eq_(self.b.get('key'), 'two')
+        self.a.set_many({'key': 'three', 'other': 'four'})
+        eq_(self.b.get_many(['key', 'other']),
+            {'key': 'three', 'other': 'four'})
+        self.a.delete_many(['key', 'other'])
+        eq_(self.b.get_many(['key', 'other']), {})
+
+    def test_only_changed_keys_are_dropped(self):
+        self.a.set('key', 'one')
+        self.a.set('other', 'two')
+        self.b.get('key')
+        self.b.get('other')
+        self.a.delete('key')
+        self.b.get('key')
+        eq_(len(self.b._l1), 1)
+        assert self.b.make_key('other') in self.b._l1
+
+    def test_far_behind_empties_l1(self):
+        self.a.set('key', 'one')
+        self.b.get('key')
+        self.shared.incr(tiered.GENERATION_KEY, tiered.MAX_REPLAY + 1)
+        self.b.get('other')
+        eq_(len(self.b._l1), 0)
+
+    def test_clear_is_seen_by_other_workers(self):
+        self.a.set('key', 'one')
+        eq_(self.b.get('key'), 'one')
+        self.a.clear()
+        eq_(self.b.get('key'), None)
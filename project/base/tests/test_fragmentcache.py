@@ -0,0 +1,38 @@
+from django.core.cache import cache
+from django.utils import unittest
+
+import jinja2
+from nose.tools import eq_
+
+from project.base.fragmentcache import FragmentCacheExtension
+
+
+class FragmentCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.env = jinja2.Environment(extensions=[FragmentCacheExtension])
+        self.template = self.env.from_string(
+            "{% cache 'greeting', 60, name %}Hi {{ name }}{% endcache %}")
+
+    def render(self, name):
+        return self.template.render(LANG='en-US', name=name)
+
+    def test_cached(self):
+        eq_(self.render('Bob'), 'Hi Bob')
+        eq_(self.render('Ann'), 'Hi Ann')
+        eq_(len(self.env.extensions.values()[0].local), 2)
+
+    def test_kept_in_process(self):
+        self.render('Bob')
+        cache.clear()
+        template = self.env.from_string(
+            "{% cache 'greeting', 60, name %}Bye {{ name }}{% endcache %}")
+        eq_(template.render(LANG='en-US', name='Bob'), 'Hi Bob')
+
+    def test_local_copy_is_bounded(self):
+        local = self.env.extensions.values()[0].local
+        local.maxsize = 2
+        for name in ('Ann', 'Bob', 'Cid'):
+            self.render(name)
+        eq_(len(local), 2)
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.utils import unittest
+
+from nose.tools import eq_
+
+from project.base import bundles, helpers
+
+
+class BundleHelperTests(unittest.TestCase):
+
+    def setUp(self):
+        self._manifest = bundles._manifest
+        bundles._manifest = {'js:common': {'file': 'js/common-abc.js'},
+                             'css:common': {'file': 'css/common-abc.css'}}
+
+    def tearDown(self):
+        bundles._manifest = self._manifest
+
+    def test_js(self):
+        url = settings.MEDIA_URL + 'js/common-abc.js'
+        eq_(helpers.js('common', debug=False),
+            '<script src="%s"></script>' % url)
+        eq_(helpers.js('common', debug=False, defer=True, async=True),
+            '<script src="%s" defer async></script>' % url)
+
+    def test_css_media(self):
+        url = settings.MEDIA_URL + 'css/common-abc.css'
+        eq_(helpers.css('common', media='print', debug=False),
+            '<link rel="stylesheet" media="print" href="%s" />' % url)
+        settings.CSS_MEDIA_DEFAULT = 'all'
+        try:
+            eq_(helpers.css('common', debug=False),
+                '<link rel="stylesheet" media="all" href="%s" />' % url)
+        finally:
+            del settings.CSS_MEDIA_DEFAULT
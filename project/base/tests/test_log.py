@@ -0,0 +1,51 @@
+import logging
+
+from django.utils import unittest
+
+from nose.tools import eq_
+
+from project.base.log import QueuedHandler
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class QueuedHandlerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('test-queued-handler')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.target = ListHandler()
+        self.queued = QueuedHandler(self.target, flush_interval=0.01)
+        self.other = ListHandler()
+        self.logger.addHandler(self.queued)
+        self.logger.addHandler(self.other)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.queued)
+        self.logger.removeHandler(self.other)
+
+    def test_leaves_the_record_alone(self):
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            self.logger.exception('Failed %s', 'badly')
+        self.queued.flush()
+        record = self.other.records[0]
+        eq_(record.msg, 'Failed %s')
+        eq_(record.args, ('badly',))
+        assert record.exc_info
+        queued = self.target.records[0]
+        assert queued is not record
+        assert queued.msg.startswith('Failed badly')
+        assert 'ZeroDivisionError' in queued.msg
+        eq_(queued.args, None)
+        eq_(queued.exc_info, None)
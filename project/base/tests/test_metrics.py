@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from django.utils import unittest
+
+from nose.tools import eq_
+
+from project.base.metrics import KINDS, Registry
+
+
+TIMINGS = dict.fromkeys(KINDS, 0.01)
+
+
+class RegistryFlushTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_one_thread_claims_a_due_flush(self):
+        registry = Registry(self.directory, flush_interval=60)
+        registry._flushed = 0
+        writes = []
+        registry._path = lambda pid: (writes.append(pid) or
+                                      os.path.join(self.directory,
+                                                   '%s.json' % pid))
+        threads = [threading.Thread(target=registry.observe,
+                                    args=('home', TIMINGS))
+                   for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        eq_(len(writes), 1)
+
+    def test_concurrent_flushes(self):
+        registry = Registry(self.directory)
+        registry.observe('home', TIMINGS)
+        threads = [threading.Thread(target=registry.flush)
+                   for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        eq_(os.listdir(self.directory), ['%s.json' % os.getpid()])
+        histograms, counters = registry.collect()
+        eq_(sum(histograms[('home', 'wall')].counts), 1)
+
+    def test_flush_errors_stay_in(self):
+        path = os.path.join(self.directory, 'not-a-directory')
+        open(path, 'w').close()
+        registry = Registry(path, flush_interval=0)
+        registry.observe('home', TIMINGS)
+        eq_(sum(registry.histograms[('home', 'wall')].counts), 1)
@@ -0,0 +1,79 @@
+from django import http
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test.client import RequestFactory
+from django.utils import unittest
+
+from nose.tools import eq_, ok_
+from session_csrf import CsrfMiddleware, anonymous_csrf
+
+from project.base.pagecache import PageCacheMiddleware, page_cache
+
+
+@page_cache(60)
+def plain(request):
+    plain.calls += 1
+    return http.HttpResponse('plain')
+
+
+@anonymous_csrf
+@page_cache(60)
+def form(request):
+    form.calls += 1
+    return http.HttpResponse('token: %s' % request.csrf_token)
+
+
+class PageCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        plain.calls = form.calls = 0
+        self.factory = RequestFactory()
+
+    def get(self, view, **extra):
+        request = self.factory.get('/page/', **extra)
+        request.user = AnonymousUser()
+        csrf, pages = CsrfMiddleware(), PageCacheMiddleware()
+        csrf.process_request(request)
+        response = pages.process_view(request, view, (), {})
+        if response is None:
+            response = view(request)
+        response = pages.process_response(request, response)
+        return csrf.process_response(request, response)
+
+    def test_cached(self):
+        eq_(self.get(plain).content, 'plain')
+        eq_(self.get(plain).content, 'plain')
+        eq_(plain.calls, 1)
+
+    def test_anonymous_csrf_not_cached(self):
+        first = self.get(form)
+        ok_('anoncsrf' in first.cookies)
+        second = self.get(form)
+        eq_(form.calls, 2)
+        ok_('anoncsrf' in second.cookies)
+        ok_(first.content != second.content)
+
+    def test_anon_csrf_key_not_cached(self):
+        # What CsrfMiddleware leaves for its own process_response with
+        # ANON_ALWAYS on; the cookie is set after the page cache has run.
+        @page_cache(60)
+        def view(request):
+            view.calls += 1
+            request._anon_csrf_key = 'key'
+            return http.HttpResponse('form')
+        view.calls = 0
+        ok_('anoncsrf' in self.get(view).cookies)
+        self.get(view)
+        eq_(view.calls, 2)
+
+    def test_csrf_cookie_used_not_cached(self):
+        @page_cache(60)
+        def view(request):
+            view.calls += 1
+            request.META['CSRF_COOKIE_USED'] = True
+            return http.HttpResponse('form')
+        view.calls = 0
+        self.get(view)
+        self.get(view)
+        eq_(view.calls, 2)
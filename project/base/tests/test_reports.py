@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import unittest
+
+from nose.tools import eq_
+
+from project.base import reports
+from project.base.cache import TieredCache
+
+
+NAME = 'tests.squares'
+
+
+class ReportTests(unittest.TestCase):
+    """With CELERY_ALWAYS_EAGER, as in development and on Jenkins, queued
+    builds run inline."""
+
+    def setUp(self):
+        cache.clear()
+        self.built = []
+        reports.register(NAME, refresh=60,
+                         schedule=[{'n': 2}])(self.squares)
+        self.eager = getattr(settings, 'CELERY_ALWAYS_EAGER', False)
+        settings.CELERY_ALWAYS_EAGER = True
+
+    def tearDown(self):
+        del reports._registry[NAME]
+        settings.CELERY_ALWAYS_EAGER = self.eager
+
+    def squares(self, n):
+        self.built.append(n)
+        return [i * i for i in range(n)]
+
+    def key(self, **params):
+        return reports.get_report(NAME).key(params)
+
+    def age(self, seconds, **params):
+        pointer = cache.get(self.key(**params))
+        pointer['built'] -= seconds
+        cache.set(self.key(**params), pointer)
+
+    def test_cold(self):
+        eq_(reports.get(NAME, n=3), [0, 1, 4])
+        eq_(reports.get(NAME, n=3), [0, 1, 4])
+        eq_(self.built, [3])
+        eq_(cache.get('%s:refreshing' % self.key(n=3)), None)
+
+    def test_stale(self):
+        reports.get(NAME, n=3)
+        self.age(120, n=3)
+        # The stale build is what this request gets; the refresh ran
+        # inline, so the next one gets a fresh build.
+        eq_(reports.get(NAME, n=3), [0, 1, 4])
+        eq_(self.built, [3, 3])
+        reports.get(NAME, n=3)
+        eq_(self.built, [3, 3])
+        eq_(cache.get('%s:refreshing' % self.key(n=3)), None)
+
+    def test_locked(self):
+        cache.add('%s:refreshing' % self.key(n=3), 1)
+        self.assertRaises(reports.NotReady, reports.get, NAME, n=3)
+        eq_(self.built, [])
+
+    def test_stale_locked(self):
+        reports.get(NAME, n=3)
+        self.age(120, n=3)
+        cache.add('%s:refreshing' % self.key(n=3), 1)
+        eq_(reports.get(NAME, n=3), [0, 1, 4])
+        eq_(self.built, [3])
+
+    def test_builder_error_releases_lock(self):
+        def broken(n):
+            raise ValueError(n)
+        reports.register(NAME)(broken)
+        self.assertRaises(reports.NotReady, reports.get, NAME, n=3)
+        eq_(cache.get('%s:refreshing' % self.key(n=3)), None)
+        reports.register(NAME)(self.squares)
+        eq_(reports.get(NAME, n=3), [0, 1, 4])
+
+    def test_refresh_scheduled_needs_shared_cache(self):
+        # The cron job's builds would stay in the cron process.
+        self.assertRaises(ImproperlyConfigured, reports.refresh_scheduled)
+        eq_(self.built, [])
+
+    def test_get_needs_shared_cache(self):
+        settings.CELERY_ALWAYS_EAGER = False
+        self.assertRaises(ImproperlyConfigured, reports.get, NAME, n=3)
+
+    def test_tiered_cache_over_local_memory(self):
+        tiered = TieredCache('shared', {})
+        tiered._l2 = cache
+        eq_(reports.shared_cache(), False)
+        old, reports.cache = reports.cache, tiered
+        try:
+            eq_(reports.shared_cache(), False)
+        finally:
+            reports.cache = old
@@ -0,0 +1,104 @@
+import BaseHTTPServer
+import imp
+import os
+import shutil
+import tempfile
+import threading
+from cStringIO import StringIO
+
+from django.utils import unittest
+
+from nose.tools import eq_
+
+
+ROOT = os.path.join(os.path.dirname(__file__), '..', '..', '..')
+rolling = imp.load_source('rolling',
+                          os.path.join(ROOT, 'bin', 'update', 'rolling.py'))
+
+
+class HealthHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers /<host> with 503 until that host has been asked for
+    ``server.warmup[host]`` times, then with 200."""
+
+    def do_GET(self):
+        host = self.path.strip('/')
+        with self.server.lock:
+            self.server.checks[host] = self.server.checks.get(host, 0) + 1
+            healthy = self.server.checks[host] > self.server.warmup.get(host,
+                                                                        0)
+        self.send_response(200 if healthy else 503)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RollingDeployTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                HealthHandler)
+        self.server.lock = threading.Lock()
+        self.server.checks = {}
+        self.server.warmup = {}
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.tmp = tempfile.mkdtemp()
+        self.updated = os.path.join(self.tmp, 'updated')
+        self.out = StringIO()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp)
+
+    def deploy(self, hosts, commands=None, **kwargs):
+        if commands is None:
+            commands = ['echo %%(host)s >> %s' % self.updated]
+        kwargs.setdefault('health_url', 'http://127.0.0.1:%s/%%(host)s' %
+                                        self.server.server_port)
+        kwargs.setdefault('healthy_checks', 2)
+        kwargs.setdefault('poll_interval', 0.01)
+        kwargs.setdefault('warmup_timeout', 2)
+        return rolling.RollingDeploy(hosts, commands, rolling.LocalRunner(),
+                                     out=self.out, **kwargs)
+
+    def updated_hosts(self):
+        if not os.path.exists(self.updated):
+            return []
+        with open(self.updated) as f:
+            return f.read().split()
+
+    def test_batches(self):
+        deploy = self.deploy('abcde', batch_size=2)
+        eq_(list(deploy.batches()), [['a', 'b'], ['c', 'd'], ['e']])
+        assert deploy.run()
+        eq_(sorted(self.updated_hosts()), list('abcde'))
+        assert 'Batch 3/3: e' in self.out.getvalue()
+
+    def test_waits_until_healthy(self):
+        self.server.warmup['b'] = 3
+        assert self.deploy('abc').run()
+        eq_(self.server.checks['b'], 5)
+        eq_(self.server.checks['a'], 2)
+        assert '[b] not ready: HTTP 503' in self.out.getvalue()
+
+    def test_unhealthy_host_aborts(self):
+        self.server.warmup['c'] = 1000
+        deploy = self.deploy('abcde', batch_size=2, warmup_timeout=0.3)
+        assert not deploy.run()
+        eq_(sorted(self.updated_hosts()), list('abcd'))
+        assert 'e' not in self.server.checks
+        assert 'Aborting rollout; c failed, 1 hosts left' in \
+            self.out.getvalue()
+
+    def test_failed_command_aborts(self):
+        commands = ['test %(host)s != b',
+                    'echo %%(host)s >> %s' % self.updated]
+        assert not self.deploy('abc', commands).run()
+        eq_(self.updated_hosts(), ['a'])
+        assert 'b' not in self.server.checks
+        assert 'Aborting rollout; b failed, 1 hosts left' in \
+            self.out.getvalue()
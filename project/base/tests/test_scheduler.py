@@ -0,0 +1,42 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.utils import unittest
+
+from nose.tools import eq_
+
+from project.base.scheduler import Job, Scheduler
+
+
+class SchedulerLockTests(unittest.TestCase):
+
+    def setUp(self):
+        # Where manage.py cron would put its lock for this job.
+        self.path = os.path.join(tempfile.gettempdir(),
+                                 'django_cron.%s.test-scheduler-job' %
+                                 getattr(settings, 'CRONJOB_LOCK_PREFIX',
+                                         'lock'))
+        self.seen = []
+        self.job = Job('test-scheduler-job', self.func, 60, lock=True)
+        self.scheduler = Scheduler([self.job])
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def func(self):
+        self.seen.append(os.path.exists(self.path))
+
+    def test_takes_and_removes_cronjobs_lock(self):
+        self.scheduler._run(self.job)
+        eq_(self.seen, [True])
+        assert not os.path.exists(self.path)
+        eq_(self.job.runs, 1)
+
+    def test_skips_while_cron_holds_the_lock(self):
+        open(self.path, 'w').close()
+        self.scheduler._run(self.job)
+        eq_(self.seen, [])
+        eq_(self.job.skipped, 1)
+        assert os.path.exists(self.path)
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+from cStringIO import StringIO
+
+from django.db import connection
+from django.utils import unittest
+
+from nose.tools import eq_
+
+from project.base.schema import (MigrationRunner, split_statements,
+                                 statement_table)
+
+
+SCRIPT = """\
+from django.db import connection
+connection.cursor().execute("INSERT INTO test_notes VALUES ('script')")
+"""
+
+RUN = """\
+def run(migration):
+    migration.execute("INSERT INTO test_notes VALUES ('run')")
+"""
+
+
+class MigrationRunnerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.write('01-notes.sql', 'CREATE TABLE test_notes (note TEXT);')
+        self.write('02-script.py', SCRIPT)
+        self.write('03-run.py', RUN)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        cursor = connection.cursor()
+        for table in ('test_notes', 'test_other', 'test_version',
+                      'test_version_history'):
+            cursor.execute('DROP TABLE IF EXISTS %s' % table)
+
+    def write(self, name, content):
+        with open(os.path.join(self.directory, name), 'w') as f:
+            f.write(content)
+
+    def runner(self):
+        return MigrationRunner(self.directory, table='test_version',
+                               history_table='test_version_history',
+                               out=StringIO())
+
+    def notes(self):
+        cursor = connection.cursor()
+        cursor.execute('SELECT note FROM test_notes')
+        return [row[0] for row in cursor.fetchall()]
+
+    def test_status_changes_nothing(self):
+        runner = self.runner()
+        eq_(runner.current_version(), 0)
+        eq_(runner.history(), [])
+        eq_([m.version for m in runner.pending()], [1, 2, 3])
+        assert not runner.exists('test_version')
+        assert not runner.exists('test_version_history')
+
+    def test_migrate(self):
+        runner = self.runner()
+        eq_([m.version for m in runner.migrate()], [1, 2, 3])
+        eq_(runner.current_version(), 3)
+        eq_(self.notes(), ['script', 'run'])
+        eq_([row[1] for row in runner.history()],
+            ['01-notes.sql', '02-script.py', '03-run.py'])
+        eq_(runner.migrate(), [])
+
+    def test_split_statements(self):
+        eq_(split_statements("SELECT ';'; -- x;\nSELECT 2 /* ; */;"),
+            ["SELECT ';'", 'SELECT 2'])
+
+    def test_skip_tables(self):
+        self.write('04-owned.sql', "INSERT INTO test_notes VALUES ('sql');\n"
+                                   "CREATE TABLE test_other (id INT);")
+        runner = MigrationRunner(self.directory, table='test_version',
+                                 history_table='test_version_history',
+                                 skip_tables=['TEST_NOTES'])
+        connection.cursor().execute('CREATE TABLE test_notes (note TEXT)')
+        runner.migrate()
+        eq_(runner.current_version(), 4)
+        eq_(self.notes(), ['script'])
+        assert runner.exists('test_other')
+
+    def test_statement_table(self):
+        eq_(statement_table('ALTER TABLE `reports` ADD x INT'), 'reports')
+        eq_(statement_table('create unique index i on reports (x)'),
+            'reports')
+        eq_(statement_table('INSERT INTO reports VALUES (1)'), 'reports')
+        eq_(statement_table('SELECT 1'), None)
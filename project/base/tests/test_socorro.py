@@ -0,0 +1,105 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.utils import unittest
+
+from nose.tools import eq_
+
+from project.base import fanout
+from project.base.fakemiddleware import FakeMiddleware
+from project.base.socorro import ConnectionPool, MiddlewareError, \
+                                 SocorroMiddleware
+
+
+class SocorroMiddlewareTests(unittest.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.fake = FakeMiddleware()
+        self.fake.start()
+
+    def tearDown(self):
+        self.fake.shutdown()
+        self.fake.server_close()
+
+    def client(self, **kwargs):
+        kwargs.setdefault('cache_ttls', {'products': 60})
+        kwargs.setdefault('default_ttl', 0)
+        return SocorroMiddleware(base_url=self.fake.url, **kwargs)
+
+    def test_pool_reuses_connections(self):
+        pool = ConnectionPool(self.fake.url, maxsize=2)
+        for i in range(3):
+            status, body = pool.request('GET', '/products/versions/')
+            eq_(status, 200)
+        eq_(len(pool._idle), 1)
+        pool.close()
+        eq_(pool._idle, [])
+
+    def test_ttl_per_endpoint(self):
+        client = self.client()
+        for i in range(2):
+            client.fetch('/products/versions/')
+            client.fetch('/crashes/daily/', {'product': 'Firefox'})
+        eq_(self.fake.hits['products/versions'], 1)
+        eq_(self.fake.hits['crashes/daily'], 2)
+
+    def test_ttl_override(self):
+        client = self.client()
+        client.fetch('/products/versions/', ttl=0)
+        client.fetch('/products/versions/', ttl=0)
+        eq_(self.fake.hits['products/versions'], 2)
+
+    def test_coalesces_concurrent_fetches(self):
+        self.fake.delay = 0.2
+        client = self.client()
+        results = []
+
+        def fetch():
+            results.append(client.fetch('/crashes/daily/',
+                                        {'product': 'Firefox'}))
+
+        threads = [threading.Thread(target=fetch) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        eq_(self.fake.hits['crashes/daily'], 1)
+        eq_(len(results), 5)
+        eq_(len(set(map(repr, results))), 1)
+
+    def test_errors_reach_every_waiter(self):
+        client = self.client()
+
+        def broken(path):
+            time.sleep(0.2)
+            return 1 / 0
+
+        client._fetch = broken
+        errors = []
+
+        def fetch():
+            try:
+                client.fetch('/crashes/daily/')
+            except MiddlewareError, exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=fetch) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        eq_(len(errors), 3)
+        eq_(client._inflight, {})
+
+    def test_short_deadline_does_not_fail_waiters(self):
+        self.fake.delay = 0.3
+        client = self.client()
+        hurried = fanout.Fanout(pool=fanout.ThreadPool(2), timeout=0.1)
+        hurried.add('crashes', client.fetch, '/crashes/daily/')
+        hurried = hurried.run()
+        result = client.fetch('/crashes/daily/')
+        assert 'crashes' in hurried.errors
+        assert result
+        eq_(self.fake.hits['crashes/daily'], 1)
@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+
+from django.utils import unittest
+
+import jinja2
+from nose.tools import eq_
+
+from project.base.templatecache import BytecodeCache
+
+
+class BytecodeCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.env = self.environment()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def environment(self):
+        return jinja2.Environment(
+            loader=jinja2.DictLoader({'hello.html': 'Hi {{ name }}'}),
+            bytecode_cache=BytecodeCache(self.directory))
+
+    def test_writes_whole_files(self):
+        eq_(self.env.get_template('hello.html').render(name='Bob'), 'Hi Bob')
+        files = os.listdir(self.directory)
+        eq_(len(files), 1)
+        assert files[0].startswith('__jinja2_'), files
+
+    def test_unreadable_file_is_a_miss(self):
+        self.env.get_template('hello.html')
+        filename = os.path.join(self.directory, os.listdir(self.directory)[0])
+        with open(filename, 'rb') as f:
+            data = f.read()
+        with open(filename, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        template = self.environment().get_template('hello.html')
+        eq_(template.render(name='Ann'), 'Hi Ann')
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.db import connections
+from django.utils import unittest
+
+from nose.tools import eq_
+
+from project.base.testrunner import SnapshotDatabase
+
+
+ALIAS = 'snapshot-test'
+
+
+class SnapshotDatabaseTests(unittest.TestCase):
+    """Builds, snapshots and restores a SQLite test database, whatever
+    database the rest of the tests run on."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.snapshots = os.path.join(self.tmp, 'snapshots')
+        self.migrations = os.path.join(self.tmp, 'migrations')
+        os.mkdir(self.snapshots)
+        os.mkdir(self.migrations)
+        self.write('01-notes.sql', "CREATE TABLE test_notes (note TEXT);\n"
+                                   "INSERT INTO test_notes VALUES ('one');")
+        self._migrations_dir = getattr(settings, 'MIGRATIONS_DIR', None)
+        settings.MIGRATIONS_DIR = self.migrations
+        connections.databases[ALIAS] = {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+        self.builds = 0
+
+    def tearDown(self):
+        connections[ALIAS].close()
+        del connections._connections[ALIAS]
+        del connections.databases[ALIAS]
+        settings.MIGRATIONS_DIR = self._migrations_dir
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, content):
+        with open(os.path.join(self.migrations, name), 'w') as f:
+            f.write(content)
+
+    def setup_database(self):
+        database = SnapshotDatabase(connections[ALIAS], self.snapshots,
+                                    verbosity=0)
+        build = database.build
+
+        def counted_build():
+            self.builds += 1
+            build()
+
+        database.build = counted_build
+        database.setup()
+        return database
+
+    def notes(self):
+        cursor = connections[ALIAS].cursor()
+        cursor.execute('SELECT note FROM test_notes')
+        return [row[0] for row in cursor.fetchall()]
+
+    def test_build_snapshot_restore(self):
+        database = self.setup_database()
+        eq_(self.builds, 1)
+        eq_(self.notes(), ['one'])
+        assert os.path.exists(database.snapshot)
+
+        # Reused as it is.
+        self.setup_database()
+        eq_(self.builds, 1)
+
+        # Restored from the snapshot.
+        connections[ALIAS].close()
+        os.remove(database.name)
+        self.setup_database()
+        eq_(self.builds, 1)
+        eq_(self.notes(), ['one'])
+
+    def test_new_migrations_rebuild(self):
+        first = self.setup_database()
+        self.write('02-more.sql', "INSERT INTO test_notes VALUES ('two');")
+        second = self.setup_database()
+        eq_(self.builds, 2)
+        eq_(self.notes(), ['one', 'two'])
+        assert first.snapshot != second.snapshot
+        assert os.path.exists(second.snapshot)
+        assert not os.path.exists(first.snapshot)
@@ -0,0 +1,46 @@
+import threading
+
+from django.conf import settings
+from django.utils import unittest
+
+from nose.tools import eq_
+
+from project.base import warmup
+
+
+class WarmUpTests(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self._warm_up = warmup.warm_up
+        warmup.warm_up = self.fake_warm_up
+        warmup._ready.clear()
+        self._warmup_setting = getattr(settings, 'WARMUP', False)
+        settings.WARMUP = True
+
+    def tearDown(self):
+        warmup.warm_up = self._warm_up
+        warmup._ready.clear()
+        settings.WARMUP = self._warmup_setting
+
+    def fake_warm_up(self):
+        self.calls.append(threading.currentThread())
+        warmup._ready.set()
+
+    def test_runs_once_in_the_calling_thread(self):
+        assert not warmup.is_ready()
+        warmup.ensure_warm()
+        warmup.ensure_warm()
+        eq_(self.calls, [threading.currentThread()])
+        assert warmup.is_ready()
+
+    def test_failure_still_marks_ready(self):
+        def broken():
+            raise ValueError('no templates')
+        warmup.warm_up = broken
+        warmup.ensure_warm()
+        assert warmup.is_ready()
+
+    def test_ready_when_off(self):
+        settings.WARMUP = False
+        assert warmup.is_ready()
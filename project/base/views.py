@@ -0,0 +1,26 @@
+from django import http
+from django.conf import settings
+from django.views.decorators.cache import never_cache
+
+from project.base.metrics import get_registry, render_text
+from project.base.warmup import is_ready
+
+
+@never_cache
+def ready(request):
+    """200 once this worker is warmed up, 503 until then."""
+    if is_ready():
+        return http.HttpResponse('ready', mimetype='text/plain')
+    return http.HttpResponse('warming up', status=503, mimetype='text/plain')
+
+
+@never_cache
+def metrics(request):
+    """Per-view latency histograms of every worker, in the Prometheus text
+    format, for the hosts in ``METRICS_ALLOWED_IPS``."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return http.HttpResponseForbidden()
+    registry = get_registry()
+    registry.flush()
+    return http.HttpResponse(render_text(*registry.collect()),
+                             mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,129 @@
+"""Do a worker's first-request work before it takes traffic.
+
+Without this the first request each worker serves resolves the URLconf,
+imports the views, loads gettext catalogs and compiles templates.
+:func:`warm_up` does all of that up front. When ``settings.WARMUP`` is on,
+``wsgi/playdoh.wsgi`` calls :func:`ensure_warm` while it is imported, before
+the server takes any traffic. This runs in the importing thread: a
+background thread started before a preforking server forks its workers
+could be holding a lock (the import lock, a logging handler's) that the
+workers then inherit locked. With preloading, workers are forked warm;
+without it, each worker warms up when it imports the WSGI file.
+
+``/__ready__`` answers 503 from a process that has not warmed up, e.g.
+one started some other way than through the WSGI file.
+"""
+
+import threading
+import time
+
+from django import db
+from django.conf import settings
+from django.core.urlresolvers import (get_resolver, NoReverseMatch,
+                                      RegexURLResolver, reverse)
+from django.utils import translation
+
+import commonware
+
+from project.base import startup
+from project.base.templatecache import template_names
+
+
+log = commonware.log.getLogger('playdoh')
+
+_ready = threading.Event()
+_warm_lock = threading.Lock()
+
+
+def is_ready():
+    """True once warm-up has run, or straight away when it is off."""
+    return _ready.isSet() or not getattr(settings, 'WARMUP', False)
+
+
+def ensure_warm():
+    """Run :func:`warm_up` in this process unless it has already run here,
+    or in the parent this process was forked from."""
+    with _warm_lock:
+        if _ready.isSet():
+            return
+        try:
+            warm_up()
+        except Exception:
+            # A worker that could not warm up can still serve, just slowly.
+            log.exception('Warm-up failed')
+            _ready.set()
+
+
+def _patterns(resolver):
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, RegexURLResolver):
+            for sub in _patterns(pattern):
+                yield sub
+        else:
+            yield pattern
+
+
+def warm_urls():
+    """Import every view and reverse every named URL that takes no
+    arguments; returns the number of patterns seen."""
+    resolver = get_resolver(None)
+    resolver.reverse_dict  # Builds the reverse lookup tables.
+    count = 0
+    for pattern in _patterns(resolver):
+        count += 1
+        try:
+            pattern.callback
+        except Exception:
+            log.exception('Warm-up could not import the view for %s' %
+                          pattern.regex.pattern)
+        if pattern.name and not pattern.regex.groups:
+            try:
+                reverse(pattern.name)
+            except NoReverseMatch:
+                pass
+    return count
+
+
+def languages():
+    return [lang if isinstance(lang, basestring) else lang[0]
+            for lang in settings.LANGUAGES]
+
+
+def warm_locales():
+    """Load the gettext catalogs of every configured locale."""
+    langs = languages()
+    for lang in langs:
+        translation.activate(lang)
+        translation.ugettext('')
+    translation.deactivate()
+    return len(langs)
+
+
+def warm_templates():
+    """Load (and compile, or read from the bytecode cache) every template."""
+    import jingo
+    count = 0
+    for name in template_names():
+        try:
+            jingo.env.get_template(name)
+            count += 1
+        except Exception:
+            log.exception('Warm-up could not load template %s' % name)
+    return count
+
+
+def warm_up():
+    """Run every warm-up step and mark this process ready."""
+    start = time.time()
+    counts = {}
+    for name, step in (('urls', warm_urls), ('locales', warm_locales),
+                       ('templates', warm_templates)):
+        with startup.phase('warm-up: %s' % name):
+            counts[name] = step()
+    # Don't carry a connection into forked workers.
+    db.close_connection()
+    _ready.set()
+    log.info('Warmed up %(urls)d URLs, %(locales)d locales and '
+             '%(templates)d templates' % counts +
+             ' in %.2fs' % (time.time() - start))
+    return counts
@@ -0,0 +1,100 @@
+import resource
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from project.base import export, socorro
+from project.base.fakemiddleware import FakeMiddleware, report_list
+from project.examples.views import EXPORT_FIELDS
+
+
+def rss_kb():
+    """Current resident set size, from /proc where there is one."""
+    try:
+        f = open('/proc/self/statm')
+    except IOError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        pages = int(f.read().split()[1])
+    finally:
+        f.close()
+    return pages * resource.getpagesize() / 1024
+
+
+class Command(BaseCommand):
+    help = ('Stream a large synthetic report list through the CSV and JSON '
+            'exporters and check that memory use stays flat.')
+    option_list = BaseCommand.option_list + (
+        make_option('--rows', type='int', default=1000000,
+                    help='Rows to export.'),
+        make_option('--per-page', type='int', default=1000,
+                    help='Rows per middleware page.'),
+        make_option('--prefetch', type='int', default=2,
+                    help='Pages to fetch ahead.'),
+        make_option('--http', action='store_true', default=False,
+                    help='Fetch pages over HTTP from a fake middleware '
+                         'instead of calling it in process.'),
+        make_option('--max-growth', type='int', default=16,
+                    help='Megabytes RSS may grow by during the export '
+                         'before the run fails.'),
+    )
+
+    def handle(self, **options):
+        fake = None
+        if options['http']:
+            fake = FakeMiddleware()
+            fake.start()
+            client = socorro.SocorroMiddleware(base_url=fake.url)
+            fetch = lambda p: client.fetch('/report/list/', p, ttl=0)
+        else:
+            fetch = lambda p: report_list([], p)
+
+        failed = []
+        try:
+            for format in ('csv', 'json'):
+                growth = self.run(format, fetch, options)
+                if growth > options['max_growth'] * 1024:
+                    failed.append('%s grew by %d KB' % (format, growth))
+        finally:
+            if fake is not None:
+                fake.shutdown()
+        if failed:
+            raise CommandError('Memory use was not flat: %s' %
+                               ', '.join(failed))
+
+    def run(self, format, fetch, options):
+        before = rss_kb()
+        params = {'total': options['rows']}
+        pages = export.prefetched(
+            export.report_pages(fetch, params, options['per_page']),
+            options['prefetch'])
+        rows = export.chain_pages(pages)
+        if format == 'csv':
+            stream = export.csv_stream(rows, EXPORT_FIELDS)
+        else:
+            stream = export.json_stream(rows, EXPORT_FIELDS)
+
+        start = time.time()
+        written = 0
+        baseline = peak = None
+        for i, chunk in enumerate(stream):
+            written += len(chunk)
+            if i == 10:
+                # Buffers and the first pages are allocated by now.
+                baseline = peak = rss_kb()
+            elif baseline is not None and not i % 50:
+                peak = max(peak, rss_kb())
+        stream.close()
+        if baseline is None:
+            baseline = peak = rss_kb()
+        elapsed = time.time() - start
+        self.stdout.write(
+            '%-4s %d rows, %.1f MB in %.1fs (%.0f rows/s); RSS %d KB before, '
+            '%d KB after the first chunks, peak %d KB (+%d KB)\n' %
+            (format, options['rows'], written / 1048576.0, elapsed,
+             options['rows'] / elapsed if elapsed else 0, before, baseline,
+             peak, peak - before))
+        # Measured from before the export, so that rows gathered up front
+        # count too.
+        return peak - before
@@ -0,0 +1,315 @@
+import cookielib
+import json
+import math
+import re
+import threading
+import time
+import urllib
+import urllib2
+from urlparse import urlparse
+from optparse import make_option
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import make_server, WSGIRequestHandler, WSGIServer
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+from django.test.client import Client
+
+from project.base import socorro
+from project.base.fakemiddleware import FakeMiddleware
+from project.examples.management.commands.bench_export import rss_kb
+
+
+BENIGN = u'Firefox crashed <em>again</em> while loading <strong>gmail</strong>'
+MALICIOUS = (u'<script>alert(document.cookie)</script>'
+             u'<img src=x onerror=alert(1)><a href="javascript:evil()">x</a>')
+
+# name, method, URL name, mobile, POST data
+SCENARIOS = (
+    ('home', 'GET', 'examples.home', False, None),
+    ('home-mobile', 'GET', 'examples.home', True, None),
+    ('bleach', 'GET', 'examples.bleach', False, None),
+    ('bleach-post-benign', 'POST', 'examples.bleach', False,
+     {'bleachme': BENIGN}),
+    ('bleach-post-malicious', 'POST', 'examples.bleach', False,
+     {'bleachme': MALICIOUS}),
+)
+
+MOBILE_COOKIE = getattr(settings, 'MOBILE_COOKIE', 'mobile')
+CSRF_RE = re.compile(r'name=["\']csrfmiddlewaretoken["\'] '
+                     r'value=["\']([^"\']+)')
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    index = int(math.ceil(fraction * len(ordered))) - 1
+    return ordered[min(max(index, 0), len(ordered) - 1)]
+
+
+def run_load(make_request, count, concurrency, sample_interval=0.05):
+    """Call ``make_request()`` (one per thread) ``count`` times from
+    ``concurrency`` threads; returns ``(latencies, errors, seconds,
+    peak_rss_kb)``.
+
+    ``ru_maxrss`` only ever grows over the life of the process, so the
+    peak is the highest current RSS sampled while this load ran.
+    """
+    latencies = []
+    errors = [0]
+    remaining = [count]
+    lock = threading.Lock()
+
+    def work(request):
+        while True:
+            with lock:
+                if not remaining[0]:
+                    return
+                remaining[0] -= 1
+            start = time.time()
+            try:
+                ok = request()
+            except Exception:
+                ok = False
+            elapsed = time.time() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    # Per-thread setup (clients, CSRF tokens) is not part of the timing.
+    requests = [make_request() for i in range(concurrency)]
+    threads = [threading.Thread(target=work, args=(r,)) for r in requests]
+    peak = [rss_kb()]
+    done = threading.Event()
+
+    def sample():
+        while not done.isSet():
+            peak[0] = max(peak[0], rss_kb())
+            done.wait(sample_interval)
+
+    sampler = threading.Thread(target=sample)
+    sampler.daemon = True
+    sampler.start()
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.time() - start
+    done.set()
+    sampler.join()
+    return latencies, errors[0], seconds, max(peak[0], rss_kb())
+
+
+def summarize(latencies, errors, seconds, peak_rss_kb):
+    ordered = sorted(latencies)
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'p50_ms': ms(percentile(ordered, 0.50)),
+        'p95_ms': ms(percentile(ordered, 0.95)),
+        'p99_ms': ms(percentile(ordered, 0.99)),
+        'mean_ms': ms(sum(ordered) / len(ordered)) if ordered else None,
+        'throughput_rps': round(len(ordered) / seconds, 1) if seconds else 0,
+        'peak_rss_kb': peak_rss_kb,
+    }
+
+
+class BenchClient(Client):
+    """A test client without the template and exception signal receivers
+    that ``Client.request`` connects under fixed ``dispatch_uid``s. Clients
+    in different threads would replace and disconnect each other's, and
+    collect each other's templates and exceptions."""
+
+    def request(self, **request):
+        response = self.handler(self._base_environ(**request))
+        if response.cookies:
+            self.cookies.update(response.cookies)
+        return response
+
+
+def client_request(path, method, mobile, data):
+    def make_request():
+        client = BenchClient()
+        if mobile:
+            client.cookies[MOBILE_COOKIE] = 'on'
+        if method == 'POST':
+            return lambda: client.post(path, data).status_code == 200
+        return lambda: client.get(path).status_code == 200
+    return make_request
+
+
+def wsgi_request(base_url, path, method, mobile, data):
+    url = base_url + path
+
+    def make_request():
+        jar = cookielib.CookieJar()
+        opener = urllib2.build_opener(urllib2.HTTPCookieProcessor(jar))
+        if mobile:
+            jar.set_cookie(cookielib.Cookie(
+                0, MOBILE_COOKIE, 'on', None, False, urlparse(url).hostname,
+                False, False, '/', True, False, None, False, None, None, {}))
+        body = None
+        if method == 'POST':
+            # Pick up an anonymous CSRF token like a browser would.
+            match = CSRF_RE.search(opener.open(url).read())
+            form = dict(data, csrfmiddlewaretoken=match.group(1)
+                        if match else '')
+            body = urllib.urlencode(dict((k, v.encode('utf-8'))
+                                         for k, v in form.items()))
+
+        def request():
+            response = opener.open(url, body)
+            response.read()
+            return response.getcode() == 200
+        return request
+    return make_request
+
+
+class ThreadedWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+def regressions(results, baseline, threshold):
+    """Scenarios whose p95 latency rose, or throughput fell, by more than
+    ``threshold`` (a fraction) against ``baseline``."""
+    found = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if not base or not base.get('p95_ms') or not result.get('p95_ms'):
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            found.append('%s: p95 %.1fms -> %.1fms' %
+                         (name, base['p95_ms'], result['p95_ms']))
+        if (base['throughput_rps'] and result['throughput_rps'] <
+                base['throughput_rps'] / (1 + threshold)):
+            found.append('%s: throughput %.1f -> %.1f req/s' %
+                         (name, base['throughput_rps'],
+                          result['throughput_rps']))
+    return found
+
+
+class Command(BaseCommand):
+    help = ('Load the example views through the test client and a local '
+            'WSGI server and record latency percentiles, throughput and '
+            'the peak RSS of each scenario as JSON.')
+    option_list = BaseCommand.option_list + (
+        make_option('-n', '--requests', type='int', default=200,
+                    help='Requests per scenario.'),
+        make_option('-c', '--concurrency', type='int', default=4,
+                    help='Concurrent clients.'),
+        make_option('--mode', choices=('client', 'wsgi', 'both'),
+                    default='both',
+                    help='Drive the views through the Django test client, '
+                         'a local WSGI server, or both.'),
+        make_option('--upstream', default=None,
+                    help='Socorro middleware URL. Defaults to a fake '
+                         'middleware started for the run.'),
+        make_option('--output', default='bench-results.json',
+                    help='Where to write the results.'),
+        make_option('--compare', default=None,
+                    help='Earlier results to check for regressions.'),
+        make_option('--threshold', type='float', default=0.2,
+                    help='Fraction by which p95 or throughput may worsen '
+                         'before --compare reports a regression.'),
+        make_option('--strict', action='store_true', default=False,
+                    help='Fail, rather than warn, when --compare finds '
+                         'regressions.'),
+    )
+
+    def handle(self, **options):
+        fake = None
+        upstream = options['upstream']
+        if not upstream:
+            fake = FakeMiddleware()
+            fake.start()
+            upstream = fake.url
+        socorro._client = socorro.SocorroMiddleware(base_url=upstream)
+
+        modes = (('client', 'wsgi') if options['mode'] == 'both'
+                 else (options['mode'],))
+        server = None
+        if 'wsgi' in modes:
+            server = make_server('127.0.0.1', 0, WSGIHandler(),
+                                 ThreadedWSGIServer, QuietHandler)
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+            base_url = 'http://%s:%s' % server.server_address
+
+        results = {}
+        try:
+            for mode in modes:
+                for name, method, url_name, mobile, data in SCENARIOS:
+                    path = '/%s%s' % (settings.LANGUAGE_CODE,
+                                      reverse(url_name))
+                    if mode == 'client':
+                        make_request = client_request(path, method, mobile,
+                                                      data)
+                    else:
+                        make_request = wsgi_request(base_url, path, method,
+                                                    mobile, data)
+                    key = '%s:%s' % (mode, name)
+                    results[key] = summarize(*run_load(
+                        make_request, options['requests'],
+                        options['concurrency']))
+                    r = results[key]
+                    self.stdout.write(
+                        '%-30s p50 %7.1fms  p95 %7.1fms  p99 %7.1fms  '
+                        '%7.1f req/s  %d errors  %d KB RSS\n' %
+                        (key, r['p50_ms'], r['p95_ms'], r['p99_ms'],
+                         r['throughput_rps'], r['errors'], r['peak_rss_kb']))
+        finally:
+            if server is not None:
+                server.shutdown()
+            if fake is not None:
+                fake.shutdown()
+
+        found = []
+        if options['compare']:
+            f = open(options['compare'])
+            try:
+                baseline = json.load(f)['results']
+            finally:
+                f.close()
+            found = regressions(results, baseline, options['threshold'])
+
+        output = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'results': results,
+            'regressions': found,
+        }
+        f = open(options['output'], 'w')
+        try:
+            json.dump(output, f, indent=2, sort_keys=True)
+        finally:
+            f.close()
+        self.stdout.write('Wrote %s\n' % options['output'])
+
+        failed = [key for key, r in results.items() if r['errors']]
+        if failed:
+            raise CommandError('Requests failed in %s' %
+                               ', '.join(sorted(failed)))
+        if found:
+            # Timings on shared build machines are noisy, so by default a
+            # regression is reported for someone to look at, not fatal.
+            message = 'Performance regressions:\n  ' + '\n  '.join(found)
+            if options['strict']:
+                raise CommandError(message)
+            self.stderr.write('WARNING: %s\n' % message)
+        elif options['compare']:
+            self.stdout.write('No regressions against %s.\n' %
+                              options['compare'])
@@ -0,0 +1,41 @@
+"""Example precomputed report. Feel free to delete this app."""
+
+import datetime
+
+from django.conf import settings
+
+from project.base import reports
+from project.base.export import report_pages
+from project.base.socorro import get_client
+from project.topcrashers.engine import Aggregator
+
+
+@reports.register('examples.crash_summary', refresh=5 * 60,
+                  schedule=[{'product': 'Firefox'}])
+def crash_summary(product):
+    """Top signatures per version over every report the middleware lists
+    for ``product``; too slow to do while the user waits."""
+    client = get_client()
+    fetch = lambda p: client.fetch('/report/list/', p, ttl=0)
+    engine = Aggregator()
+    days = set()
+    for hits in report_pages(fetch, {'product': product},
+                             settings.EXPORT_PAGE_SIZE):
+        by_day = {}
+        for hit in hits:
+            day = datetime.datetime.strptime(hit['date_processed'][:10],
+                                             '%Y-%m-%d').date()
+            by_day.setdefault(day, []).append(hit)
+        for day, batch in by_day.items():
+            days.add(day)
+            engine.add(day, [h['signature'] for h in batch],
+                       [h['product'] for h in batch],
+                       [h['version'] for h in batch],
+                       [h['os_name'] for h in batch])
+    if not days:
+        return {'product': product, 'versions': {}}
+    versions = dict((version, engine.top(p, version, min(days), max(days),
+                                         limit=20))
+                    for p, version in engine.groups.values if p == product)
+    return {'product': product, 'start': min(days).isoformat(),
+            'end': max(days).isoformat(), 'versions': versions}
@@ -0,0 +1,49 @@
+from cStringIO import StringIO
+
+from django.utils import unittest
+
+from nose.tools import eq_
+
+from project.base import export
+from project.base.fakemiddleware import report_list
+from project.examples.management.commands.bench_export import Command
+
+
+def fetch_without_total(params):
+    result = report_list([], dict(params, total=250))
+    del result['total']
+    return result
+
+
+class ReportPagesTests(unittest.TestCase):
+
+    def test_stops_at_total(self):
+        fetched = []
+
+        def fetch(params):
+            fetched.append(params['page'])
+            return report_list([], params)
+
+        pages = list(export.report_pages(fetch, {'total': 200}, 100))
+        eq_([len(p) for p in pages], [100, 100])
+        eq_(fetched, [1, 2])
+
+    def test_pages_until_short_page_without_total(self):
+        pages = list(export.report_pages(fetch_without_total, {}, 100))
+        eq_([len(p) for p in pages], [100, 100, 50])
+
+
+class ExportMemoryTests(unittest.TestCase):
+    rows = 1000000
+    max_growth_kb = 16 * 1024
+
+    def test_memory_stays_flat_over_a_million_rows(self):
+        command = Command()
+        command.stdout = StringIO()
+        options = {'rows': self.rows, 'per_page': 1000, 'prefetch': 2}
+        for format in ('csv', 'json'):
+            growth = command.run(format, lambda p: report_list([], p),
+                                 options)
+            assert growth <= self.max_growth_kb, (
+                '%s export of %d rows grew RSS by %d KB' %
+                (format, self.rows, growth))
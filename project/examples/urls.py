@@ -1,9 +1,14 @@
+from django.conf import settings
 from django.conf.urls.defaults import *
 
-from . import views
 
-
-urlpatterns = patterns('',
-    url(r'^$', views.home, name='examples.home'),
-    url(r'^bleach/?$', views.bleach_test, name='examples.bleach'),
+# Views are referenced by name so the module is only imported once a URL
+# is resolved, not by everything that loads the URLconf.
+urlpatterns = patterns('%s.examples.views' % settings.PROJECT_MODULE,
+    url(r'^$', 'home', name='examples.home'),
+    url(r'^bleach/?$', 'bleach_test', name='examples.bleach'),
+    url(r'^bleach/batch/?$', 'bleach_batch', name='examples.bleach_batch'),
+    url(r'^reports/export\.(?P<format>csv|json)$', 'export_reports',
+        name='examples.export_reports'),
+    url(r'^reports/summary$', 'crash_summary', name='examples.crash_summary'),
 )
@@ -1,45 +1,181 @@
 """Example views. Feel free to delete this app."""
 
+import json
 import logging
 
 from django import http
+from django.conf import settings
 from django.shortcuts import render
+from django.views.decorators.http import require_POST
 
-import bleach
 import commonware
-from funfactory.log import log_cef
 from mobility.decorators import mobile_template
 from session_csrf import anonymous_csrf
 
+from project.base import export, reports
+from project.base.fanout import Fanout
+from project.base.log import log_cef
+from project.base.pagecache import page_cache
+from project.base.sanitize import cleaner
+from project.base.socorro import get_client, MiddlewareError
+
 
 log = commonware.log.getLogger('playdoh')
 
+EXPORT_FIELDS = ('uuid', 'signature', 'date_processed', 'product', 'version',
+                 'os_name')
+
 
+@page_cache()
 @mobile_template('examples/{mobile/}home.html')
 def home(request, template=None):
     """Main example view."""
-    data = {}  # You'd add data here that you're sending to the template.
+    client = get_client()
+    product = request.GET.get('product', 'Firefox')
+
+    # Independent middleware queries run concurrently; a failing one leaves
+    # its entry as None rather than breaking the page.
+    calls = Fanout(request)
+    calls.add('versions', client.fetch, '/products/versions/')
+    calls.add('topcrashers', client.fetch, '/topcrash/sigs/',
+              {'product': product})
+    calls.add('daily', client.fetch, '/crashes/daily/', {'product': product})
+    calls.add('builds', client.fetch, '/products/builds/',
+              {'product': product})
+    results = calls.run()
+
+    data = {'product': product}
+    for name in ('versions', 'topcrashers', 'daily', 'builds'):
+        data[name] = results.get(name)
     log.debug("I'm alive!")
-    return render(request, template, data)
+    response = render(request, template, data)
+    if results.errors:
+        # Don't keep serving a page with holes in it from the cache.
+        response._page_cache = False
+    return response
 
 
 @anonymous_csrf
 def bleach_test(request):
     """A view outlining bleach's HTML sanitization."""
-    allowed_tags = ('strong', 'em')
-
     data = {}
 
     if request.method == 'POST':
         bleachme = request.POST.get('bleachme', None)
         data['bleachme'] = bleachme
         if bleachme:
-            data['bleached'] = bleach.clean(bleachme, tags=allowed_tags)
+            data['bleached'] = cleaner.clean(bleachme)
 
         # CEF logging: Log user input that needed to be "bleached".
-        if data['bleached'] != bleachme:
+        if data.get('bleached', bleachme) != bleachme:
             log_cef('Bleach Alert', logging.INFO, request,
                     username='anonymous', signature='BLEACHED',
                     msg='User data needed to be bleached: %s' % bleachme)
 
     return render(request, 'examples/bleach.html', data)
+
+
+@anonymous_csrf
+@require_POST
+def bleach_batch(request):
+    """Sanitize many fragments in one request.
+
+    Takes either repeated ``bleachme`` form fields or a JSON body of the form
+    ``{"fragments": [...]}`` and returns the cleaned fragments, in order, as
+    JSON along with the indexes of the ones that had to be altered. At most
+    ``settings.BLEACH_BATCH_SIZE`` fragments are taken at a time.
+    """
+    if request.META.get('CONTENT_TYPE', '').startswith('application/json'):
+        try:
+            fragments = json.loads(request.raw_post_data)['fragments']
+        except (ValueError, KeyError, TypeError):
+            return http.HttpResponseBadRequest('Expected {"fragments": []}')
+        if not isinstance(fragments, list):
+            return http.HttpResponseBadRequest('fragments must be a list')
+        if not all(isinstance(f, basestring) for f in fragments):
+            return http.HttpResponseBadRequest('fragments must be strings')
+    else:
+        fragments = request.POST.getlist('bleachme')
+
+    if len(fragments) > settings.BLEACH_BATCH_SIZE:
+        return http.HttpResponseBadRequest(
+            'At most %d fragments at a time' % settings.BLEACH_BATCH_SIZE)
+
+    bleached = cleaner.clean_many(fragments)
+    altered = [i for i, (before, after) in enumerate(zip(fragments, bleached))
+               if before != after]
+
+    if altered:
+        log_cef('Bleach Alert', logging.INFO, request,
+                username='anonymous', signature='BLEACHED',
+                msg='%d of %d fragments needed to be bleached' %
+                    (len(altered), len(fragments)))
+
+    return http.HttpResponse(json.dumps({'bleached': bleached,
+                                         'altered': altered}),
+                             content_type='application/json')
+
+
+def export_reports(request, format):
+    """Stream the crash reports matching the query string as CSV or JSON.
+
+    Pages are fetched from the middleware while earlier rows are being
+    sent, so memory use does not grow with the size of the export.
+    """
+    client = get_client()
+    params = dict((k, v) for k, v in request.GET.items()
+                  if k not in ('page', 'per_page'))
+    per_page = settings.EXPORT_PAGE_SIZE
+
+    # Exports are too big to cache and would only push everything else out.
+    fetch = lambda p: client.fetch('/report/list/', p, ttl=0)
+    # Fetch the first page before committing to a 200.
+    try:
+        first = fetch(dict(params, page=1, per_page=per_page))
+    except MiddlewareError, exc:
+        log.error('Export failed: %s' % exc)
+        return http.HttpResponse('Could not fetch reports.', status=502,
+                                 content_type='text/plain')
+
+    pages = export.prefetched(
+        export.report_pages(fetch, params, per_page, first),
+        settings.EXPORT_PREFETCH)
+    rows = export.chain_pages(pages)
+    if format == 'csv':
+        stream = export.csv_stream(rows, EXPORT_FIELDS)
+        content_type = 'text/csv; charset=utf-8'
+    else:
+        stream = export.json_stream(rows, EXPORT_FIELDS)
+        content_type = 'application/json'
+    response = http.HttpResponse(stream, content_type=content_type)
+    response['Content-Disposition'] = ('attachment; filename=reports.%s' %
+                                       format)
+    # Pass chunks on as they come rather than buffering the whole export.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def crash_summary(request):
+    """A precomputed report: served from the latest build, which is
+    refreshed in the background when it gets old."""
+    product = request.GET.get('product', 'Firefox')
+    # Only known products, so that nobody can queue builds of arbitrary
+    # reports.
+    try:
+        products = get_client().fetch('/products/versions/')['products']
+    except MiddlewareError, exc:
+        log.error('Could not fetch products: %s' % exc)
+        return http.HttpResponse('Could not fetch products.', status=502,
+                                 content_type='text/plain')
+    if product not in products:
+        return http.HttpResponseBadRequest('Unknown product')
+
+    try:
+        data = reports.get('examples.crash_summary', product=product)
+    except reports.NotReady:
+        response = http.HttpResponse('The report is being built.',
+                                     status=202, content_type='text/plain')
+        response['Retry-After'] = '30'
+        return response
+    return http.HttpResponse(json.dumps(data),
+                             content_type='application/json')
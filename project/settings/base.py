@@ -1,6 +1,8 @@
 # This is your project's main settings file that can be committed to your
 # repo. If you need to override a setting locally, use settings_local.py
 
+import logging.handlers
+
 from funfactory.settings_base import *
 
 # Name of the top-level module where you put all your apps.
@@ -29,6 +31,10 @@ MINIFY_BUNDLES = {
     }
 }
 
+# Where ./manage.py bundle_assets records the content-hashed file and input
+# fingerprint of each bundle.
+BUNDLE_MANIFEST = path('bundles.json')
+
 # Defines the views served for root URLs.
 ROOT_URLCONF = '%s.urls' % PROJECT_MODULE
 
@@ -37,9 +43,97 @@ INSTALLED_APPS = list(INSTALLED_APPS) + [
     '%s.base' % PROJECT_MODULE,
     # Example code. Can (and should) be removed for actual projects.
     '%s.examples' % PROJECT_MODULE,
+    # Crash signature aggregation for top-crasher tables.
+    '%s.topcrashers' % PROJECT_MODULE,
 ]
 
 
+_jinja_config = JINJA_CONFIG
+
+
+def JINJA_CONFIG():
+    from django.utils.importlib import import_module
+    templatecache = import_module('%s.base.templatecache' % PROJECT_MODULE)
+
+    config = _jinja_config()
+    config['extensions'] = list(config['extensions']) + [
+        # {% cache %} for caching rendered template fragments.
+        '%s.base.fragmentcache.FragmentCacheExtension' % PROJECT_MODULE,
+    ]
+    config['bytecode_cache'] = templatecache.bytecode_cache()
+    return config
+
+# Test databases are built from migrations/ once and then restored from a
+# snapshot kept here; see project/base/testrunner.py. The runner extends
+# funfactory's, which stays in TEST_BASE_RUNNER.
+TEST_BASE_RUNNER = TEST_RUNNER
+TEST_RUNNER = '%s.base.testrunner.SnapshotTestSuiteRunner' % PROJECT_MODULE
+TEST_DB_SNAPSHOT_DIR = path('.test-db')
+
+# Seconds media files that are not content-hashed, or requested without the
+# deployed revision as query string (which the media() helper adds), may be
+# cached for.
+MEDIA_MAX_AGE = 60 * 60
+
+# Leave sending media files to the front-end server: 'X-Sendfile' (Apache,
+# lighttpd) or 'X-Accel-Redirect' (nginx, which needs an internal location
+# for MEDIA_ACCEL_PREFIX that maps to MEDIA_ROOT).
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/_media/'
+
+# Compiled template bytecode, written by ./manage.py compile_templates at
+# deploy time and read by every worker instead of compiling on first use.
+JINJA_BYTECODE_DIR = path('jinja_bytecode')
+
+# Default seconds a {% cache %} fragment is kept in the Django cache.
+FRAGMENT_CACHE_TIMEOUT = 5 * 60
+
+# Recently used fragments also kept in each process, and for how long at most.
+FRAGMENT_CACHE_LOCAL_SIZE = 500
+FRAGMENT_CACHE_LOCAL_TTL = 30
+
+# A single in-process cache. With memcached, local settings can put the
+# tiered cache from project/base/cache.py in front of it instead; see
+# settings/local.py-dist.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Load every URL, view, locale and template when the WSGI application is
+# imported, instead of on each worker's first requests. /__ready__ answers
+# 503 from a process that has not done this.
+WARMUP = False
+
+SUPPORTED_NONLOCALES = list(SUPPORTED_NONLOCALES) + ['__ready__',
+                                                     '__metrics__']
+
+# Wall-clock, DB, template and upstream time per view, kept in histograms.
+MIDDLEWARE_CLASSES = (
+    '%s.base.metrics.LatencyMiddleware' % PROJECT_MODULE,
+) + tuple(MIDDLEWARE_CLASSES) + (
+    # Last, so that cached pages still go through the other middleware.
+    '%s.base.pagecache.PageCacheMiddleware' % PROJECT_MODULE,
+)
+
+# Views marked with @page_cache are served from the cache to anonymous users
+# for PAGE_CACHE_TIMEOUT seconds, then served stale for up to
+# PAGE_CACHE_STALE more while one background thread re-renders them.
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_TIMEOUT = 60
+PAGE_CACHE_STALE = 5 * 60
+PAGE_CACHE_REFRESH_TIMEOUT = 30
+
+# Each process writes its histograms to a file here every
+# METRICS_FLUSH_INTERVAL seconds; /__metrics__ serves their totals to
+# METRICS_ALLOWED_IPS. Files not written to for METRICS_MAX_AGE seconds
+# (from workers that have gone) are removed.
+METRICS_DIR = path('metrics')
+METRICS_FLUSH_INTERVAL = 10
+METRICS_MAX_AGE = 60 * 60
+METRICS_ALLOWED_IPS = ('127.0.0.1',)
+
 # Because Jinja2 is the default template loader, add any non-Jinja templated
 # apps here:
 JINGO_EXCLUDE_APPS = [
@@ -48,7 +142,8 @@ JINGO_EXCLUDE_APPS = [
 ]
 
 # Tells the extract script what files to look for L10n in and what function
-# handles the extraction. The Tower library expects this.
+# handles the extraction. The Tower library expects this, and so does
+# ./manage.py extract_strings, which only re-parses files that changed.
 DOMAIN_METHODS['messages'] = [
     ('%s/**.py' % PROJECT_MODULE,
         'tower.management.commands.extract.extract_tower_python'),
@@ -56,7 +151,7 @@ DOMAIN_METHODS['messages'] = [
         'tower.management.commands.extract.extract_tower_template'),
     ('templates/**.html',
         'tower.management.commands.extract.extract_tower_template'),
-],
+]
 
 # # Use this if you have localizable HTML files:
 # DOMAIN_METHODS['lhtml'] = [
@@ -71,4 +166,104 @@ DOMAIN_METHODS['messages'] = [
 #    ('media/js/**.js', 'javascript'),
 # ]
 
-LOGGING = dict(loggers=dict(playdoh = {'level': logging.DEBUG}))
+LOGGING = dict(
+    handlers={
+        # Formats records on the calling thread and writes them to syslog in
+        # batches from a background thread. Point a logger's 'handlers' at
+        # it to keep syslog I/O off the request path.
+        'buffered_syslog': {
+            '()': 'project.base.log.QueuedHandler',
+            'target': 'logging.handlers.SysLogHandler',
+            'target_options': {
+                'facility': logging.handlers.SysLogHandler.LOG_LOCAL7,
+            },
+            'formatter': 'prod',
+        },
+    },
+    loggers=dict(playdoh = {'level': logging.DEBUG}),
+)
+
+# project.base.log.log_cef queues CEF events and writes them from a
+# background thread. When the queue is full, 'drop_new' discards the event
+# being logged, 'drop_old' the oldest queued one, and 'block' waits up to
+# block_timeout seconds for room before dropping.
+CEF_QUEUE = {
+    'capacity': 1000,
+    'batch_size': 100,
+    'flush_interval': 1.0,
+    'policy': 'drop_new',
+}
+
+# Base URL of the Socorro middleware the crash-stats views read from. Run
+# ./manage.py run_fake_middleware to get canned data on this address.
+SOCORRO_MIDDLEWARE_URL = 'http://127.0.0.1:8883'
+
+# Idle keep-alive connections kept open to the middleware, per process.
+SOCORRO_POOL_SIZE = 10
+
+# Socket timeout, in seconds, for middleware requests. Calls made through
+# project.base.fanout use whatever is left of their deadline if that is
+# shorter.
+SOCORRO_TIMEOUT = 10
+
+# How long, in seconds, to cache middleware responses. Keys are the first
+# segment of the middleware path; anything else uses SOCORRO_CACHE_TTL.
+SOCORRO_CACHE_TTL = 60
+SOCORRO_CACHE_TTLS = {
+    'products': 60 * 60,
+    'topcrash': 5 * 60,
+    'crashes': 5 * 60,
+    'report': 60,
+}
+
+# Most fragments the bleach batch view will sanitize in one request.
+BLEACH_BATCH_SIZE = 100
+
+# Report list exports fetch EXPORT_PAGE_SIZE rows per middleware request and
+# stay up to EXPORT_PREFETCH pages ahead of what has been sent.
+EXPORT_PAGE_SIZE = 1000
+EXPORT_PREFETCH = 2
+
+# Worker threads, per process, for running a view's backend calls
+# concurrently (see project.base.fanout).
+FANOUT_POOL_SIZE = 8
+
+# Calls that may wait for a fan-out worker, per process. Beyond this, calls
+# fail at once rather than queue behind a slow middleware.
+FANOUT_QUEUE_SIZE = 32
+
+# Default seconds a view waits for each concurrent backend call.
+FANOUT_TIMEOUT = 10
+
+# Jobs run by ./manage.py cron_daemon, as name: seconds between runs. Names
+# are jobs registered with @cronjobs.register in an app's cron.py, or
+# 'manage:<command>' to run a management command.
+CRON_SCHEDULE = {
+    'manage:cleanup': 60 * 60,
+    'refresh_reports': 60,
+}
+
+# Start each run up to this fraction of its interval late, so jobs with the
+# same interval don't all fire at once.
+CRON_JITTER = 0.1
+
+# cron_daemon keeps per-job run counts and durations in this JSON file.
+CRON_STATUS_FILE = path('cron-status.json')
+
+# Seconds cron_daemon waits for running jobs when it is stopped; keep it
+# below stopwaitsecs in bin/crontab/supervisor.tpl.
+CRON_STOP_TIMEOUT = 50
+
+# Precomputed reports (see project/base/reports.py) are refreshed in the
+# background once older than REPORTS_REFRESH seconds, unless registered
+# with their own interval, and kept in the cache for REPORTS_KEEP seconds.
+# A refresh running longer than REPORTS_BUILD_TIMEOUT may be started again.
+# Refreshes run as Celery tasks; without celerybeat, the refresh_reports
+# cron job keeps scheduled reports fresh. With celerybeat, schedule
+# project.base.tasks.refresh_scheduled_reports instead. Builds reach the
+# web processes through the default cache, which must then be shared,
+# e.g. memcached; the local-memory cache above only works with
+# CELERY_ALWAYS_EAGER, and the cron job refuses to run with it.
+REPORTS_REFRESH = 5 * 60
+REPORTS_KEEP = 24 * 60 * 60
+REPORTS_BUILD_TIMEOUT = 10 * 60
@@ -0,0 +1 @@
+"""Top-crasher aggregation over crash report counts."""
@@ -0,0 +1,258 @@
+"""Array-backed crash counts for top-crasher tables.
+
+Signatures, product/version pairs and OS names are interned to small
+integer ids once, and each day's counts are kept as two NumPy arrays: a
+sorted array of packed ``(product/version, signature, OS)`` keys and the
+count for each key. Adding a batch of reports is one sort and a merge, and
+totalling a date window is a binary search per day and one grouped sum over
+the keys found, however many reports there are, instead of a Python object
+per report. Work and memory grow with the keys in the window, not with the
+number of signatures ever seen.
+
+::
+
+    engine = Aggregator()
+    engine.add(date(2012, 1, 1), signatures, products, versions, os_names)
+    rows = engine.top('Firefox', '10.0', date(2012, 1, 1), date(2012, 1, 7))
+
+``top()`` returns rows in the shape of the middleware's ``/topcrash/sigs/``
+results, with each signature's rank in the window of the same length just
+before, and how much it moved.
+"""
+
+import datetime
+from itertools import imap
+
+import numpy as np
+
+
+# Packed key layout: product/version id in the high bits, so that a day's
+# keys for one product and version are a contiguous run, then the signature
+# id, then the OS id.
+OS_BITS = 8
+SIGNATURE_BITS = 31
+GROUP_BITS = 24
+SIGNATURE_SHIFT = OS_BITS
+GROUP_SHIFT = OS_BITS + SIGNATURE_BITS
+SIGNATURE_MASK = (1 << SIGNATURE_BITS) - 1
+OS_MASK = (1 << OS_BITS) - 1
+
+# Columns for the OS names the crash-stats tables break counts down by.
+OS_COLUMNS = {
+    'Windows': 'win_count',
+    'Mac': 'mac_count',
+    'Linux': 'linux_count',
+}
+
+
+class Interner(object):
+    """Maps values to dense integer ids."""
+
+    def __init__(self, limit=None):
+        self.values = []
+        self._ids = {}
+        self.limit = limit
+
+    def __len__(self):
+        return len(self.values)
+
+    def _check(self, adding):
+        if self.limit is not None and len(self.values) + adding > self.limit:
+            raise OverflowError('More than %d distinct values' % self.limit)
+
+    def id(self, value):
+        found = self._ids.get(value)
+        if found is None:
+            self._check(1)
+            found = self._ids[value] = len(self.values)
+            self.values.append(value)
+        return found
+
+    def get(self, value):
+        return self._ids.get(value)
+
+    def ids(self, values):
+        """An int32 array of the ids of ``values``. Values new to a batch
+        get ids in sorted order. If they would take the interner over its
+        limit, none of them are added."""
+        new = sorted(set(values).difference(self._ids))
+        self._check(len(new))
+        for value in new:
+            self.id(value)
+        return np.fromiter(imap(self._ids.__getitem__, values), np.int32,
+                           len(values))
+
+
+def pack(signature_ids, group_ids, os_ids):
+    return ((np.asarray(group_ids, np.int64) << GROUP_SHIFT) |
+            (np.asarray(signature_ids, np.int64) << SIGNATURE_SHIFT) |
+            np.asarray(os_ids, np.int64))
+
+
+def unpack(keys):
+    return ((keys >> SIGNATURE_SHIFT) & SIGNATURE_MASK, keys >> GROUP_SHIFT,
+            keys & OS_MASK)
+
+
+def group_sum(keys, counts):
+    """Unique ``keys``, sorted, and the total of ``counts`` for each."""
+    if not len(keys):
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    order = np.argsort(keys)
+    keys = keys[order]
+    counts = counts[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], np.add.reduceat(counts, starts)
+
+
+class Day(object):
+    """The counts for one day, by packed key, sorted."""
+
+    __slots__ = ('keys', 'counts')
+
+    def __init__(self):
+        self.keys = np.empty(0, np.int64)
+        self.counts = np.empty(0, np.int64)
+
+    def add(self, keys, counts):
+        """Merge sorted, unique ``keys`` and their ``counts`` in."""
+        at = np.searchsorted(self.keys, keys)
+        found = at < len(self.keys)
+        found[found] = self.keys[at[found]] == keys[found]
+        # Keys are unique, so no position is incremented twice.
+        self.counts[at[found]] += counts[found]
+        new = ~found
+        if new.any():
+            self.keys = np.insert(self.keys, at[new], keys[new])
+            self.counts = np.insert(self.counts, at[new], counts[new])
+
+    def group(self, group):
+        """The keys and counts for one product/version id."""
+        lo, hi = np.searchsorted(self.keys, [group << GROUP_SHIFT,
+                                             (group + 1) << GROUP_SHIFT])
+        return self.keys[lo:hi], self.counts[lo:hi]
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.counts.nbytes
+
+
+class Aggregator(object):
+    """Crash counts per signature, product, version and OS, by day."""
+
+    def __init__(self):
+        self.signatures = Interner(limit=1 << SIGNATURE_BITS)
+        self.groups = Interner(limit=1 << GROUP_BITS)
+        self.os_names = Interner(limit=1 << OS_BITS)
+        self.days = {}
+
+    def group_ids(self, products, versions):
+        return self.groups.ids(zip(products, versions))
+
+    def add(self, day, signatures, products, versions, os_names):
+        """Count a batch of reports, given as parallel sequences, against
+        ``day``."""
+        self.add_ids(day, self.signatures.ids(signatures),
+                     self.group_ids(products, versions),
+                     self.os_names.ids(os_names))
+
+    def add_ids(self, day, signature_ids, group_ids, os_ids, counts=None):
+        """Like :meth:`add` with values that are already interned; each
+        report counts once unless ``counts`` says otherwise."""
+        keys = pack(signature_ids, group_ids, os_ids)
+        if counts is None:
+            counts = np.ones(len(keys), np.int64)
+        if day not in self.days:
+            self.days[day] = Day()
+        self.days[day].add(*group_sum(keys, np.asarray(counts, np.int64)))
+
+    def forget(self, before):
+        """Drop the counts for days before ``before``."""
+        for day in [d for d in self.days if d < before]:
+            del self.days[day]
+
+    @property
+    def nbytes(self):
+        return sum(d.nbytes for d in self.days.values())
+
+    def window(self, group, start, end, by_os=True):
+        """Signature ids in id order, their totals and, with ``by_os``, a
+        counts matrix with a column per OS id, for a product/version id
+        over ``start`` to ``end`` inclusive."""
+        width = max(len(self.os_names), 1)
+        keys = [np.empty(0, np.int64)]
+        counts = [np.empty(0, np.int64)]
+        for day, data in self.days.items():
+            if start <= day <= end:
+                day_keys, day_counts = data.group(group)
+                keys.append(day_keys)
+                counts.append(day_counts)
+        # One key per (signature, OS), sorted by signature then OS.
+        keys, counts = group_sum(np.concatenate(keys), np.concatenate(counts))
+        if not len(keys):
+            return keys, counts, np.zeros((0, width), np.int64)
+        signature_ids, groups, os_ids = unpack(keys)
+        starts = np.flatnonzero(np.r_[True, signature_ids[1:] !=
+                                      signature_ids[:-1]])
+        total = np.add.reduceat(counts, starts)
+        matrix = None
+        if by_os:
+            rows = np.repeat(np.arange(len(starts)),
+                             np.diff(np.r_[starts, len(keys)]))
+            matrix = np.zeros((len(starts), width), np.int64)
+            matrix[rows, os_ids] = counts
+        return signature_ids[starts], total, matrix
+
+    def totals(self, group, start, end):
+        """Like :meth:`window`, but in rank order."""
+        signature_ids, total, by_os = self.window(group, start, end)
+        # Highest count first; the sort is stable, so ties go to the lower
+        # signature id.
+        order = np.argsort(-total, kind='mergesort')
+        return signature_ids[order], total[order], by_os[order]
+
+    def ranks(self, group, start, end, signature_ids):
+        """An array of the rank of each of ``signature_ids`` in the
+        window, 0 for those with no crashes in it."""
+        ranked, total, _ = self.window(group, start, end, by_os=False)
+        signature_ids = np.asarray(signature_ids, np.int64)
+        if not len(ranked):
+            return np.zeros(len(signature_ids), np.int64)
+        ranks = np.empty(len(ranked), np.int64)
+        ranks[np.argsort(-total, kind='mergesort')] = np.arange(
+            1, len(ranked) + 1)
+        at = np.minimum(np.searchsorted(ranked, signature_ids),
+                        len(ranked) - 1)
+        return np.where(ranked[at] == signature_ids, ranks[at], 0)
+
+    def top(self, product, version, start, end, limit=100):
+        """The top ``limit`` signatures for ``product`` and ``version``
+        from ``start`` to ``end``, inclusive."""
+        group = self.groups.get((product, version))
+        if group is None:
+            return []
+        signature_ids, total, by_os = self.totals(group, start, end)
+        grand_total = float(total.sum()) or 1.0
+
+        length = end - start
+        previous_end = start - datetime.timedelta(days=1)
+        previous = self.ranks(group, previous_end - length, previous_end,
+                              signature_ids[:limit]).tolist()
+
+        columns = [(OS_COLUMNS.get(name), index)
+                   for index, name in enumerate(self.os_names.values)]
+        rows = []
+        for rank, (sid, count) in enumerate(zip(signature_ids[:limit].tolist(),
+                                                total[:limit].tolist()), 1):
+            was = previous[rank - 1] or None
+            row = {'signature': self.signatures.values[sid],
+                   'count': count,
+                   'percent': count / grand_total,
+                   'rank': rank,
+                   'previous_rank': was,
+                   'rank_delta': was - rank if was else None}
+            for column, index in columns:
+                if column:
+                    row[column] = int(by_os[rank - 1, index])
+            rows.append(row)
+        return rows
@@ -0,0 +1,147 @@
+import datetime
+import time
+from collections import defaultdict
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+import numpy as np
+
+from project.base.fakemiddleware import PRODUCTS
+from project.topcrashers.engine import Aggregator
+
+
+OS_NAMES = ('Windows', 'Mac', 'Linux')
+OS_WEIGHTS = (0.8, 0.15, 0.05)
+
+
+def synthetic_batch(rand, size, signatures, groups):
+    """Interned ids for ``size`` reports; signatures are Zipf distributed
+    like real crash volumes."""
+    signature_ids = (rand.zipf(1.2, size) - 1) % signatures
+    group_ids = rand.randint(0, groups, size)
+    os_ids = np.searchsorted(np.cumsum(OS_WEIGHTS),
+                             rand.random_sample(size))
+    return signature_ids, group_ids, os_ids
+
+
+def dict_top(counts, group, start, end, limit):
+    """Top signatures the way it is done without the engine: a dict of
+    Python tuples."""
+    totals = defaultdict(int)
+    for (day, signature, g, os_name), count in counts.iteritems():
+        if g == group and start <= day <= end:
+            totals[signature] += count
+    return sorted(totals.items(), key=lambda item: -item[1])[:limit]
+
+
+class Command(BaseCommand):
+    help = ('Aggregate tens of millions of synthetic crash reports into '
+            'top-crasher tables and compare with counting in dicts.')
+    option_list = BaseCommand.option_list + (
+        make_option('--reports', type='int', default=20000000,
+                    help='Synthetic reports to aggregate.'),
+        make_option('--batch', type='int', default=1000000,
+                    help='Reports per incremental update.'),
+        make_option('--signatures', type='int', default=100000,
+                    help='Distinct signatures.'),
+        make_option('--days', type='int', default=14,
+                    help='Days the reports are spread over.'),
+        make_option('--baseline', type='int', default=1000000,
+                    help='Reports to count with dicts for comparison; 0 '
+                         'skips it.'),
+        make_option('--seed', type='int', default=0),
+    )
+
+    def handle(self, **options):
+        rand = np.random.RandomState(options['seed'])
+        first = datetime.date(2012, 1, 1)
+        days = [first + datetime.timedelta(days=i)
+                for i in range(options['days'])]
+
+        engine = Aggregator()
+        signature_names = ['Firefox::crash_%d' % i
+                           for i in range(options['signatures'])]
+        # Intern in order so that synthetic ids match the names.
+        for name in signature_names:
+            engine.signatures.id(name)
+        pairs = [(p, v) for p in sorted(PRODUCTS) for v in PRODUCTS[p]]
+        engine.group_ids([p for p, v in pairs], [v for p, v in pairs])
+        engine.os_names.ids(OS_NAMES)
+
+        # Interning strings costs more than counting ids; time it on its
+        # own for one batch.
+        size = min(options['batch'], options['reports'])
+        signature_ids, group_ids, os_ids = synthetic_batch(
+            rand, size, options['signatures'], len(pairs))
+        names = [signature_names[i] for i in signature_ids]
+        products = [pairs[g][0] for g in group_ids]
+        versions = [pairs[g][1] for g in group_ids]
+        os_names = [OS_NAMES[o] for o in os_ids]
+        start = time.time()
+        engine.add(days[0], names, products, versions, os_names)
+        self.report('add (strings)', size, time.time() - start)
+        del names, products, versions, os_names
+
+        added = size
+        elapsed = 0
+        batch = 0
+        while added < options['reports']:
+            size = min(options['batch'], options['reports'] - added)
+            signature_ids, group_ids, os_ids = synthetic_batch(
+                rand, size, options['signatures'], len(pairs))
+            start = time.time()
+            engine.add_ids(days[batch % len(days)], signature_ids,
+                           group_ids, os_ids)
+            elapsed += time.time() - start
+            added += size
+            batch += 1
+        self.report('add (ids)', added - min(options['batch'],
+                                             options['reports']), elapsed)
+        self.stdout.write('%d keys in %.1f MB of arrays.\n' %
+                          (sum(len(d.keys) for d in engine.days.values()),
+                           engine.nbytes / 1048576.0))
+
+        end = days[-1]
+        window_start = max(first, end - datetime.timedelta(days=6))
+        start = time.time()
+        for product, version in pairs:
+            rows = engine.top(product, version, window_start, end)
+        elapsed = time.time() - start
+        self.stdout.write('top() for %d product/versions over 7 days with '
+                          'rank deltas: %.1fms each.\n' %
+                          (len(pairs), elapsed * 1000 / len(pairs)))
+        for row in rows[:5]:
+            self.stdout.write('  %(rank)3d %(signature)-24s %(count)9d  '
+                              'delta %(rank_delta)s\n' % row)
+
+        if options['baseline']:
+            self.baseline(rand, options, pairs, signature_names, days,
+                          window_start, end)
+
+    def baseline(self, rand, options, pairs, signature_names, days,
+                 window_start, end):
+        size = options['baseline']
+        signature_ids, group_ids, os_ids = synthetic_batch(
+            rand, size, options['signatures'], len(pairs))
+        reports = [(days[i % len(days)], signature_names[s], pairs[g],
+                    OS_NAMES[o])
+                   for i, (s, g, o) in enumerate(zip(signature_ids.tolist(),
+                                                     group_ids.tolist(),
+                                                     os_ids.tolist()))]
+        counts = defaultdict(int)
+        start = time.time()
+        for report in reports:
+            counts[report] += 1
+        self.report('dict baseline', size, time.time() - start)
+        start = time.time()
+        for pair in pairs:
+            dict_top(counts, pair, window_start, end, 100)
+        self.stdout.write('dict baseline top for %d product/versions: %.1fms '
+                          'each.\n' % (len(pairs), (time.time() - start) *
+                                       1000 / len(pairs)))
+
+    def report(self, name, count, seconds):
+        self.stdout.write('%-14s %10d reports in %6.2fs (%.2fM reports/s)\n'
+                          % (name, count, seconds,
+                             count / seconds / 1e6 if seconds else 0))
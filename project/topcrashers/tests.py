@@ -0,0 +1,224 @@
+import datetime
+
+from django.utils import unittest
+
+import numpy as np
+from nose.tools import eq_, ok_
+
+from project.topcrashers import engine
+
+
+DAY = datetime.date(2012, 1, 1)
+
+
+def day(offset):
+    return DAY + datetime.timedelta(days=offset)
+
+
+class DenseAggregator(engine.Aggregator):
+    """Totals a window with a counts array covering every signature id ever
+    seen, the straightforward way, to check the sparse totals against."""
+
+    def totals(self, group, start, end):
+        width = max(len(self.os_names), 1)
+        cells = len(self.signatures) * width
+        by_os = np.zeros(cells, np.float64)
+        for when, data in self.days.items():
+            if start <= when <= end:
+                keys, counts = data.group(group)
+                signature_ids, groups, os_ids = engine.unpack(keys)
+                by_os += np.bincount(signature_ids * width + os_ids,
+                                     weights=counts, minlength=cells)
+        by_os = by_os.astype(np.int64).reshape((-1, width))
+        total = by_os.sum(axis=1)
+        signature_ids = np.flatnonzero(total)
+        total = total[signature_ids]
+        order = np.lexsort((signature_ids, -total))
+        signature_ids = signature_ids[order]
+        return signature_ids, total[order], by_os[signature_ids]
+
+    def ranks(self, group, start, end, signature_ids):
+        ranked = self.totals(group, start, end)[0]
+        ranks = np.zeros(len(self.signatures), np.int64)
+        ranks[ranked] = np.arange(1, len(ranked) + 1)
+        return ranks[np.asarray(signature_ids, np.int64)]
+
+
+class InternerTests(unittest.TestCase):
+
+    def test_ids(self):
+        interner = engine.Interner()
+        eq_(interner.ids(['b', 'a', 'b']).tolist(), [1, 0, 1])
+        eq_(interner.ids(['c', 'a']).tolist(), [2, 0])
+        eq_(interner.values, ['a', 'b', 'c'])
+        eq_(interner.get('c'), 2)
+        eq_(interner.get('d'), None)
+
+    def test_limit(self):
+        interner = engine.Interner(limit=2)
+        interner.id('a')
+        interner.id('b')
+        self.assertRaises(OverflowError, interner.id, 'c')
+        eq_(len(interner), 2)
+        eq_(interner.get('c'), None)
+
+    def test_limit_checked_before_a_batch(self):
+        interner = engine.Interner(limit=3)
+        interner.id('a')
+        self.assertRaises(OverflowError, interner.ids, ['b', 'c', 'd', 'a'])
+        eq_(interner.values, ['a'])
+        eq_(interner.get('b'), None)
+        eq_(interner.ids(['c', 'b']).tolist(), [2, 1])
+
+
+class PackTests(unittest.TestCase):
+
+    def test_round_trip(self):
+        signature_ids = [0, 5, engine.SIGNATURE_MASK]
+        group_ids = [0, 7, (1 << engine.GROUP_BITS) - 1]
+        os_ids = [0, 3, engine.OS_MASK]
+        keys = engine.pack(signature_ids, group_ids, os_ids)
+        eq_([a.tolist() for a in engine.unpack(keys)],
+            [signature_ids, group_ids, os_ids])
+
+    def test_order(self):
+        # Group first, then signature, then OS.
+        keys = engine.pack([1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0])
+        eq_(np.argsort(keys).tolist(), [3, 2, 0, 1])
+
+    def test_group_sum(self):
+        keys, counts = engine.group_sum(np.array([5, 1, 5, 3], np.int64),
+                                        np.array([1, 2, 3, 4], np.int64))
+        eq_(keys.tolist(), [1, 3, 5])
+        eq_(counts.tolist(), [2, 4, 4])
+
+
+class DayTests(unittest.TestCase):
+
+    def test_add_merges(self):
+        data = engine.Day()
+        data.add(np.array([2, 4], np.int64), np.array([1, 1], np.int64))
+        data.add(np.array([1, 4, 9], np.int64), np.array([5, 2, 3], np.int64))
+        eq_(data.keys.tolist(), [1, 2, 4, 9])
+        eq_(data.counts.tolist(), [5, 1, 3, 3])
+
+    def test_group(self):
+        data = engine.Day()
+        keys = engine.pack([3, 1, 2], [0, 1, 2], [0, 0, 0])
+        data.add(*engine.group_sum(keys, np.ones(3, np.int64)))
+        found, counts = data.group(1)
+        eq_(engine.unpack(found)[0].tolist(), [1])
+        eq_(counts.tolist(), [1])
+        eq_(len(data.group(5)[0]), 0)
+
+
+class AggregatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = engine.Aggregator()
+        self.add(0, [('a', 'Windows'), ('a', 'Mac'), ('b', 'Linux')])
+        self.add(1, [('b', 'Linux'), ('b', 'Linux'), ('c', 'Windows')])
+        self.add(2, [('c', 'Windows')] * 5)
+        self.engine.add(day(1), ['a'], ['Thunderbird'], ['10.0'], ['Mac'])
+
+    def add(self, offset, reports):
+        signatures, os_names = zip(*reports)
+        self.engine.add(day(offset), signatures,
+                        ['Firefox'] * len(reports), ['10.0'] * len(reports),
+                        os_names)
+
+    def ids(self, *signatures):
+        return [self.engine.signatures.get(s) for s in signatures]
+
+    def test_window(self):
+        group = self.engine.groups.get(('Firefox', '10.0'))
+        signature_ids, total, by_os = self.engine.window(group, day(0),
+                                                         day(1))
+        eq_(signature_ids.tolist(), self.ids('a', 'b', 'c'))
+        eq_(total.tolist(), [2, 3, 1])
+        columns = [self.engine.os_names.get(n)
+                   for n in ('Windows', 'Mac', 'Linux')]
+        eq_(by_os[:, columns].tolist(), [[1, 1, 0], [0, 0, 3], [1, 0, 0]])
+
+    def test_window_empty(self):
+        group = self.engine.groups.get(('Firefox', '10.0'))
+        signature_ids, total, by_os = self.engine.window(group, day(5),
+                                                         day(6))
+        eq_(len(signature_ids), 0)
+        eq_(by_os.shape, (0, len(self.engine.os_names)))
+
+    def test_totals_ties_go_to_lower_id(self):
+        group = self.engine.groups.get(('Firefox', '10.0'))
+        self.add(3, [('c', 'Mac'), ('a', 'Mac'), ('b', 'Mac')])
+        signature_ids, total, by_os = self.engine.totals(group, day(3),
+                                                         day(3))
+        eq_(signature_ids.tolist(), self.ids('a', 'b', 'c'))
+        eq_(total.tolist(), [1, 1, 1])
+
+    def test_ranks(self):
+        group = self.engine.groups.get(('Firefox', '10.0'))
+        self.engine.signatures.id('d')
+        ranks = self.engine.ranks(group, day(0), day(2),
+                                  self.ids('a', 'b', 'c', 'd'))
+        eq_(ranks.tolist(), [3, 2, 1, 0])
+        eq_(self.engine.ranks(group, day(5), day(6),
+                              self.ids('a')).tolist(), [0])
+
+    def test_top(self):
+        rows = self.engine.top('Firefox', '10.0', day(2), day(2))
+        eq_(len(rows), 1)
+        row = rows[0]
+        eq_((row['signature'], row['count'], row['percent'], row['rank']),
+            ('c', 5, 1.0, 1))
+        eq_((row['win_count'], row['mac_count'], row['linux_count']),
+            (5, 0, 0))
+
+    def test_rank_deltas(self):
+        # Day 0 ranks a, then b; c first crashed on day 1.
+        rows = self.engine.top('Firefox', '10.0', day(1), day(2))
+        eq_([(r['signature'], r['previous_rank'], r['rank_delta'])
+             for r in rows],
+            [('c', None, None), ('b', 2, 0)])
+        rows = self.engine.top('Firefox', '10.0', day(2), day(2))
+        eq_((rows[0]['previous_rank'], rows[0]['rank_delta']), (2, 1))
+        rows = self.engine.top('Firefox', '10.0', day(0), day(0))
+        eq_([r['previous_rank'] for r in rows], [None, None])
+
+    def test_top_unknown(self):
+        eq_(self.engine.top('Firefox', '11.0', day(0), day(2)), [])
+
+    def test_forget(self):
+        self.engine.forget(day(2))
+        eq_(self.engine.days.keys(), [day(2)])
+        ok_(self.engine.nbytes)
+
+
+class DenseComparisonTests(unittest.TestCase):
+
+    def test_random(self):
+        random = np.random.RandomState(1)
+        engines = [engine.Aggregator(), DenseAggregator()]
+        for aggregator in engines:
+            for i in range(300):
+                aggregator.signatures.id('sig%d' % i)
+            aggregator.group_ids(['Firefox', 'Firefox', 'Thunderbird'],
+                                 ['10.0', '11.0', '10.0'])
+            aggregator.os_names.ids(['Windows', 'Mac', 'Linux', 'BeOS'])
+        for offset in range(14):
+            size = 5000
+            # Skewed, so that there are ties at the bottom and gaps in the
+            # signature ids each window sees.
+            signature_ids = (random.zipf(1.3, size) - 1) % 300
+            group_ids = random.randint(0, 3, size)
+            os_ids = random.randint(0, 4, size)
+            for aggregator in engines:
+                aggregator.add_ids(day(offset), signature_ids, group_ids,
+                                   os_ids)
+        for product, version in (('Firefox', '10.0'), ('Firefox', '11.0'),
+                                 ('Thunderbird', '10.0')):
+            for start, end in ((7, 13), (0, 6), (13, 13), (3, 20)):
+                sparse, dense = [a.top(product, version, day(start),
+                                       day(end), limit=50)
+                                 for a in engines]
+                ok_(sparse)
+                eq_(sparse, dense)
@@ -1,8 +1,6 @@
 from django.conf import settings
 from django.conf.urls.defaults import patterns, include
 
-from .examples import urls
-
 from funfactory.monkeypatches import patch
 patch()
 
@@ -11,8 +9,12 @@ patch()
 # admin.autodiscover()
 
 urlpatterns = patterns('',
+    # Readiness check for load balancers; see project/base/warmup.py.
+    (r'^__ready__$', '%s.base.views.ready' % settings.PROJECT_MODULE),
+    (r'^__metrics__$', '%s.base.views.metrics' % settings.PROJECT_MODULE),
+
     # Example:
-    (r'', include(urls)),
+    (r'', include('%s.examples.urls' % settings.PROJECT_MODULE)),
 
     # Uncomment the admin/doc line below to enable admin documentation:
     # (r'^admin/doc/', include('django.contrib.admindocs.urls')),
@@ -21,11 +23,13 @@ urlpatterns = patterns('',
     # (r'^admin/', include(admin.site.urls)),
 )
 
-## In DEBUG mode, serve media files through Django.
-if settings.DEBUG:
+## In DEBUG mode, serve media files through Django. With MEDIA_SENDFILE, Django
+## answers media requests and the front-end server sends the file.
+if settings.DEBUG or settings.MEDIA_SENDFILE:
     # Remove leading and trailing slashes so the regex matches.
     media_url = settings.MEDIA_URL.lstrip('/').rstrip('/')
     urlpatterns += patterns('',
-        (r'^%s/(?P<path>.*)$' % media_url, 'django.views.static.serve',
+        (r'^%s/(?P<path>.*)$' % media_url,
+         '%s.base.static.serve' % settings.PROJECT_MODULE,
          {'document_root': settings.MEDIA_ROOT}),
     )